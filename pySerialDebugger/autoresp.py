@@ -1,9 +1,16 @@
 import enum
+import gc
+import mmap
+import time
+import weakref
+import concurrent.futures
+from array import array
 from functools import partial
-from typing import List, Dict
+from itertools import islice
+from typing import Callable, Iterator, List, Dict, Set
 import PySimpleGUI as sg
 from pySerialDebugger.autosend import autosend_data, autosend_mng, autosend_node, autosend_list
-from pySerialDebugger.send_node import send_mng
+from pySerialDebugger.send_node import send_mng, send_data_node, ChecksumType, calc_checksum
 
 
 class autoresp_list:
@@ -13,9 +20,133 @@ class autoresp_list:
 	ENABLE = 0			# 有効無効設定
 	ID = 1				# 自動応答設定定義名
 	DATA = 2			# 自動応答対象受信データパターン
-	SENDDATA_ID = 3		# 自動送信データ定義名
+	SENDDATA_ID = 3		# 自動送信データ定義名(受信値で選択するときはautoresp_select)
 	ANLYZ_DATA = 4		# 受信解析:データ(受信→自動応答の間に実施)
 	ANLYZ_LOG = 5		# 受信解析:ログ作成(ログ出力時に実施)
+	OPTION = 6			# 自動応答設定オプション(autoresp_opt, 省略可)
+
+
+class CallbackMode(enum.Enum):
+	"""
+	受信解析コールバックの実施方法
+	"""
+	RESPONSE = enum.auto()					# 自動応答に影響する: シリアル通信スレッドで自動応答前に実施
+	OBSERVE = enum.auto()					# 観測のみ: 別スレッドで実施して自動応答を待たせない
+
+
+class autoresp_select:
+	"""
+	受信値による自動送信データの選択表
+	自動応答設定の自動送信データ定義名の代わりに指定して、マッチしたフレームのpos位置の受信値で自動送信データを選ぶ。
+		autoresp_select(1, {0x01: "AutoSend_A", 0x02: "AutoSend_B"}, default="AutoSend_C")
+	posはフレーム先頭からのバイト位置で、負値はフレーム末尾から数える。
+	選択表は解析ツリー構築時に自動送信データへの参照に変換しておき、tail到達時は表を1回引くだけとする。
+	表に無い受信値はdefault、defaultがNoneなら自動応答しない。
+	"""
+
+	def __init__(self, pos: int, table: Dict[int, str], default: str = None, size: int = 1, endian: str = "big") -> None:
+		if size not in (1, 2):
+			raise Exception("select field size must be 1 or 2 bytes.")
+		if endian not in ("big", "little"):
+			raise Exception("select field endian must be 'big' or 'little'.")
+		if pos < 0 and pos + size > 0:
+			raise Exception("select field is out of frame.")
+		self.pos = pos
+		self.table = table
+		self.default = default
+		self.size = size
+		self.endian = endian
+
+	def __str__(self) -> str:
+		return "select[{0}]".format(self.pos)
+
+	def id_list(self) -> List[str]:
+		"""
+		選択表で参照する自動送信データ定義名
+		"""
+		id_list = list(self.table.values())
+		if self.default is not None:
+			id_list.append(self.default)
+		return id_list
+
+	def make_index(self, data_dict: Dict[str, autosend_node]):
+		"""
+		受信値 -> 自動送信データ の索引を作成する
+		1バイトの受信値は256要素のリスト、2バイトの受信値は辞書にする
+		"""
+		default = None
+		if self.default is not None:
+			default = data_dict[self.default]
+		if self.size == 1:
+			index = [default] * 256
+			for value, id in self.table.items():
+				index[value] = data_dict[id]
+		else:
+			index = {value: data_dict[id] for value, id in self.table.items()}
+		return (index, default)
+
+	def select(self, index, default: autosend_node, frame: memoryview) -> autosend_node:
+		"""
+		フレームの受信値で自動送信データを選択する
+		"""
+		if self.size == 1:
+			return index[frame[self.pos]]
+		pos = self.pos
+		if pos < 0:
+			pos += len(frame)
+		return index.get(int.from_bytes(frame[pos:pos+2], self.endian), default)
+
+
+class autoresp_echo:
+	"""
+	受信フレームから送信データへのフィールドコピー
+	マッチしたフレームのsrc位置からsizeバイトを、送信データ定義send_idのdst位置に書き込む。
+		autoresp_echo("Resp", 2, 1)		# 受信フレーム1バイト目 -> 送信データ"Resp"の2バイト目
+	srcはフレーム先頭からのバイト位置で、負値はフレーム末尾から数える。
+	自動応答前にシリアル通信スレッドで書き込み、送信データのFCCは差分で更新する。
+	GUIへの反映はGUIスレッドでまとめて行う。
+	"""
+
+	def __init__(self, send_id: str, dst: int, src: int, size: int = 1) -> None:
+		if size <= 0:
+			raise Exception("echo field size must be 1 or more bytes.")
+		if dst < 0:
+			raise Exception("echo field is out of send data.")
+		if src < 0 and src + size > 0:
+			raise Exception("echo field is out of frame.")
+		self.send_id = send_id
+		self.dst = dst
+		self.src = src
+		self.size = size
+
+
+class autoresp_opt:
+	"""
+	自動応答設定オプション
+	"""
+
+	def __init__(self, anlyz_data: CallbackMode = CallbackMode.RESPONSE, echo: List[autoresp_echo] = None, delay_us: int = 0) -> None:
+		if delay_us < 0:
+			raise Exception("response delay must be 0 or more.")
+		# 受信解析:データの実施方法
+		self.anlyz_data = anlyz_data
+		# 応答遅延[ns]
+		# 受信フレーム末尾の受信時間から指定時間経過後に自動応答を開始する
+		self.delay: int = delay_us * 1000
+		# 受信フレームから送信データへのフィールドコピー
+		if echo is None:
+			echo = []
+		elif isinstance(echo, autoresp_echo):
+			echo = [echo]
+		self.echo: List[autoresp_echo] = echo
+
+	@classmethod
+	def observe(cls):
+		"""
+		受信解析:データを観測のみとする
+		自動応答設定の変更(hdl.autosend_change等)の反映は自動応答に間に合わない。
+		"""
+		return autoresp_opt(anlyz_data=CallbackMode.OBSERVE)
 
 
 
@@ -31,6 +162,10 @@ class autoresp_data:
 	class TYPE(enum.Enum):
 		BYTE = enum.auto()
 		ANY = enum.auto()
+		LENGTH = enum.auto()
+		MASK = enum.auto()
+		RANGE = enum.auto()
+		FCC = enum.auto()
 	
 	def __init__(self, type:TYPE, size:int, value:bytes) -> None:
 		# node_type
@@ -54,6 +189,103 @@ class autoresp_data:
 		# インスタンス作成
 		return autoresp_data(autoresp_data.TYPE.ANY, bit_size, None)
 
+	@classmethod
+	def length(cls, byte_size: int = 1, endian: str = "big", offset: int = 0, scale: int = 1):
+		"""
+		長さフィールド
+		受信値 * scale + offset バイトのペイロードが続く。ペイロードの後に続くデータも定義できる。
+		1つの受信データパターンに1つだけ定義できる。
+		"""
+		if byte_size not in (1, 2):
+			raise Exception("length field size must be 1 or 2 bytes.")
+		if endian not in ("big", "little"):
+			raise Exception("length field endian must be 'big' or 'little'.")
+		# インスタンス作成
+		# valueには長さフィールドの定義を持つ
+		return autoresp_data(autoresp_data.TYPE.LENGTH, byte_size * 8, (byte_size, endian, offset, scale))
+
+	@classmethod
+	def mask(cls, mask: str, value: str):
+		"""
+		マスク付き固定値
+		受信値 & mask == value であればマッチする。maskとvalueは同じバイト長のhex文字列で指定する。
+			mask("80", "80")	: bit7が1
+		"""
+		if len(mask) % 2 == 1 or len(mask) != len(value):
+			raise Exception("mask and value must be hex format of same size.")
+		mask_bytes = bytes.fromhex(mask)
+		value_bytes = bytes.fromhex(value)
+		for m, v in zip(mask_bytes, value_bytes):
+			if v & ~m:
+				raise Exception("value has bits outside of mask: mask=" + mask + ", value=" + value)
+		# インスタンス作成
+		# valueには(mask, value)を持つ
+		return autoresp_data(autoresp_data.TYPE.MASK, len(mask_bytes) * 8, (mask_bytes, value_bytes))
+
+	@classmethod
+	def byte_range(cls, lo: str, hi: str):
+		"""
+		範囲指定
+		lo <= 受信値 <= hi であればマッチする。1バイトのhex文字列で指定する。
+			byte_range("10", "1F")	: 0x10～0x1F
+		"""
+		if len(lo) != 2 or len(hi) != 2:
+			raise Exception("byte_range must be 1 byte hex format.")
+		min_value = int(lo, 16)
+		max_value = int(hi, 16)
+		if min_value > max_value:
+			raise Exception("byte_range lo is greater than hi: " + lo + "-" + hi)
+		# インスタンス作成
+		# valueには(min, max)を持つ
+		return autoresp_data(autoresp_data.TYPE.RANGE, 8, (min_value, max_value))
+
+	@classmethod
+	def fcc(cls, checksum: ChecksumType, begin: int = 0):
+		"""
+		FCC
+		フレーム先頭からbegin～FCCの直前までのチェックサムと一致するかをtailでチェックする。
+		一致しなかったフレームはFCC NGとして、自動応答しない。
+		"""
+		if begin < 0:
+			raise Exception("fcc begin must be positive.")
+		# インスタンス作成
+		# valueには(チェックサム種別, 計算開始位置)を持つ
+		return autoresp_data(autoresp_data.TYPE.FCC, 8, (checksum, begin))
+
+	@classmethod
+	def fcc_sum(cls, begin: int = 0):
+		return autoresp_data.fcc(ChecksumType.SUM, begin)
+
+	@classmethod
+	def fcc_2compl(cls, begin: int = 0):
+		return autoresp_data.fcc(ChecksumType.TWOS_COMPL, begin)
+
+	@classmethod
+	def fcc_1compl(cls, begin: int = 0):
+		return autoresp_data.fcc(ChecksumType.ONES_COMPL, begin)
+
+	def get_byte_size(self) -> int:
+		"""
+		受信データパターン上のバイト長
+		"""
+		if self.type == autoresp_data.TYPE.LENGTH:
+			return self.value[0]
+		if self.type == autoresp_data.TYPE.ANY:
+			# 現状1バイト固定
+			return 1
+		return int(self.size // 8)
+
+	def expand(self) -> List[frozenset]:
+		"""
+		1バイトごとにマッチする受信値の集合に展開する
+		"""
+		if self.type == autoresp_data.TYPE.MASK:
+			return [frozenset(data for data in range(256) if (data & m) == v) for m, v in zip(*self.value)]
+		elif self.type == autoresp_data.TYPE.RANGE:
+			return [frozenset(range(self.value[0], self.value[1] + 1))]
+		else:
+			raise Exception("type cannot be expanded: " + str(self.type))
+
 	@classmethod
 	def set_gui_info(cls, size, pad, font):
 		cls.gui_size = size
@@ -65,6 +297,14 @@ class autoresp_data:
 			return self._get_gui_byte(key,row,col)
 		elif self.type == autoresp_data.TYPE.ANY:
 			return self._get_gui_any(key, row, col)
+		elif self.type == autoresp_data.TYPE.LENGTH:
+			return self._get_gui_length(key, row, col)
+		elif self.type == autoresp_data.TYPE.MASK:
+			return self._get_gui_mask(key, row, col)
+		elif self.type == autoresp_data.TYPE.RANGE:
+			return self._get_gui_range(key, row, col)
+		elif self.type == autoresp_data.TYPE.FCC:
+			return self._get_gui_any(key, row, col)
 		else:
 			raise Exception("unknown type detected: " + str(self.type))
 
@@ -103,8 +343,41 @@ class autoresp_data:
 		# クロージャ作成
 		get = self._get_gui_any_closure(key, row, col, 1)
 		# GUIリストを作成して返す
+		if self.type == autoresp_data.TYPE.FCC:
+			return [get(0, "FC")]
 		return [get(0, "*")]
 
+	def _get_gui_length(self, key: str, row: int, col: int):
+		# クロージャ作成
+		byte_size = self.value[0]
+		get = self._get_gui_any_closure(key, row, col, byte_size)
+		# GUIリストを作成して返す
+		return [get(0, "L" * (byte_size * 2))]
+
+	def _get_gui_mask(self, key: str, row: int, col: int):
+		# クロージャ作成
+		get = self._get_gui_any_closure(key, row, col, 1)
+		# 4bitごとに、マスク全ビット有効なら値、無効なら*、一部有効なら?で表示する
+		def text(m: int, v: int) -> str:
+			result = ""
+			for shift in (4, 0):
+				nibble = (m >> shift) & 0x0F
+				if nibble == 0x0F:
+					result += format((v >> shift) & 0x0F, "X")
+				elif nibble == 0:
+					result += "*"
+				else:
+					result += "?"
+			return result
+		# GUIリストを作成して返す
+		return [get(i, text(m, v)) for i, (m, v) in enumerate(zip(*self.value))]
+
+	def _get_gui_range(self, key: str, row: int, col: int):
+		# クロージャ作成
+		get = self._get_gui_any_closure(key, row, col, 1)
+		# GUIリストを作成して返す
+		return [get(0, "{0:02X}-{1:02X}".format(*self.value))]
+
 
 class autoresp_node:
 	"""
@@ -115,31 +388,346 @@ class autoresp_node:
 		# root要素用情報
 		self.root: bool = False
 		# ノード情報
-		self.hex: int = None
 		self.next: Dict[int,autoresp_node] = {}
 		self.next_else: autoresp_node = None
 		# 末端要素用情報
+		# 複数の自動応答設定が同時にマッチするノードは、tail_listに設定順で登録する
 		self.tail: bool = False
 		self.tail_list: Dict[str, autoresp_tail_node] = {}
 		self.tail_active: autoresp_tail_node = None
-		#
-		self.tail_id: int = None
+		# マッチしたフレームのバイト長
+		self.frame_len: int = 0
+		# 長さフィールドを含むフレームのtailであれば、frame_lenにペイロード長を加える
+		self.payload: bool = False
+		# 長さフィールド終端用情報
+		# tailのうちskip_activeを持つノードはフレーム終了ではなく、ペイロードの読み飛ばしに移る
+		# 同じノードで終わる長さフィールドを含まない設定はtail_listに登録し、定義順で先の有効な設定でどちらにするかを決める
+		self.skip_list: List[autoresp_skip] = []
+		self.skip_active: autoresp_skip = None
+		# 統計情報
+		# このノードまでマッチしていたフレーム候補が外れた(rootに戻った)回数と、そのときマッチ途中だったデータ定義
+		# 別のデータ定義でフレーム候補が続くときは数えない
+		# データ定義はノード作成時の状態((データ定義idx, 一致済みバイト数)の集合)をそのまま参照する
+		self.abort: int = 0
+		self.cand: tuple = ()
+		# 遷移表の状態番号
+		self.state: int = 0
+
+
+class autoresp_skip:
+	"""
+	長さフィールドによるペイロード読み飛ばし情報
+	受信データパターンの長さフィールドまでを解析ツリーで解析し、長さフィールドの終端に到達したら
+	ペイロードをバイト数だけ読み飛ばして、ペイロードの後のデータを専用のノード列で解析する。
+	"""
+
+	def __init__(self, tail_node: "autoresp_tail_node", spec: tuple, suffix: tuple) -> None:
+		# 対応する自動応答設定
+		self.tail_node = tail_node
+		# 長さフィールド定義
+		self.field_size, self.byteorder, self.offset, self.scale = spec[1:]
+		# ペイロードの後の受信データパターン
+		self.suffix_pattern = suffix
+		# ペイロード最終バイトを受信する状態と、ペイロード後のデータの先頭状態
+		self.payload_end: autoresp_node = None
+		self.suffix: autoresp_node = None
+		# 遷移表での状態
+		self.payload_state: int = 0
+		self.suffix_state: int = 0
+
+	def payload_len(self, field) -> int:
+		"""
+		長さフィールドからペイロードのバイト長を求める
+		"""
+		return int.from_bytes(field, self.byteorder) * self.scale + self.offset
+
+	def payload_max(self) -> int:
+		return (256 ** self.field_size - 1) * self.scale + self.offset
+
+
+class autoresp_fcc:
+	"""
+	受信フレームのFCCチェック情報
+	長さフィールドを含むフレームはフレーム長が決まらないので、ペイロードより後ろのFCCは位置を負値(フレーム末尾から)で持つ。
+	"""
+
+	def __init__(self, checksum: ChecksumType, begin: int, pos: int) -> None:
+		self.checksum = checksum
+		# FCC計算開始位置(フレーム先頭から)
+		self.begin = begin
+		# FCC位置
+		self.pos = pos
+
+	def check(self, frame: memoryview) -> bool:
+		"""
+		FCCをチェックする
+		総和はmemoryviewに対するsum()で取るので、フレームをPythonでループしない。
+		"""
+		return calc_checksum(self.checksum, sum(frame[self.begin:self.pos])) == frame[self.pos]
+
+
+class autoresp_stats:
+	"""
+	自動応答設定ごとの統計情報
+	tail到達時とマッチ失敗時だけ更新するので、受信1バイトごとの処理には影響しない。
+	"""
+	__slots__ = ("match", "abort", "fcc_error", "bytes", "cb_count", "cb_time", "cb_max", "delay_count", "delay_error", "delay_max")
+
+	def __init__(self) -> None:
+		# マッチ回数
+		self.match: int = 0
+		# マッチ途中で外れた回数
+		self.abort: int = 0
+		# FCC NG回数
+		self.fcc_error: int = 0
+		# マッチしたフレームのバイト数合計
+		self.bytes: int = 0
+		# 受信解析:データの実施回数、合計時間[ns]、最大時間[ns]
+		# 観測のみの設定は、シリアル通信スレッドでの実施要求までの時間
+		self.cb_count: int = 0
+		self.cb_time: int = 0
+		self.cb_max: int = 0
+		# 応答遅延の実施回数、期限からの遅れの合計[ns]、最大[ns]
+		self.delay_count: int = 0
+		self.delay_error: int = 0
+		self.delay_max: int = 0
+
+	def set_delay_error(self, error: int) -> None:
+		"""
+		応答遅延の期限からの遅れを記録する
+		"""
+		self.delay_count += 1
+		self.delay_error += error
+		if error > self.delay_max:
+			self.delay_max = error
+
 
 class autoresp_tail_node:
 	def __init__(self) -> None:
 		# ノード情報
 		self.enable: bool = False
 		self.id: str = None
+		# 受信データパターンのID
+		# 同じパターンの自動応答設定は同じIDになる
+		self.tail_id: int = None
+		# 受信データパターンのバイト長
+		self.frame_len: int = 0
+		# FCCチェック情報(FCCが無ければNone)
+		self.fcc: autoresp_fcc = None
 		# 参照情報
-		self.autoresp_ref: autoresp_node = None
+		# この設定がマッチする解析ツリーのtailノード
+		self.autoresp_refs: List[autoresp_node] = []
 		# 送信データ情報
 		self.send_id: str = None
 		self.senddata_ref = None
+		# 受信値による自動送信データの選択
+		# 選択表の索引と、表に無い受信値のときの自動送信データ(senddata_ref)
+		self.select: autoresp_select = None
+		self.select_index = None
 		# 受信データ解析
 		self.anlyz_adpt: recvdata_adapter = None
 		self.anlyz_data = None
 		self.anlyz_log = None
+		# 自動応答設定オプション
+		self.opt: autoresp_opt = None
+		# フィールドコピー
+		# 書き込み先の送信データごとに (送信データ, [(src, dst, size), ...]) にまとめておく
+		self.echo: List[tuple] = []
+		# 統計情報
+		self.stats = autoresp_stats()
+
+
+
+# 解析ツリー一式の分割構築・破棄で、1回あたりに処理する時間(ns)
+RULESET_STEP_BUDGET = 500 * 1000
+# 受信解析(観測のみ)を実施するスレッド数
+ANLYZ_WORKERS = 2
+
+
+class anlyz_worker:
+	"""
+	受信解析:データ(観測のみ)の実施スレッド
+	自動応答設定ごとに同じスレッドで実施して、設定ごとの実施順を保つ。
+	スレッドは初回の実施要求時に作成する。
+	"""
+
+	def __init__(self, size: int = ANLYZ_WORKERS) -> None:
+		self._executers: List[concurrent.futures.ThreadPoolExecutor] = [None] * size
+
+	def submit(self, key: str, func: Callable, data: bytes) -> None:
+		idx = self._index(key)
+		if self._executers[idx] is None:
+			self._executers[idx] = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="anlyz_worker")
+		self._executers[idx].submit(self._run, func, data)
+
+	def shutdown(self, wait: bool = True, keep: Set[str] = None) -> None:
+		"""
+		スレッドを終了する
+		実施待ちの受信解析はwaitによらずすべて実施してから終了する。
+		@param wait Trueのときは実施待ちの受信解析が完了するまで待つ
+		@param keep 指定したキーが使うスレッドは終了しない
+		"""
+		keep_idx = set()
+		if keep is not None:
+			keep_idx = {self._index(key) for key in keep}
+		for i, executer in enumerate(self._executers):
+			if executer is not None and i not in keep_idx:
+				executer.shutdown(wait=wait)
+				self._executers[i] = None
+
+	def _index(self, key: str) -> int:
+		return hash(key) % len(self._executers)
+
+	@staticmethod
+	def _run(func: Callable, data: bytes) -> None:
+		try:
+			func(data=data)
+		except:
+			import traceback
+			traceback.print_exc()
+			print("anlyz_worker occur exception!")
+
+
+class MatchMode(enum.Enum):
+	"""
+	受信解析の状態遷移方式
+	"""
+	TREE = enum.auto()						# 解析ツリーのノードを辿る
+	TABLE = enum.auto()						# 解析ツリーから作成した遷移表を引く
+
+
+class autoresp_table:
+	"""
+	受信データ解析遷移表
+	解析ツリーの各ノードに状態番号を振り、1状態につき256エントリの遷移先を持つ。
+	遷移先には「状態番号*256」を格納しておき、次の遷移は trans[遷移先 + 受信データ] の1回で引ける。
+	遷移先がtailのときはビット反転(~(状態番号*256))して負値で格納する。
+	受信解析は遷移先が負値のときだけノードを参照すればよく、途中の状態ではノードを参照しない。
+	遷移できないときは-1(=~0, rootに戻る)を格納する。
+	遷移表はcompile()で1状態ずつ作成する。
+	"""
+
+	def __init__(self, nodes: List[autoresp_node]) -> None:
+		# 状態番号 -> ノード (tail判定用)
+		# 先頭はroot、各ノードのstateが状態番号
+		self.nodes: List[autoresp_node] = nodes
+		# 遷移表
+		# 全状態分を匿名mmapで確保してint配列として参照する
+		# 物理メモリはページに書き込んだときに割り当てられるので、確保はすぐに終わり、1状態ずつ書き込むたびに少しずつ割り当たる
+		# (arrayを伸ばしていくと、再確保時に遷移表全体をコピーすることがある)
+		self._buf = mmap.mmap(-1, len(nodes) * 256 * 4)
+		self.trans: memoryview = memoryview(self._buf).cast('i')
+
+	def compile(self) -> Iterator[None]:
+		"""
+		遷移表を作成する
+		1状態作成するごとにyieldする。
+		"""
+		# 1状態ずつ、else遷移で埋めた行を作成して固定値の遷移を上書きする
+		trans = self.trans
+		entry = self.entry
+		for state, node in enumerate(self.nodes):
+			if node.next_else is not None:
+				row = array('i', [entry(node.next_else)]) * 256
+			else:
+				row = array('i', [-1]) * 256
+			for data, next in node.next.items():
+				row[data] = entry(next)
+			trans[state*256:(state+1)*256] = row
+			yield
+		# 長さフィールド終端からの遷移先
+		for node in self.nodes:
+			for skip in node.skip_list:
+				skip.payload_state = skip.payload_end.state * 256
+				skip.suffix_state = skip.suffix.state * 256
+			yield
+
+	@staticmethod
+	def entry(node: autoresp_node) -> int:
+		"""
+		遷移表に格納する遷移先
+		"""
+		if node.tail:
+			return ~(node.state * 256)
+		return node.state * 256
+
+
+class frame_buffer:
+	"""
+	受信フレーム蓄積バッファ
+	確保済みのbytearrayの[begin:end]にデータを持ち、追加のたびにオブジェクトを作らない。
+	書き込みはバッファ全体のmemoryview経由で行い、一時オブジェクトも作らない。
+	limitを指定したときは末尾limitバイトだけ保持する。このときバッファはlimitの2倍を確保して、
+	末尾に空きが無くなったときだけ保持分を先頭に詰めるので、追加は償却O(1)になる。
+	limitが0のときは必要に応じてバッファを拡張する。
+	view()で取得したmemoryviewは、次にバッファを操作するまでの間だけ有効。
+	"""
+	__slots__ = ("_buff", "_view", "_begin", "_end", "_limit")
+
+	def __init__(self, size: int, limit: int = 0) -> None:
+		if limit > 0:
+			size = limit * 2
+		self._buff = bytearray(max(size, 1))
+		self._view = memoryview(self._buff)
+		self._begin = 0
+		self._end = 0
+		self._limit = limit
+
+	def __len__(self) -> int:
+		return self._end - self._begin
+
+	def clear(self) -> None:
+		self._begin = 0
+		self._end = 0
+
+	def push(self, data) -> None:
+		end = self._end
+		new_end = end + len(data)
+		if new_end > len(self._buff):
+			# 末尾に空きが無い
+			self._push_compact(data)
+			return
+		self._view[end:new_end] = data
+		self._end = new_end
+		if self._limit > 0 and new_end - self._begin > self._limit:
+			self._begin = new_end - self._limit
 
+	def _push_compact(self, data) -> None:
+		"""
+		保持分を先頭に詰めてから追加する
+		"""
+		size = len(data)
+		limit = self._limit
+		if limit > 0 and size >= limit:
+			# 追加データだけで保持サイズを超える
+			self._view[0:limit] = data[size-limit:]
+			self._begin = 0
+			self._end = limit
+			return
+		keep = self._end - self._begin
+		if limit > 0:
+			keep = min(keep, limit - size)
+		self._view[0:keep] = self._view[self._end-keep:self._end]
+		self._begin = 0
+		self._end = keep
+		if keep + size > len(self._buff):
+			# それでも足りなければ拡張
+			# view()で取得したmemoryviewが残っているとbytearrayはリサイズできないので、新しく確保する
+			buff = bytearray(max(keep + size, len(self._buff) * 2))
+			buff[0:keep] = self._view[0:keep]
+			self._buff = buff
+			self._view = memoryview(buff)
+		self.push(data)
+
+	def view(self, size: int = None) -> memoryview:
+		"""
+		保持データのmemoryviewを取得する
+		sizeを指定したときは末尾sizeバイト
+		"""
+		begin = self._begin
+		if size is not None:
+			begin = self._end - size
+		return self._view[begin:self._end]
 
 
 class recvdata_adapter:
@@ -149,37 +737,60 @@ class recvdata_adapter:
 		# 自動送信データへの参照
 		self._autosend_mng: autosend_mng = as_mng
 		# 対応する自動応答データの末尾ノードへの参照
-		self._tail = tail
+		# 末尾ノードからも参照されるので、循環参照にならないよう弱参照で持つ
+		self._tail = weakref.ref(tail)
 
 	def senddata_update(self, send_id:str, pos:int, value:int):
 		if send_id in self._send_mng._send_data_dict.keys():
 			# 送信データへの参照を取得
 			senddata = self._send_mng._send_data_dict[send_id]
 			# 送信データを更新する
-			senddata.update_gui(pos, value)
+			# GUIへの反映はGUIスレッドでまとめて行う
+			senddata.write_value(pos, value)
+			senddata.update_bytes()
+			self._send_mng.gui_refresh_req(senddata)
 
 	def autosend_change(self, autosend_id:str):
 		# 自動送信データ参照設定を更新
 		# 存在チェック
 		if autosend_id not in self._autosend_mng._data_dict.keys():
 			raise Exception(f"autosend_id[{autosend_id}] is not exist.")
-		#
-		self._tail.senddata_ref = self._autosend_mng._data_dict[autosend_id]
+		# 解析ツリー一式の差し替えで解放済みであれば何もしない
+		tail = self._tail()
+		if tail is not None:
+			tail.senddata_ref = self._autosend_mng._data_dict[autosend_id]
 
 
 
 class analyze_result:
 	"""
 	受信解析結果定義
+	受信1バイトごとに作成されるので__slots__で省メモリ化する。
 	"""
+	__slots__ = (
+		"data", "offset", "id", "tail_node", "anlyz_log", "frame_len", "fcc_error",
+		"_notify", "_autoresp_send", "_rx_buf_commit_prev", "_rx_buf_commit", "_rx_buf_push",
+		"_timestamp_rx", "_timestamp_rx_prev",
+	)
 
-	def __init__(self, data:bytes) -> None:
+	def __init__(self, data:memoryview) -> None:
 		# 今回受信データ
+		# 解析中はシリアル受信リングバッファのmemoryview
+		# 解析後も保持するときはコピーすること
 		self.data = data
+		# 一括解析したときの、受信データ内でのdata先頭のオフセット
+		self.offset: int = 0
 		#
 		self.id = ""
 		# tail参照
 		self.tail_node = None
+		# 受信データ解析:ログ
+		self.anlyz_log = None
+		# マッチしたフレームのバイト長
+		# 受信バッファのうち末尾frame_lenバイトがマッチしたフレームで、それより前はマッチしなかったデータ
+		self.frame_len: int = 0
+		# マッチしたフレームのFCCが一致しなかった
+		self.fcc_error: bool = False
 		# 解析フラグ
 		self._notify = False
 		self._autoresp_send = False
@@ -207,7 +818,8 @@ class analyze_result:
 	def set_analyze_NG2NG(self):
 		pass
 
-	def set_analyze_succeeded(self, tail_node: autoresp_tail_node, anlyz_log):
+	def set_analyze_succeeded(self, tail_node: autoresp_tail_node, anlyz_log, frame_len: int):
+		self.frame_len = frame_len
 		if tail_node is not None:
 			# 受信解析データ設定
 			self.id = tail_node.id
@@ -220,6 +832,11 @@ class analyze_result:
 		self._rx_buf_commit = True
 		self._notify = True
 
+	def set_fcc_error(self):
+		# フレームとしては確定するが、自動応答はしない
+		self.fcc_error = True
+		self._autoresp_send = False
+
 	def set_analyze_failed(self):
 		#
 		self._rx_buf_push = True
@@ -229,12 +846,11 @@ class analyze_result:
 		self._rx_buf_push = True
 		self._notify = True
 
-	def set_analyze_next_start(self):
-		self._rx_buf_commit_prev = True
-		self._rx_buf_push = True
-		self._notify = True
-
 	def set_timestamp(self, rx, rx_prev):
+		"""
+		@param rx 今回データ受信時間
+		@param rx_prev 直前までのバッファの受信時間(フレームがマッチしたときはフレーム先頭の直前)
+		"""
 		self._timestamp_rx = rx
 		self._timestamp_rx_prev = rx_prev
 
@@ -258,12 +874,16 @@ class analyze_result:
 		return self._notify
 
 
-class autoresp_mng:
+class autoresp_ruleset:
 	"""
 	受信データ解析テーブルを構築
+	自動応答設定から作成した解析ツリーと遷移表の一式を持つ。
+	構築後に変更するのは有効設定だけなので、別に構築して受信解析中のものと丸ごと差し替えられる。
+	インスタンス作成時は自動応答設定のチェックまでを実施し、解析ツリーと遷移表はbuild()で構築する。
+	遷移表は状態数*1KBのメモリと構築時間を要するので、use_table=True(MatchMode.TABLE用)のときだけ作成する。
 	"""
 
-	def __init__(self, autoresp, as_mng: autosend_mng, s_mng: send_mng) -> None:
+	def __init__(self, autoresp, as_mng: autosend_mng, s_mng: send_mng, use_table: bool = False) -> None:
 		# 手動送信データへの参照
 		self._send_mng : send_mng = s_mng
 		# 自動送信データへの参照
@@ -278,13 +898,22 @@ class autoresp_mng:
 		# アクセス用にリストと辞書の両方で参照を持つ
 		self.data_dict: Dict[str, autoresp_tail_node] = {}
 		self.data_list: List[autoresp_tail_node] = []
-		# 正常受信データバッファ
-		self._data_buff: bytes = b''
-		# 解析情報
-		self._curr_node: autoresp_node = None
-		self._prev_recv_analyze_result: bool = True
-		# 処理時にノードを区別するためのID。なんでもいい
-		_tail_id: int = 0
+		# 長さフィールド終端ノード
+		self.tree_skip_list: List[autoresp_node] = []
+		# 自動応答設定ごとの長さフィールド読み飛ばし情報(長さフィールドが無ければNone)
+		self.skip_list: List[autoresp_skip] = []
+		# 最長の受信データパターンのバイト長
+		self.data_buff_max: int = 0
+		# 遷移表
+		self.use_table: bool = use_table
+		self.table: autoresp_table = None
+		# 解析ツリーの全ノード(先頭はroot)
+		# ノードのstateはこのリストでの位置
+		self.nodes: List[autoresp_node] = [self.tree]
+		# 構築状態
+		self.built: bool = False
+		self._build: Iterator[None] = None
+		self._dispose: Iterator[None] = None
 
 		"""
 		受信データ定義が次のようになっているとき
@@ -294,96 +923,415 @@ class autoresp_mng:
 			data4: **2
 			data5: **0
 			(1文字1バイト、*=any)
-		次の通りに解析ツリーを構築する
-			[root]	->	0	->	1	->	*
-							->	*	->	2
-					->	1	->	*	->	2
-					->	*	->	*	->	0
-									->	2
-		常にanyより固定値を優先する。
-		anyと固定値をマージしたツリーを構築したいとき、
-		辿ったパスを記憶しておき、tail到達時にどのルールにマッチするか判定が必要になる。
-		動的に構築するのは難しいため、anyと固定値のマージはしない。状態遷移組め。
-		"""
-		for i, resp in enumerate(autoresp):
-			# 解析ツリーを構築
-			tgt_node: List[autoresp_node] = []
-			# マージが発生するときはnext_nodeが複数発生するのでリストになっている。
-			# 現状でマージは実施しないので、常に要素数は1になっている。
-			next_node: List[autoresp_node] = []
-			tgt_node.append(self.tree)
-			# 定義データをすべてチェック
-			for data in resp[autoresp_list.DATA]:
-				data: autoresp_data
-				if data.type == autoresp_data.TYPE.ANY:
-					# ANYではあらゆるデータを受け付ける
-					next_node = []
-					# 現状態ノードをすべてチェック
-					for node in tgt_node:
-						# elseノードチェック
-						if node.next_else is None:
-							# elseノード作成
-							node.next_else = autoresp_node()
-							# elseノードはnextノードも内包する
-							#self._maketree_clone_next2else(node, autoresp)
-						# elseノードを次状態として登録
-						next_node.append(node.next_else)
-						# 既存のnextノードもすべて、次状態以降の設定を追加する
-						#for next in node.next.values():
-						#	next_node.append(next)
-					# 次の遷移設定
-					tgt_node = next_node
-
-				elif data.type == autoresp_data.TYPE.BYTE:
-					# bytesを順に辿るツリーを構築
-					for hex in data.value:
-						# 現状態ノードをすべてチェック
-						next_node = []
-						for node in tgt_node:
-							# 次状態ノードチェック
-							if hex not in node.next.keys():
-								# 存在しなければ新しいノード作成
-								node.next[hex] = autoresp_node()
-								# ノード情報登録
-								next_node_ref = node.next[hex]
-								next_node_ref.hex = hex
-							else:
-								next_node_ref = node.next[hex]
-							next_node.append(next_node_ref)
-							# elseノードチェック
-							#if node.next_else is not None:
-							#	next_node.append(node.next_else)
-						# 次の遷移設定
-						tgt_node = next_node
+		次の通りに解析ツリー(DFA)を構築する
+			[root]	->	0	->	1	->	0/2		: data5/data1,data2,data4
+										->	*		: data2
+							->	*	->	0/2		: data5/data1,data4
+					->	1	->	*	->	0/2		: data5/data3,data4
+					->	*	->	*	->	0/2		: data5/data4
+		各ノードは「各データ定義の何バイト目まで一致しているか」の集合を表す(部分集合構成法)。
+		固定値とanyが重なる箇所はマージして、anyの遷移先を固定値の遷移先にも含める。
+		固定値で遷移できなかったときはanyの遷移先(next_else)に遷移する。
+		1バイトごとの処理は辞書引き1回で済む。
+		tailで複数のデータ定義が同時にマッチしたときは、定義順で先の有効な設定を優先する。
+
+		また、すべてのノードは「全データ定義の先頭」を暗黙に含む(Aho-Corasickの失敗遷移に相当)。
+		途中まで一致したデータ列の中から始まるフレームも取りこぼさず、受信データを読み直すことも無い。
+			rule: 00 AA * *
+			recv: 00 00 AA 01 01	-> 先頭の00はマッチせず、2バイト目からのフレームがマッチ
+		tailに到達したらフレーム終了として、次の遷移はrootと同じにする。
+		マッチしたフレームの長さはtailで確定するので、それより前の受信データはマッチしなかったデータとなる。
+
+		長さフィールドを含む受信データパターンは、長さフィールドまでを解析ツリーに含める。
+		長さフィールドの終端に到達したらそのフレームに確定して、ペイロードはバイト数だけ読み飛ばす。
+		ペイロードの後のデータは自動応答設定ごとのノード列で解析する。
+			rule: 00 CC [L] ... 03
+			recv: 00 CC 02 xx xx 03	-> 長さフィールド(02)の後の2バイトは読み飛ばして、03をチェック
+		"""
+		patterns: List[tuple] = []
+		pattern_id: Dict[tuple, int] = {}
+		frame_max: List[int] = []
+		for resp in autoresp:
 			# tailノード作成
 			tail_node = self._maketree_make_tail(resp)
-			# 末尾ノードチェック
-			if len(tgt_node) > 1:
-				raise Exception("error: 現状の実装で要素数が1を超えることはありえない")
-			for tail in tgt_node:
-				tail.tail = True
-				tail.tail_id = _tail_id
-				_tail_id += 1
-				# ツリー情報登録
-				self.tree_tail_list.append(tail)
-				# tail情報登録
-				if tail_node.id not in tail.tail_list.keys():
-					tail.tail_list[tail_node.id] = tail_node
-				# autoresp_tail_node -> autoresp_node 参照設定
-				tail_node.autoresp_ref = tail
-				# enableチェック
-				if tail.tail_active is None:
-					if tail_node.enable:
-						# 有効なtail_nodeが初出現のとき、有効tailとして参照登録
-						tail.tail_active = tail_node
+			# 受信データパターンを1バイトごとの定義に展開
+			pattern = self._maketree_pattern(resp[autoresp_list.DATA])
+			tail_node.fcc = self._maketree_fcc(tail_node, resp[autoresp_list.DATA])
+			# FCCの有無・種別が違えば別のパターンとする
+			key = (pattern, None if tail_node.fcc is None else (tail_node.fcc.checksum, tail_node.fcc.begin, tail_node.fcc.pos))
+			if key not in pattern_id:
+				pattern_id[key] = len(pattern_id)
+			tail_node.tail_id = pattern_id[key]
+			# 長さフィールドがあれば、解析ツリーに含めるのは長さフィールドまで
+			pattern, skip = self._maketree_skip(tail_node, pattern)
+			patterns.append(pattern)
+			self.skip_list.append(skip)
+			if skip is None:
+				tail_node.frame_len = len(pattern)
+				frame_max.append(len(pattern))
+			else:
+				tail_node.frame_len = len(pattern) + len(skip.suffix_pattern)
+				frame_max.append(tail_node.frame_len + skip.payload_max())
+			# 選択表の受信値はフレーム内になければならない
+			select = tail_node.select
+			if select is not None and select.pos >= 0 and select.pos + select.size > tail_node.frame_len:
+				raise Exception(f"autoresp[{tail_node.id}]: select field is out of frame.")
+			# フィールドコピー元もフレーム内になければならない
+			for echo in tail_node.opt.echo:
+				if echo.src >= 0 and echo.src + echo.size > tail_node.frame_len:
+					raise Exception(f"autoresp[{tail_node.id}]: echo field is out of frame.")
+		self.data_buff_max = max(frame_max, default=0)
+		# 有効設定チェック
+		# 同じパターンで有効な設定が重複したときは先優先で、後の設定は無効化する
+		for idx in self.update_tree_check():
+			autoresp[idx][autoresp_list.ENABLE] = False
+		# 解析ツリー構築はbuild()で実施する
+		self._build = self._build_steps(patterns)
+
+	def build(self, budget: int = None) -> bool:
+		"""
+		解析ツリーと遷移表を構築する
+		構築は1遷移ずつに分けてあり、budget(ns)を超えたら中断して次回の呼び出しで続きから構築する。
+		シリアル通信スレッドで受信が途切れるたびに呼び出せば、受信解析を止めずに構築できる。
+		@param budget 1回の呼び出しで構築する時間(ns)、Noneのときは完了まで構築する
+		@return 構築完了したらTrue
+		"""
+		if self.built:
+			return True
+		if not self._run_steps(self._build, budget):
+			return False
+		self._build = None
+		self.built = True
+		return True
+
+	def _build_steps(self, patterns: List[tuple]) -> Iterator[None]:
+		# 解析ツリー構築
+		yield from self._maketree_compile(patterns)
+		for idx, skip in enumerate(self.skip_list):
+			if skip is not None:
+				self._maketree_skip_chain(idx, skip)
+		self.update_tree()
+		# 遷移表作成
+		if self.use_table:
+			self.table = autoresp_table(self.nodes)
+			yield from self.table.compile()
+
+	def table_build(self) -> None:
+		"""
+		遷移表を作成する
+		構築前ならbuild()で作成するように指定するだけで、構築済みで遷移表が無ければその場で作成する。
+		"""
+		self.use_table = True
+		if not self.built or self.table is not None:
+			return
+		table = autoresp_table(self.nodes)
+		for _ in table.compile():
+			pass
+		self.table = table
+
+	def dispose(self, budget: int = None) -> bool:
+		"""
+		解析ツリーの循環参照を切る
+		差し替えで不要になった解析ツリー一式に対して実施する。
+		解析ツリーはノード間で参照が循環しているので、GCの対象外(gc.freeze())にしたものは参照を切らないと解放されない。
+		1ノードずつ参照を切って、参照カウントで少しずつ解放する。
+		ノードに記録したマッチ途中で外れた回数は、このときに自動応答設定の統計情報に移す。
+		budgetはbuild()と同じ。
+		@return 完了したらTrue
+		"""
+		if self._dispose is None:
+			# 構築途中であれば中断する
+			self._build = None
+			self.built = False
+			self._dispose = self._dispose_steps()
+		if not self._run_steps(self._dispose, budget):
+			return False
+		self._dispose = None
+		return True
+
+	def _dispose_steps(self) -> Iterator[None]:
+		nodes = self.nodes
+		while nodes:
+			node = nodes.pop()
+			if node.abort:
+				# 統計情報は差し替え後の同じIDの自動応答設定と共有しているので、差し替え後の統計情報に反映される
+				for idx in {idx for state in node.cand for idx, pos in state}:
+					self.data_list[idx].stats.abort += node.abort
+			node.next = {}
+			node.next_else = None
+			node.tail_list = {}
+			node.tail_active = None
+			node.skip_list = []
+			node.skip_active = None
+			node.cand = ()
+			yield
+		self.tree = None
+		self.tree_tail_list = []
+		self.tree_skip_list = []
+		self.skip_list = []
+		self.table = None
+		# 自動応答設定も1件ずつ解放する
+		self.data_dict = {}
+		data_list = self.data_list
+		while data_list:
+			tail_node = data_list.pop()
+			tail_node.autoresp_refs = []
+			yield
+
+	@staticmethod
+	def _run_steps(steps: Iterator[None], budget: int) -> bool:
+		"""
+		分割した処理をbudget(ns)を超えるまで進める
+		完了したらTrueを返す
+		"""
+		deadline = None
+		if budget is not None:
+			deadline = time.perf_counter_ns() + budget
+		for _ in steps:
+			if deadline is not None and time.perf_counter_ns() >= deadline:
+				return False
+		return True
+
+	def _maketree_pattern(self, data_list: List[autoresp_data]) -> tuple:
+		"""
+		受信データパターンを1バイトごとの定義に展開する
+		固定値はint、anyはNoneになる
+		マスク・範囲指定はマッチする受信値の集合(frozenset)にして、解析ツリー構築時に固定値の遷移に展開する。
+		"""
+		pattern = []
+		for data in data_list:
+			data: autoresp_data
+			if data.type == autoresp_data.TYPE.ANY:
+				# ANYではあらゆるデータを受け付ける
+				# 現状1バイト固定
+				pattern.append(None)
+			elif data.type == autoresp_data.TYPE.BYTE:
+				for hex in data.value:
+					pattern.append(hex)
+			elif data.type == autoresp_data.TYPE.LENGTH:
+				# 長さフィールドは定義をまとめて1要素にする
+				pattern.append(("length",) + data.value)
+			elif data.type == autoresp_data.TYPE.FCC:
+				# FCCはtailでチェックするので、解析ツリー上はany
+				pattern.append(None)
+			elif data.type in (autoresp_data.TYPE.MASK, autoresp_data.TYPE.RANGE):
+				for values in data.expand():
+					if len(values) == 256:
+						# 全受信値にマッチするならany
+						pattern.append(None)
+					elif len(values) == 1:
+						# 1つの受信値にだけマッチするなら固定値
+						pattern.append(next(iter(values)))
+					else:
+						pattern.append(values)
+		return tuple(pattern)
+
+	def _maketree_fcc(self, tail_node: autoresp_tail_node, data_list: List[autoresp_data]) -> autoresp_fcc:
+		"""
+		受信データパターンからFCCチェック情報を作成する
+		"""
+		fcc_list = [i for i, data in enumerate(data_list) if data.type == autoresp_data.TYPE.FCC]
+		if not fcc_list:
+			return None
+		if len(fcc_list) > 1:
+			raise Exception(f"autoresp[{tail_node.id}]: fcc can be defined only once.")
+		idx = fcc_list[0]
+		checksum, begin = data_list[idx].value
+		if autoresp_data.TYPE.LENGTH in [data.type for data in data_list[:idx]]:
+			# ペイロードより後ろのFCCはフレーム末尾から数える
+			pos = -sum(data.get_byte_size() for data in data_list[idx:])
+		else:
+			pos = sum(data.get_byte_size() for data in data_list[:idx])
+			if begin >= pos:
+				raise Exception(f"autoresp[{tail_node.id}]: fcc begin must be before fcc.")
+		return autoresp_fcc(checksum, begin, pos)
+
+	def _maketree_skip(self, tail_node: autoresp_tail_node, pattern: tuple):
+		"""
+		長さフィールドを含む受信データパターンを分割する
+		解析ツリーに含める長さフィールドまでのパターンと、読み飛ばし情報を返す
+		"""
+		pos_list = [pos for pos, value in enumerate(pattern) if isinstance(value, tuple)]
+		if not pos_list:
+			return (pattern, None)
+		if len(pos_list) > 1:
+			raise Exception(f"autoresp[{tail_node.id}]: length field can be defined only once.")
+		pos = pos_list[0]
+		spec = pattern[pos]
+		skip = autoresp_skip(tail_node, spec, pattern[pos+1:])
+		# 長さフィールドはanyとして解析ツリーに含める
+		return (pattern[:pos] + (None,) * skip.field_size, skip)
+
+	def _maketree_skip_chain(self, idx: int, skip: autoresp_skip) -> None:
+		"""
+		ペイロード以降を解析するノード列を作成する
+		ペイロードの後のデータが一致しなかったときはrootと同じ遷移にする
+		"""
+		tree = self.tree
+		# マッチ途中のデータ定義は自身のみ
+		cand = (frozenset([(idx, 0)]),)
+		# ペイロード後のデータの末尾はtail
+		tail = autoresp_node()
+		tail.next = tree.next
+		tail.next_else = tree.next_else
+		tail.payload = True
+		self._maketree_set_tail(tail, [idx])
+		self._maketree_add(tail)
+		node = tail
+		for value in reversed(skip.suffix_pattern):
+			prev = autoresp_node()
+			prev.cand = cand
+			if value is None:
+				prev.next_else = node
+			else:
+				prev.next = dict(tree.next)
+				if isinstance(value, frozenset):
+					for data in value:
+						prev.next[data] = node
 				else:
-					if tail_node.enable:
-						# 有効なtail_nodeが重複したとき
-						# 先優先で、今回ノードは無効化する
-						tail_node.enable = False
-						resp[autoresp_list.ENABLE] = False
+					prev.next[value] = node
+				prev.next_else = tree.next_else
+			self._maketree_add(prev)
+			node = prev
+		skip.suffix = node
+		# ペイロード最終バイトは無条件にペイロード後のデータの先頭へ遷移する
+		skip.payload_end = autoresp_node()
+		skip.payload_end.cand = cand
+		skip.payload_end.next_else = skip.suffix
+		self._maketree_add(skip.payload_end)
+
+	def _maketree_compile(self, patterns: List[tuple]) -> Iterator[None]:
+		"""
+		部分集合構成法で解析ツリー(DFA)を構築する
+		1遷移作成するごとにyieldする。
+		状態は (データ定義idx, 一致済みバイト数) の集合で表す。
+		全データ定義の先頭(一致済み0バイト)は全状態に共通なので、状態には含めない。
+		また、直前の1バイトで全データ定義の先頭から遷移した分(再開分)は受信値だけで決まるので、
+		状態のキーは (直前の受信値, 再開分以外の集合) とし、再開分の遷移は受信値ごとにキャッシュする。
+		"""
+		# 全定義の先頭からの遷移
+		root_fix, root_any = self._maketree_next([(idx, 0) for idx, pattern in enumerate(patterns) if len(pattern) > 0], patterns)
+		# 受信値 -> 再開分の集合 (固定値で遷移しない受信値はNoneにまとめる)
+		restart: Dict[int, frozenset] = {None: frozenset(root_any)}
+		for value, next_state in root_fix.items():
+			restart[value] = frozenset(next_state | root_any)
+		# 受信値 -> 再開分から1バイト進めた集合
+		restart_next: Dict[int, tuple] = {}
+		for value, next_state in restart.items():
+			restart_next[value] = self._maketree_next(next_state, patterns)
+			yield
+		# 受信値 -> 再開分でマッチ完了するデータ定義(1バイトのデータ定義)
+		restart_tail: Dict[int, List[int]] = {}
+		for value, next_state in restart.items():
+			restart_tail[value] = [idx for idx, pos in next_state if pos == len(patterns[idx])]
+		# 状態 -> ノード
+		state_dict: Dict[tuple, autoresp_node] = {}
+		# 初期状態: 全定義の先頭のみ
+		root_state = ("root", frozenset())
+		state_dict[root_state] = self.tree
+		work = [root_state]
+		while work:
+			yield
+			state = work.pop()
+			node = state_dict[state]
+			if node is self.tree:
+				restart_fix, restart_any = ({}, set())
+				state_fix, state_any = ({}, set())
+			elif node.tail:
+				# tailに到達したらフレーム終了なので、rootと同じ遷移にする
+				# 長さフィールド終端も、読み飛ばし後はペイロード以降のノード列で解析するのでrootと同じ遷移にしておく
+				# rootは最初に処理済み
+				node.next = self.tree.next
+				node.next_else = self.tree.next_else
+				continue
+			else:
+				restart_fix, restart_any = restart_next[state[0]]
+				state_fix, state_any = self._maketree_next(state[1], patterns)
+			# 次状態を作成
+			next_any = restart_any | state_any
+			# 固定値の遷移先にはanyの遷移先も含める
+			for value in set(restart_fix.keys()) | set(state_fix.keys()) | set(root_fix.keys()):
+				next_state = restart_fix.get(value, set()) | state_fix.get(value, set()) | next_any
+				key = value if value in root_fix else None
+				node.next[value] = self._maketree_node(state_dict, work, (key, frozenset(next_state - restart[key])), restart, restart_tail, patterns)
+				yield
+			# どの固定値にも一致しないとき
+			# どのデータ定義にも一致しなければrootに戻る
+			node.next_else = self._maketree_node(state_dict, work, (None, frozenset(next_any - restart[None])), restart, restart_tail, patterns)
+
+	def _maketree_next(self, state, patterns: List[tuple]):
+		"""
+		状態から1バイト進めた状態を作成する
+		固定値で遷移する状態とanyで遷移する状態に分ける
+		受信値の集合は、集合に含まれる受信値ごとの固定値の遷移にする
+		"""
+		next_fix: Dict[int, set] = {}
+		next_any = set()
+		for idx, pos in state:
+			pattern = patterns[idx]
+			if pos >= len(pattern):
+				continue
+			value = pattern[pos]
+			if value is None:
+				next_any.add((idx, pos + 1))
+			elif isinstance(value, frozenset):
+				for data in value:
+					next_fix.setdefault(data, set()).add((idx, pos + 1))
+			else:
+				next_fix.setdefault(value, set()).add((idx, pos + 1))
+		return (next_fix, next_any)
 
+	def _maketree_node(self, state_dict: Dict[tuple, autoresp_node], work: List[tuple], state: tuple, restart: Dict[int, frozenset], restart_tail: Dict[int, List[int]], patterns: List[tuple]) -> autoresp_node:
+		"""
+		状態に対応するノードを取得する
+		未作成であれば作成して、処理待ちに登録する
+		"""
+		if state not in state_dict:
+			key, positions = state
+			if key is None and not positions and not restart[None]:
+				# どのデータ定義にも一致していなければroot
+				state_dict[state] = self.tree
+			else:
+				node = autoresp_node()
+				node.cand = (restart[key], positions)
+				state_dict[state] = node
+				self._maketree_set_tail(node, restart_tail[key] + [idx for idx, pos in positions if pos == len(patterns[idx])])
+				work.append(state)
+				self._maketree_add(node)
+		return state_dict[state]
+
+	def _maketree_add(self, node: autoresp_node) -> None:
+		"""
+		作成したノードを登録して状態番号を振る
+		"""
+		node.state = len(self.nodes)
+		self.nodes.append(node)
 
+	def _maketree_set_tail(self, node: autoresp_node, idx_list: List[int]) -> None:
+		"""
+		マッチ完了したデータ定義があればtailノードにする
+		"""
+		if not idx_list:
+			return
+		idx_list = sorted(set(idx_list))
+		node.tail = True
+		if not node.payload:
+			# 長さフィールドを含む設定は長さフィールド終端から読み飛ばしに移り、ペイロード以降のノード列でマッチする
+			skip_list = [self.skip_list[idx] for idx in idx_list if self.skip_list[idx] is not None]
+			if skip_list:
+				node.skip_list = skip_list
+				self.tree_skip_list.append(node)
+			idx_list = [idx for idx in idx_list if self.skip_list[idx] is None]
+			if not idx_list:
+				return
+		node.frame_len = self.data_list[idx_list[0]].frame_len
+		# 定義順に登録する
+		for idx in idx_list:
+			tail_node = self.data_list[idx]
+			node.tail_list[tail_node.id] = tail_node
+			tail_node.autoresp_refs.append(node)
+		# ツリー情報登録
+		self.tree_tail_list.append(node)
 
 	def _maketree_make_tail(self, resp) -> autoresp_tail_node:
 		id = resp[autoresp_list.ID]
@@ -394,6 +1342,9 @@ class autoresp_mng:
 			node.enable = resp[autoresp_list.ENABLE]
 			node.id = id
 			node.send_id = resp[autoresp_list.SENDDATA_ID]
+			if isinstance(node.send_id, autoresp_select):
+				node.select = node.send_id
+				node.send_id = str(node.select)
 			# 受信データ解析アダプタ
 			node.anlyz_adpt = recvdata_adapter(self._autosend_mng, self._send_mng, node)
 			# 受信解析ハンドラを取得
@@ -403,8 +1354,22 @@ class autoresp_mng:
 			hdl_log = resp[autoresp_list.ANLYZ_LOG]
 			if hdl_log is not None:
 				node.anlyz_log = partial(hdl_log, hdl=node.anlyz_adpt)
+			# オプション
+			node.opt = autoresp_opt()
+			if len(resp) > autoresp_list.OPTION and resp[autoresp_list.OPTION] is not None:
+				node.opt = resp[autoresp_list.OPTION]
+			# フィールドコピー先の送信データ参照設定
+			node.echo = self._maketree_echo(node)
 			# 送信データ参照設定
-			if node.send_id not in self._autosend_mng._data_dict.keys():
+			if node.select is not None:
+				# 選択表の自動送信データ
+				id_list = [send_id for send_id in node.select.id_list() if send_id not in self._autosend_mng._data_dict.keys()]
+				if id_list:
+					node.enable = False
+					print("autosend_id[" + ",".join(id_list) + "] is not exist.")
+				else:
+					node.select_index, node.senddata_ref = node.select.make_index(self._autosend_mng._data_dict)
+			elif node.send_id not in self._autosend_mng._data_dict.keys():
 				node.enable = False
 				print("autosend_id[" + node.send_id + "] is not exist.")
 			else:
@@ -422,113 +1387,582 @@ class autoresp_mng:
 		# 終了
 		return node
 
-	def _maketree_set_tail(self, node:autoresp_node, enable:bool, id:str, send_id:str):
-		pass
+	def _maketree_echo(self, tail_node: autoresp_tail_node) -> List[tuple]:
+		"""
+		フィールドコピーを書き込み先の送信データごとにまとめる
+		存在しない送信データ定義名を含む設定は無効化する
+		"""
+		echo_dict: Dict[str, tuple] = {}
+		for echo in tail_node.opt.echo:
+			if echo.send_id not in self._send_mng._send_data_dict.keys():
+				tail_node.enable = False
+				print("send_id[" + echo.send_id + "] is not exist.")
+				continue
+			senddata: send_data_node = self._send_mng._send_data_dict[echo.send_id]
+			if echo.dst + echo.size > senddata.size:
+				raise Exception(f"autoresp[{tail_node.id}]: echo field is out of send data[{echo.send_id}].")
+			if echo.send_id not in echo_dict:
+				echo_dict[echo.send_id] = (senddata, [])
+			echo_dict[echo.send_id][1].append((echo.src, echo.dst, echo.size))
+		return list(echo_dict.values())
 
-	def _maketree_clone_else2next(self, node: autoresp_node, autoresp):
-		"""
-		ツリー構築補助関数
-		elseノードをnextノードにコピーする
-		"""
-
-	def _maketree_clone_next2else(self, node: autoresp_node, autoresp):
-		"""
-		ツリー構築補助関数
-		nextノードをelseノードにコピーする。
-		nextノードが複数存在する場合、すべて統合してelseノードとなる。
-
-			[curr]	->	[next]	->	A	->	[next]	->	B
-													->	C
-											[else]	
-								->	D	->	[next]	->	B
-													->	E
-											[else]	
-								->	Z	->	[tail]
-						↓コピー
-					->	[else]	=======>	[next]	->	B
-													->	C
-													->	E
-		"""
-		# elseノードチェック
-		if node.next_else is None:
-			# 関数に渡す前にインスタンスは作成しておくこと
-			raise Exception("make node instance, before copy method.")
-		# nextノードチェック
-		if not node.next:
-			# nextノードが存在しなければ何もせず終了
-			return
-		# 
-		for next in node.next.values():
-			self._maketree_merge_node(next, node.next_else)
-
-	def _maketree_merge_node(self, src_node: autoresp_node, dist_node: autoresp_node):
-		"""
-		1階層コピーする
-		末端に到達するまで再帰的に繰り返す
-		"""
-		if src_node.tail:
-			# tail設定
-			dist_node.tail = True
-			# enableチェック
-			has_enable = False
-			if dist_node.tail_active is not None:
-				has_enable = True
-			# tailノードリストマージ
-			for key in src_node.tail_list.keys():
-				# 参照作成
-				dist_node.tail_list[key] = src_node.tail_list[key]
-				# tailノード有効チェック
-				if dist_node.tail_list[key].enable:
-					if has_enable:
-						dist_node.tail_list[key].enable = False
-					else:
-						dist_node.tail_active = dist_node.tail_list[key]
-						has_enable = True
+	def update_enable(self, value:bool, row:int):
+		"""
+		有効設定更新
+		"""
+		self.data_list[row].enable = value
 
-		else:
-			# nextノードを順番にコピー
-			for key in src_node.next.keys():
-				# keyチェック
-				if key not in dist_node.next.keys():
-					dist_node.next[key] = autoresp_node()
-				# コピー実行
-				self._maketree_merge_node(src_node.next[key], dist_node.next[key])
-			# srcノードがelseノードを持っているとき
-			# elseノードコピー
-			if src_node.next_else is not None:
-				# elseインスタンスチェック
-				if dist_node.next_else is None:
-					dist_node.next_else = autoresp_node()
-				# コピー実行
-				self._maketree_merge_node(src_node.next_else, dist_node.next_else)
+	def update_tree_check(self):
+		"""
+		設定を解析ツリーに反映する
+		"""
+		# 同じ受信データパターンで有効設定に重複が無いかチェックする
+		# パターンが重なるだけの設定は定義順で先の設定を優先するので重複とはしない
+		dup_list = []
+		check_dict = {}
+		for i, tail_node in enumerate(self.data_list):
+			if tail_node.tail_id not in check_dict.keys():
+				# 未登録であれば登録
+				check_dict[tail_node.tail_id] = tail_node.enable
+			else:
+				# enable=Trueが重複していたらチェックしておく
+				if tail_node.enable and check_dict[tail_node.tail_id]:
+					tail_node.enable = False
+					dup_list.append(i)
+				elif tail_node.enable:
+					check_dict[tail_node.tail_id] = True
+		return dup_list
+		
+	def update_tree(self):
+		"""
+		設定を解析ツリーに反映する
+		"""
+		# tailノードごとに、定義順で先の有効な設定を有効tailとする
+		for tail in self.tree_tail_list:
+			tail.tail_active = None
+			tail.frame_len = next(iter(tail.tail_list.values())).frame_len
+			for tail_node in tail.tail_list.values():
+				if tail_node.enable:
+					tail.tail_active = tail_node
+					tail.frame_len = tail_node.frame_len
+					break
+		# 長さフィールド終端ごとに、定義順で先の有効な設定が長さフィールドを含む設定なら読み飛ばし、
+		# 同じノードで終わる長さフィールドを含まない設定ならフレーム終了とする
+		# 有効な設定が無くても定義順で先の設定でフレームの区切りは判定する
+		if self.tree_skip_list:
+			order = {id(tail_node): idx for idx, tail_node in enumerate(self.data_list)}
+		for node in self.tree_skip_list:
+			skip = next((skip for skip in node.skip_list if skip.tail_node.enable), None)
+			tail_node = node.tail_active
+			if skip is None and tail_node is None:
+				skip = node.skip_list[0]
+				tail_node = next(iter(node.tail_list.values()), None)
+			if skip is not None and tail_node is not None and order[id(tail_node)] < order[id(skip.tail_node)]:
+				skip = None
+			node.skip_active = skip
+
+	def stats_abort(self) -> List[int]:
+		"""
+		解析ツリーのノードに記録したマッチ途中で外れた回数を、自動応答設定ごとに集計する
+		"""
+		abort = [0] * len(self.data_list)
+		for node in self.nodes:
+			if node.abort:
+				for idx in {idx for state in node.cand for idx, pos in state}:
+					abort[idx] += node.abort
+		return abort
+
+	def stats_table(self) -> List[list]:
+		"""
+		自動応答設定ごとの統計情報を表形式で返す
+			[ID, マッチ回数, マッチ途中で外れた回数, FCC NG回数, バイト数, 受信解析回数, 受信解析合計時間[us], 受信解析最大時間[us],
+			 応答遅延回数, 応答遅延の遅れ平均[us], 応答遅延の遅れ最大[us]]
+		"""
+		table = []
+		for tail_node, abort in zip(self.data_list, self.stats_abort()):
+			stats = tail_node.stats
+			table.append([
+				tail_node.id, stats.match, stats.abort + abort, stats.fcc_error, stats.bytes,
+				stats.cb_count, stats.cb_time // 1000, stats.cb_max // 1000,
+				stats.delay_count, round(stats.delay_error / max(stats.delay_count, 1) / 1000, 1), round(stats.delay_max / 1000, 1),
+			])
+		return table
+
+	def stats_clear(self) -> None:
+		"""
+		統計情報をクリアする
+		"""
+		for tail_node in self.data_list:
+			tail_node.stats = autoresp_stats()
+		for node in self.nodes:
+			node.abort = 0
 
 
+class autoresp_mng:
+	"""
+	受信データ解析
+	解析ツリー一式(autoresp_ruleset)を使って受信データを解析する。
+	解析ツリー一式の差し替えは、ruleset_create()で作成したものをruleset_publish()で登録しておき、
+	シリアル通信スレッドが受信の合間に構築して、フレームの切れ目で参照を1回入れ替えて反映する。
+	"""
+
+	def __init__(self, autoresp, as_mng: autosend_mng, s_mng: send_mng) -> None:
+		# 手動送信データへの参照
+		self._send_mng : send_mng = s_mng
+		# 自動送信データへの参照
+		self._autosend_mng: autosend_mng = as_mng
+		# 解析ツリー一式
+		# 受信解析で参照する情報はruleset差し替え時にまとめて更新する
+		self._ruleset: autoresp_ruleset = None
+		self.tree: autoresp_node = None
+		self.tree_tail_list: List[autoresp_node] = []
+		self.data_dict: Dict[str, autoresp_tail_node] = {}
+		self.data_list: List[autoresp_tail_node] = []
+		self._table: autoresp_table = None
+		# 差し替え待ちの解析ツリー一式と差し替え後のコールバック (ruleset, cb)
+		# 書き換えるのは登録側だけで、シリアル通信スレッドは反映済みの要求を_ruleset_takenに覚えて区別する
+		self._ruleset_pending: tuple = None
+		self._ruleset_taken: tuple = None
+		# シリアル通信スレッドで構築中の解析ツリー一式
+		self._ruleset_building: autoresp_ruleset = None
+		# 構築中に止めたGCを差し替え時に再開する
+		self._ruleset_gc: bool = False
+		# 差し替えで不要になった解析ツリー一式(シリアル通信スレッドで循環参照を切る)
+		self._ruleset_dispose: List[autoresp_ruleset] = []
+		# 正常受信データバッファ
+		# マッチ途中のデータのうち、最長の受信データパターン分だけ保持する
+		self._data_buff: frame_buffer = None
+		self._data_buff_max: int = 0
+		# 解析情報
+		self._curr_node: autoresp_node = None
+		self._prev_recv_analyze_result: bool = True
+		self._curr_state: int = 0
+		# ペイロード読み飛ばし情報
+		# 長さフィールドで求めたペイロード長と、読み飛ばしの残りバイト数
+		self._payload_len: int = 0
+		self._skip_remaining: int = 0
+		# 状態遷移方式
+		# TABLEは遷移表の分だけメモリと構築時間が増えるのに、計測ではTREEより速くならないのでTREEを標準とする
+		self._match_mode: MatchMode = MatchMode.TREE
+		self._recv_analyze_trans = None
+		# 受信解析(観測のみ)の実施スレッド
+		# 解析ツリー一式の差し替えをまたいでも設定ごとの実施順を保つので、解析ツリー一式とは別に持つ
+		self._anlyz_worker = anlyz_worker()
+		# 解析ツリー一式構築
+		self._ruleset_apply(self.ruleset_build(autoresp))
+		self.matcher_update(self._match_mode)
+
+	def ruleset_build(self, autoresp) -> autoresp_ruleset:
+		"""
+		自動応答設定から解析ツリー一式を構築する
+		受信解析の状態は参照しないので、任意のスレッドから実施できる。
+		ただし構築中はGILを持ち続けるので、シリアル通信スレッドの受信解析も止まる。
+		受信中に差し替えるときはruleset_create()を使う。
+		"""
+		ruleset = autoresp_ruleset(autoresp, self._autosend_mng, self._send_mng, self._match_mode == MatchMode.TABLE)
+		ruleset.build()
+		return ruleset
+
+	def ruleset_create(self, autoresp) -> autoresp_ruleset:
+		"""
+		自動応答設定から解析ツリー一式を作成する
+		自動応答設定のチェックまでを実施して、解析ツリーは構築しない。
+		ruleset_publish()で登録すると、シリアル通信スレッドが受信の合間に少しずつ構築してから差し替える。
+		"""
+		return autoresp_ruleset(autoresp, self._autosend_mng, self._send_mng, self._match_mode == MatchMode.TABLE)
+
+	def ruleset_publish(self, ruleset: autoresp_ruleset, cb: Callable[[], None] = None) -> None:
+		"""
+		解析ツリー一式の差し替えを要求する
+		任意のスレッドから実施できる。差し替えはシリアル通信スレッドがフレームの切れ目で実施する。
+			- マッチ途中のデータが無いとき: 次の受信データ解析の先頭
+			- マッチ途中のとき: tailに到達するか、マッチしなくなった時点
+			- マッチ途中のまま受信が途切れたとき: ruleset_sync()でマッチ途中のデータを破棄して差し替え
+		差し替え後のフレームはすべて新しい解析ツリーで解析する。
+		構築前の解析ツリー一式(ruleset_create())は、ruleset_sync()で構築が完了してから差し替える。
+		cbは差し替え後にシリアル通信スレッドから呼び出す。
+		差し替え前に再度要求されたときは、後の要求で上書きする。
+		"""
+		# 解析ツリー一式とコールバックを組にして、参照の代入1回で登録する
+		self._ruleset_pending = (ruleset, cb)
+
+	def ruleset_sync(self) -> bool:
+		"""
+		差し替え待ちの解析ツリー一式があれば差し替える
+		受信が途切れたとき(シリアル通信スレッド)、または受信解析が停止しているときに実施する。
+		構築途中であれば、RULESET_STEP_BUDGETだけ構築を進める。
+		構築が完了していれば、マッチ途中のデータは破棄して差し替える。
+		差し替え待ちが無ければ、差し替えで不要になった解析ツリー一式の循環参照をRULESET_STEP_BUDGETだけ切る。
+		差し替えたときはTrueを返す。
+		"""
+		pending = self._ruleset_next()
+		if pending is None:
+			self._ruleset_track(None)
+			if self._ruleset_dispose and self._ruleset_dispose[0].dispose(RULESET_STEP_BUDGET):
+				self._ruleset_dispose.pop(0)
+			return False
+		ruleset, cb = pending
+		self._ruleset_track(ruleset)
+		if not ruleset.built:
+			# 構築中はGCを止める
+			# 構築途中のノードは参照が循環していて、世代別GCが走査するたびに全スレッドが止まる
+			# (1000件の自動応答設定で最大100ms程度)
+			if not self._ruleset_gc and gc.isenabled():
+				gc.disable()
+				self._ruleset_gc = True
+			if not ruleset.build(RULESET_STEP_BUDGET):
+				return False
+		self._ruleset_swap(pending)
+		return True
+
+	def ruleset_busy(self) -> bool:
+		"""
+		ruleset_sync()で進める処理(構築、差し替え、破棄)が残っていればTrueを返す
+		"""
+		return self._ruleset_next() is not None or len(self._ruleset_dispose) > 0
+
+	def ruleset_suspend(self) -> None:
+		"""
+		ruleset_sync()による構築を中断する
+		シリアル通信スレッド終了時に実施して、構築中に止めたGCを再開する。
+		構築途中の解析ツリー一式は次回のruleset_sync()で続きから構築する。
+		"""
+		if self._ruleset_gc:
+			gc.enable()
+			self._ruleset_gc = False
+
+	def _ruleset_next(self) -> tuple:
+		"""
+		未反映の差し替え要求 (ruleset, cb) を返す
+		無ければNoneを返す
+		"""
+		pending = self._ruleset_pending
+		if pending is self._ruleset_taken:
+			return None
+		return pending
+
+	def _ruleset_ready(self) -> tuple:
+		"""
+		構築済みの未反映の差し替え要求 (ruleset, cb) を返す
+		無ければNoneを返す
+		"""
+		pending = self._ruleset_next()
+		if pending is None or not pending[0].built:
+			return None
+		return pending
+
+	def _ruleset_track(self, ruleset: autoresp_ruleset) -> None:
+		"""
+		構築中の解析ツリー一式が差し替え前に上書きされたら破棄する
+		"""
+		if ruleset is not self._ruleset_building:
+			if self._ruleset_building is not None and self._ruleset_building is not self._ruleset:
+				self._ruleset_dispose.append(self._ruleset_building)
+			self._ruleset_building = ruleset
+
+	def _ruleset_swap(self, pending: tuple) -> None:
+		"""
+		差し替え要求 (ruleset, cb) の解析ツリー一式に差し替える
+		"""
+		ruleset, cb = pending
+		self._ruleset_taken = pending
+		self._ruleset_track(ruleset)
+		self._ruleset_building = None
+		self._ruleset_apply(ruleset)
+		self.recv_analyze_init()
+		if self._ruleset_gc:
+			# 構築した解析ツリー一式は以降のGCで走査しないようにして、GCを再開する
+			# 差し替えで不要になったらdispose()で循環参照を切って、参照カウントで解放する
+			gc.freeze()
+			gc.enable()
+			self._ruleset_gc = False
+		if cb is not None:
+			cb()
+
+	def _ruleset_apply(self, ruleset: autoresp_ruleset) -> None:
+		if self._match_mode == MatchMode.TABLE:
+			# 遷移表無しで作成した後にTABLEに切り替えていたとき
+			ruleset.table_build()
+		if self._ruleset is not None and self._ruleset is not ruleset:
+			# 統計情報は同じIDの自動応答設定に引き継ぐ
+			# ノードに記録したマッチ途中で外れた回数は、差し替え前の解析ツリー一式の破棄時に移す
+			self._ruleset_dispose.append(self._ruleset)
+			for tail_node in ruleset.data_list:
+				if tail_node.id in self.data_dict:
+					tail_node.stats = self.data_dict[tail_node.id].stats
+			# 観測のみの受信解析が無くなった設定のスレッドは終了する
+			# 差し替えを止めないように完了は待たない(実施待ちの受信解析は実施される)
+			self._anlyz_worker.shutdown(False, {tail_node.id for tail_node in ruleset.data_list if tail_node.opt.anlyz_data == CallbackMode.OBSERVE})
+		self._ruleset = ruleset
+		self.tree = ruleset.tree
+		self.tree_tail_list = ruleset.tree_tail_list
+		self.data_dict = ruleset.data_dict
+		self.data_list = ruleset.data_list
+		self._table = ruleset.table
+		self._data_buff_max = ruleset.data_buff_max
+		self._data_buff = frame_buffer(0, max(self._data_buff_max, 1))
+
+	def anlyz_worker_shutdown(self) -> None:
+		"""
+		観測のみの受信解析スレッドを終了する
+		実施待ちの受信解析が完了するまで待つ。以降の受信解析で再度スレッドを作成する。
+		"""
+		self._anlyz_worker.shutdown()
+
+	def matcher_update(self, mode: MatchMode) -> None:
+		"""
+		受信解析の状態遷移方式を設定する
+		TABLEに切り替えたときは、使用中の解析ツリー一式の遷移表が無ければその場で作成する。
+		構築中の解析ツリー一式は構築時に遷移表も作成する。
+		"""
+		self._match_mode = mode
+		if mode == MatchMode.TABLE:
+			self._ruleset.table_build()
+			self._table = self._ruleset.table
+			if self._ruleset_building is not None:
+				self._ruleset_building.table_build()
+			self._recv_analyze_trans = self._recv_analyze_trans_table
+		else:
+			self._recv_analyze_trans = self._recv_analyze_trans_tree
+		self.recv_analyze_init()
 
 	def recv_analyze_init(self):
 		"""
 		受信解析を初期化する
 		"""
 		self._curr_node = self.tree
-		self._data_buff = b''
+		self._curr_state = 0
+		self._prev_recv_analyze_result = False
+		self._payload_len = 0
+		self._skip_remaining = 0
+		self._data_buff.clear()
 
-	def recv_analyze(self, data: bytes) -> analyze_result:
+	def recv_analyze_timeout(self) -> bool:
+		"""
+		キャラクタ間タイムアウト
+		マッチ途中で受信が途切れたときに、マッチ途中のデータを破棄して次の受信をフレーム先頭から解析する。
+		破棄したときはTrueを返す。
+		"""
+		if not self._prev_recv_analyze_result:
+			return False
+		# マッチ途中のフレーム候補が外れた
+		self._curr_node.abort += 1
+		self.recv_analyze_init()
+		return True
+
+	def recv_analyze(self, data: memoryview) -> analyze_result:
+		# 解析ツリー一式の差し替え
+		# マッチ途中のデータが無いときだけ実施する
+		pending = self._ruleset_ready()
+		if pending is not None and not self._prev_recv_analyze_result:
+			self._ruleset_swap(pending)
 		# 今回解析結果
 		result = analyze_result(data)
+		prev_node = self._curr_node
 
+		if self._skip_remaining > 0:
+			# ペイロード読み飛ばし中
+			self._skip_remaining -= 1
+			self._data_buff.push(data)
+			self._recv_analyze_success(data, result)
+			return result
 		# 状態遷移チェック
-		trans_result = self._recv_analyze_trans(data)
-		if trans_result:
+		# 全ノードがrootの遷移を含むので、rootに戻ったときはマッチ途中のデータが無い
+		if self._recv_analyze_trans(data) and self._curr_node is not self.tree:
 			# 解析OK
-			self._data_buff += data
-			self._recv_analyze_success(data, result)
+			self._data_buff.push(data)
+			node = prev_node = self._curr_node
+			if node.skip_active is not None:
+				# 長さフィールド終端
+				node = self._recv_analyze_skip(node, self._data_buff.view(node.skip_active.field_size))
+			if node is not self.tree:
+				self._recv_analyze_success(data, result)
+				return result
+			# 長さフィールドが不正
+			self._data_buff.clear()
+			self._recv_analyze_failure(data, result, prev_node)
 		else:
 			# 解析NG
-			self._data_buff = b''
-			self._recv_analyze_failure(data, result)
+			self._data_buff.clear()
+			self._recv_analyze_failure(data, result, prev_node)
 		#
 		return result
 
-	def _recv_analyze_trans(self, byte_data: bytes) -> bool:
+	def recv_analyze_chunk(self, data: memoryview, notify: Callable[[analyze_result], None] = None) -> List[analyze_result]:
+		"""
+		受信データをまとめて解析する
+		recv_analyze()は末尾バイトの解析結果しか返さないので、複数バイトを渡すとtailやcommitを取りこぼす。
+		こちらは解析結果をイベント単位にまとめて、発生順のリストで返す。
+			- マッチ候補の開始(NG -> OK): その位置から始まる結果のprev_buff_commit()
+			- tail到達: その位置で終わる結果のbuff_commit()、id(自動応答設定名)、frame_len
+			- それ以外: イベントの間のデータはnew_data_push()のみの結果にまとめる
+		各結果のdataは受信データのスライスで、offsetに受信データ内での位置を持つ。
+		フレーム先頭の位置は offset + len(data) - frame_len となる。
+		受信データ解析(anlyz_data)と自動応答設定(activate)はtail到達時にその場で実施する。
+		notifyを指定したときは結果ができるたびに呼び出すので、自動応答はその中で送信できる。
+		解析ツリー一式の差し替え要求があれば、フレームの切れ目(先頭、tail到達、マッチしなくなった時点)で差し替える。
+		長さフィールドの終端に到達したら、ペイロードは1バイトずつ解析せずにまとめて読み飛ばす。
+		"""
+		results: List[analyze_result] = []
+		# 解析ツリー一式の差し替え
+		swap = self._ruleset_ready()
+		if swap is not None and not self._prev_recv_analyze_result:
+			self._ruleset_swap(swap)
+			swap = None
+		tree = self.tree
+		use_table = (self._match_mode == MatchMode.TABLE)
+		if use_table:
+			trans = self._table.trans
+			nodes = self._table.nodes
+		node = self._curr_node
+		state = self._curr_state
+		# マッチ途中か
+		cand = self._prev_recv_analyze_result
+		# マッチ途中データの開始位置
+		# 前回受信から続いているときは_data_buffに前回分があり、今回受信内で始まったときは_data_buffは空
+		cand_start = 0
+		# 未出力データの開始位置
+		seg_start = 0
+		seg_commit_prev = False
+		it = enumerate(data)
+		if self._skip_remaining > 0:
+			# 前回受信から続くペイロードを読み飛ばす
+			skip = min(self._skip_remaining, len(data))
+			next(islice(it, skip, skip), None)
+			self._skip_remaining -= skip
+		for i, byte in it:
+			# 状態遷移
+			if use_table:
+				# ノードを参照するのは遷移先がtail(負値)のときだけ
+				next_state = trans[state + byte]
+				if next_state < 0:
+					next_state = ~next_state
+					next_node = nodes[next_state >> 8]
+				elif next_state == 0:
+					next_node = tree
+				else:
+					next_node = None
+			else:
+				next_state = 0
+				next_node = node.next.get(byte, node.next_else)
+			if next_node is tree:
+				# 解析NG
+				if cand:
+					# マッチ途中のフレーム候補が外れた
+					if node is None:
+						node = nodes[state >> 8]
+					node.abort += 1
+					cand = False
+				node = tree
+				state = 0
+				if swap is not None:
+					# マッチ途中のデータが無くなったので差し替え
+					self._ruleset_swap(swap)
+					swap = None
+					tree = node = self.tree
+					if use_table:
+						trans = self._table.trans
+						nodes = self._table.nodes
+					state = 0
+				continue
+			node = next_node
+			state = next_state
+			if not cand:
+				# NG -> OK
+				# ここまでのデータを出力して、ここから新しいフレーム候補とする
+				if i > seg_start:
+					results.append(self._recv_analyze_chunk_result(data, seg_start, i, seg_commit_prev, notify))
+				seg_start = i
+				seg_commit_prev = True
+				cand = True
+				cand_start = i
+				self._data_buff.clear()
+			if node is not None and node.tail:
+				if node.skip_active is not None:
+					# 長さフィールド終端
+					size = node.skip_active.field_size
+					if i + 1 - size >= cand_start:
+						field = data[i+1-size:i+1]
+					else:
+						# 前回受信から続く長さフィールド
+						field = bytes(self._data_buff.view(size - (i + 1))) + bytes(data[:i+1])
+					field_node = node
+					node = self._recv_analyze_skip(node, field)
+					state = self._curr_state
+					if node is tree:
+						# 長さフィールドが不正
+						field_node.abort += 1
+						cand = False
+						continue
+					# ペイロードを読み飛ばす
+					# 最終バイトは次の遷移で処理する
+					skip = min(self._skip_remaining, len(data) - (i + 1))
+					if skip > 0:
+						next(islice(it, skip, skip), None)
+						self._skip_remaining -= skip
+					if not node.tail:
+						continue
+				# tail到達
+				result = analyze_result(data[seg_start:i+1])
+				result.offset = seg_start
+				if seg_commit_prev:
+					result.set_analyze_NG2OK()
+				self._curr_node = node
+				self._curr_state = state
+				frame_len = self._recv_analyze_frame_len(node)
+				if len(self._data_buff) > 0:
+					# 前回受信から続くフレーム
+					self._data_buff.push(data[cand_start:i+1])
+					frame = self._data_buff.view(frame_len)
+				else:
+					# 今回受信内のフレームはコピーせずに受信データを参照する
+					frame = data[i+1-frame_len:i+1]
+				self._recv_analyze_tail(node, frame, frame_len, result)
+				results.append(result)
+				if notify is not None:
+					notify(result)
+				# フレーム終了
+				seg_start = i + 1
+				seg_commit_prev = False
+				cand = False
+				if swap is not None:
+					# フレーム終了で差し替え
+					self._ruleset_swap(swap)
+					swap = None
+					tree = node = self.tree
+					if use_table:
+						trans = self._table.trans
+						nodes = self._table.nodes
+					state = 0
+		# 残りのデータを出力
+		if seg_start < len(data):
+			results.append(self._recv_analyze_chunk_result(data, seg_start, len(data), seg_commit_prev, notify))
+		# 解析情報更新
+		if node is None:
+			node = nodes[state >> 8]
+		self._curr_node = node
+		self._curr_state = state
+		self._prev_recv_analyze_result = cand
+		if cand:
+			self._data_buff.push(data[cand_start:])
+		else:
+			self._data_buff.clear()
+		return results
+
+	def _recv_analyze_chunk_result(self, data: memoryview, begin: int, end: int, commit_prev: bool, notify: Callable[[analyze_result], None]) -> analyze_result:
+		"""
+		イベントの間のデータをまとめた解析結果を作成する
+		"""
+		result = analyze_result(data[begin:end])
+		result.offset = begin
+		if commit_prev:
+			result.set_analyze_NG2OK()
+		result.set_analyzing()
+		if notify is not None:
+			notify(result)
+		return result
+
+	def _recv_analyze_trans_tree(self, byte_data: bytes) -> bool:
 		result: bool
 		for data in byte_data:
 			# 状態遷移チェック
@@ -548,6 +1982,25 @@ class autoresp_mng:
 		#
 		return result
 
+	def _recv_analyze_trans_table(self, byte_data: bytes) -> bool:
+		result: bool
+		trans = self._table.trans
+		for data in byte_data:
+			# 状態遷移チェック
+			state = trans[self._curr_state + data]
+			if state != -1:
+				# 解析OK
+				if state < 0:
+					state = ~state
+				self._curr_state = state
+				self._curr_node = self._table.nodes[state >> 8]
+				result = True
+			else:
+				# 解析NG
+				result = False
+		#
+		return result
+
 	def _recv_analyze_success(self, data: bytes, result: analyze_result):
 		# 前回結果
 		if self._prev_recv_analyze_result:
@@ -558,134 +2011,174 @@ class autoresp_mng:
 			result.set_analyze_NG2OK()
 		# tailチェック
 		# 遷移後ノードでチェック
-		if self._curr_node.tail:
-			tail_node = self._curr_node.tail_active
-			anlyz_log = None
-			if tail_node is not None:
-				anlyz_log = tail_node.anlyz_log
-			# 受信解析正常終了
-			result.set_analyze_succeeded(tail_node, anlyz_log)
-			# 正常受信時処理を実施
-			if tail_node is not None:
-				# 受信データ解析
-				if tail_node.anlyz_data is not None:
-					tail_node.anlyz_data(data=self._data_buff)
-				# 自動応答設定
-				self._autosend_mng.activate(tail_node.senddata_ref)
+		node = self._curr_node
+		if node.tail:
+			frame_len = self._recv_analyze_frame_len(node)
+			self._recv_analyze_tail(node, self._data_buff.view(frame_len), frame_len, result)
 		else:
 			# 解析継続中
 			result.set_analyzing()
+			# 前回結果更新
+			self._prev_recv_analyze_result = True
+
+	def _recv_analyze_skip(self, node: autoresp_node, field) -> autoresp_node:
 		"""
-		# 解析途中で解析テーブルの末尾に到達
-		# 受信解析途中終了
-		if not self._curr_node.next and self._curr_node.next_else is None:
-			analyze_result.set_analyze_failed()
+		長さフィールド終端処理
+		長さフィールドからペイロード長を求めて、読み飛ばし後の遷移先ノードを返す。
+		ペイロードの最終バイトはペイロード以降のノード列への遷移として通常通りに解析するので、
+		読み飛ばすのはペイロード長-1バイトとなる。
+		ペイロード長が不正(負)ならrootを返す。
 		"""
+		skip = node.skip_active
+		payload_len = skip.payload_len(field)
+		if payload_len < 0:
+			self._curr_node = self.tree
+			self._curr_state = 0
+			return self.tree
+		self._payload_len = payload_len
+		if payload_len == 0:
+			# ペイロードが無ければペイロード以降のノード列から
+			self._curr_node = skip.suffix
+			self._curr_state = skip.suffix_state
+		else:
+			self._curr_node = skip.payload_end
+			self._curr_state = skip.payload_state
+			self._skip_remaining = payload_len - 1
+		return self._curr_node
 
-		# 前回結果更新
-		self._prev_recv_analyze_result = True
+	def _recv_analyze_frame_len(self, node: autoresp_node) -> int:
+		"""
+		マッチしたフレームのバイト長
+		"""
+		if node.payload:
+			return node.frame_len + self._payload_len
+		return node.frame_len
 
-	def _recv_analyze_failure(self, data: bytes, result: analyze_result):
+	def _recv_analyze_tail(self, node: autoresp_node, frame: memoryview, frame_len: int, result: analyze_result):
+		"""
+		tail到達時処理
+		frameはマッチしたフレームのmemoryviewで、受信データ解析(anlyz_data)に渡す。
+		受信データ解析の中でだけ有効で、保持するときはコピーすること。
+		"""
+		tail_node = node.tail_active
+		anlyz_log = None
+		if tail_node is not None:
+			anlyz_log = tail_node.anlyz_log
+		# 受信解析正常終了
+		result.set_analyze_succeeded(tail_node, anlyz_log, frame_len)
+		# FCCチェック
+		# 自動応答より前にチェックして、FCC NGのフレームには自動応答しない
+		if tail_node is not None and tail_node.fcc is not None and not tail_node.fcc.check(frame):
+			result.set_fcc_error()
+			tail_node.stats.fcc_error += 1
+			tail_node = None
+		# 正常受信時処理を実施
+		if tail_node is not None:
+			stats = tail_node.stats
+			stats.match += 1
+			stats.bytes += frame_len
+			# フィールドコピー
+			if tail_node.echo:
+				self._recv_analyze_echo(tail_node, frame)
+			# 受信データ解析
+			if tail_node.anlyz_data is not None:
+				timestamp_begin = time.perf_counter_ns()
+				if tail_node.opt.anlyz_data == CallbackMode.OBSERVE:
+					# 観測のみであれば別スレッドで実施する
+					# frameは受信バッファを参照しているのでコピーして渡す
+					self._anlyz_worker.submit(tail_node.id, tail_node.anlyz_data, bytes(frame))
+				else:
+					tail_node.anlyz_data(data=frame)
+				elapsed = time.perf_counter_ns() - timestamp_begin
+				stats.cb_count += 1
+				stats.cb_time += elapsed
+				if elapsed > stats.cb_max:
+					stats.cb_max = elapsed
+			# 自動応答設定
+			senddata_ref = tail_node.senddata_ref
+			if tail_node.select_index is not None:
+				# 受信値で自動送信データを選択
+				senddata_ref = tail_node.select.select(tail_node.select_index, senddata_ref, frame)
+			if senddata_ref is not None:
+				if tail_node.opt.delay > 0:
+					# 応答遅延: 受信フレーム末尾の受信時間を起点にシリアル通信スレッドで待機する
+					self._autosend_mng.activate(senddata_ref, tail_node.opt.delay, tail_node.stats.set_delay_error)
+				else:
+					self._autosend_mng.activate(senddata_ref)
+		# フレーム終了
+		self._data_buff.clear()
+		self._prev_recv_analyze_result = False
+
+	def _recv_analyze_echo(self, tail_node: autoresp_tail_node, frame: memoryview):
+		"""
+		受信フレームのフィールドを送信データにコピーする
+		送信データごとにまとめて書き込んでから、bytesへの反映とGUI反映要求を1回だけ行う。
+		"""
+		for senddata, echo_list in tail_node.echo:
+			for src, dst, size in echo_list:
+				if src < 0:
+					src += len(frame)
+				senddata.write_bytes(dst, frame[src:src+size])
+			senddata.update_bytes()
+			self._send_mng.gui_refresh_req(senddata)
+
+	def _recv_analyze_failure(self, data: bytes, result: analyze_result, prev_node: autoresp_node):
 		# 前回結果
 		if self._prev_recv_analyze_result:
 			# OK -> NG
 			result.set_analyze_OK2NG()
+			# マッチ途中のフレーム候補が外れた
+			prev_node.abort += 1
 		else:
 			# NG -> NG
 			result.set_analyze_NG2NG()
 		# 前回結果更新
 		self._prev_recv_analyze_result = False
-		# 解析失敗したので最初から解析しなおし
-		self.recv_analyze_init()
-		# 先頭からマッチするかチェック
-		trans_check = self._recv_analyze_trans(data)
-		if trans_check:
-			# 解析OKなら
-			self._recv_analyze_success(data, result)
-			# ここまでの解析は失敗、次の解析開始
-			result.set_analyze_next_start()
-			self._data_buff = data
-		else:
-			# 解析失敗継続
-			result.set_analyze_failed()
+		# 解析失敗継続
+		result.set_analyze_failed()
 
 
 	def update_enable(self, value:bool, row:int):
 		"""
 		有効設定更新
 		"""
-		self.data_list[row].enable = value
+		self._ruleset.update_enable(value, row)
 
 	def update_tree_check(self):
 		"""
-		設定を解析ツリーに反映する
+		有効設定の重複チェック
 		"""
-		# 有効設定に重複が無いかチェックする
-		dup_list = []
-		check_dict = {}
-		for i, tail_node in enumerate(self.data_list):
-			if tail_node.autoresp_ref.tail_id not in check_dict.keys():
-				# 未登録であれば登録
-				check_dict[tail_node.autoresp_ref.tail_id] = tail_node.enable
-			else:
-				# enable=Trueが重複していたらチェックしておく
-				if tail_node.enable and check_dict[tail_node.autoresp_ref.tail_id]:
-					tail_node.enable = False
-					dup_list.append(i)
-		return dup_list
-		
+		return self._ruleset.update_tree_check()
+
 	def update_tree(self):
 		"""
 		設定を解析ツリーに反映する
 		"""
-		# 有効設定をクリア
-		for tail in self.tree_tail_list:
-			tail.tail_active = None
-		# 末尾情報を更新して有効設定を反映する
-		for i, tail_node in enumerate(self.data_list):
-			if tail_node.enable:
-				tail_node.autoresp_ref.tail_active = tail_node
-
+		self._ruleset.update_tree()
 
+	def stats_table(self) -> List[list]:
+		"""
+		自動応答設定ごとの統計情報を表形式で返す
+		"""
+		return self._ruleset.stats_table()
 
+	def stats_clear(self) -> None:
+		"""
+		統計情報をクリアする
+		"""
+		self._ruleset.stats_clear()
 
-if __name__ == "__main__":
-	hex = autoresp_data.byte
-	any = autoresp_data.any
-	data = None
-	if False:
+	def dump_stats(self, sort: int = None) -> str:
 		"""
-			data1: 0*2
-			data2: 01*
-			data3: 1*2
-			data4: **2
-			data5: **0
+		統計情報を文字列にする
+		sortに列番号を指定したときはその列の降順に並べる
 		"""
-		data = [
-				#有効		# 受信値		# 自動応答対象							# 応答データ名
-				#設定		# 名称			# 受信データパターン					# (自動送信設定)
-			[	True,		"Test1",		[hex('00'), any(1), hex('02')],		""],
-			[	True,		"Test2",		[hex('00'), hex('01'), any(1)],		""],
-			[	True,		"Test3",		[hex('01'), any(1), hex('02')],		""],
-			[	True,		"Test4",		[any(1), any(1), hex('02')],		""],
-			[	True,		"Test5",		[any(1), any(1), hex('00')],		""],
-		]
-	if True:
-		"""
-				data1: 01**0*
-				data2: 02**0*
-				data2: 03**0*
-				data3: 04**0*
-				data4: 05**0*
-		"""
-		data = [
-				#有効		# 受信値		# 自動応答対象															# 応答データ名
-				#設定		# 名称			# 受信データパターン													# (自動送信設定)
-			[	True,		"Test1",		[hex('00'), hex('01'), any(1), any(1), hex('00'), any(1)],				""],
-			[	True,		"Test2",		[hex('00'), hex('02'), any(1), any(1), hex('00'), any(1)],				""],
-			[	True,		"Test3",		[hex('00'), hex('03'), any(1), any(1), hex('00'), any(1)],				""],
-			[	True,		"Test4",		[hex('00'), hex('04'), any(1), any(1), hex('00'), any(1)],				""],
-			[	True,		"Test5",		[hex('00'), hex('05'), any(1), any(1), hex('00'), any(1)],				""],
-		]
-	mng = autoresp_mng(data)
-	print("finish.")
+		head = ["ID", "match", "abort", "fcc_ng", "bytes", "cb_count", "cb_total[us]", "cb_max[us]", "delay_count", "delay_avg[us]", "delay_max[us]"]
+		table = self.stats_table()
+		if sort is not None:
+			table.sort(key=lambda row: row[sort], reverse=True)
+		width = max([len(head[0])] + [len(row[0]) for row in table])
+		lines = ["{0:{1}} ".format(head[0], width) + " ".join(["{0:>12}".format(col) for col in head[1:]])]
+		for row in table:
+			lines.append("{0:{1}} ".format(row[0], width) + " ".join(["{0:>12}".format(col) for col in row[1:]]))
+		return "\n".join(lines)
@@ -1,6 +1,7 @@
 
 import PySimpleGUI as sg
-from typing import Any, Callable, List, Dict
+from typing import Any, Callable, Deque, List, Dict
+from collections import deque
 import time
 
 from .send_node import send_mng, send_data_node
@@ -133,32 +134,125 @@ class autosend_node:
 		return parts
 
 
+class delay_timer:
+	"""
+	応答遅延タイマ
+	待機(time.sleep()や受信待ちのtimeout)はOSのタイマ分解能の分だけ遅れて起床するので、
+	期限のspin前まではそれらで待機して、残りはビジーウェイトする。
+	spinは起床の遅れの分布から決める。calibrate()でsleepの遅れを計測しておき、
+	以降は実際の起床の遅れをupdate()で加えて、直近CALIBRATE_WINDOW回の遅れのCALIBRATE_PERCENTILE[%]点とする。
+	calibrate()は接続時に受信を止めて実施するので回数は少なくし、以降の実測で補う。
+	"""
+	# 計測に使うsleep時間[ns]と回数
+	CALIBRATE_SLEEP = 1 * 1000 * 1000
+	CALIBRATE_COUNT = 10
+	# spinを決める起床の遅れのサンプル数
+	CALIBRATE_WINDOW = 100
+	# ビジーウェイトで吸収する起床の遅れの割合[%]
+	CALIBRATE_PERCENTILE = 99
+
+	def __init__(self) -> None:
+		# 直近の起床の遅れ[ns]
+		self._overshoot: Deque[int] = deque(maxlen=self.CALIBRATE_WINDOW)
+		# 期限の何ns前から待機をやめてビジーウェイトするか
+		self.spin: int = None
+
+	def calibrate(self) -> None:
+		"""
+		sleepの遅れを計測する
+		"""
+		self._overshoot.clear()
+		for i in range(self.CALIBRATE_COUNT):
+			begin = time.perf_counter_ns()
+			time.sleep(self.CALIBRATE_SLEEP / (1000 * 1000 * 1000))
+			self._overshoot.append(time.perf_counter_ns() - begin - self.CALIBRATE_SLEEP)
+		self._update_spin()
+
+	def update(self, overshoot: int) -> None:
+		"""
+		待機からの起床の遅れ[ns]を加えてspinを更新する
+		"""
+		self._overshoot.append(max(overshoot, 0))
+		self._update_spin()
+
+	def _update_spin(self) -> None:
+		overshoot = sorted(self._overshoot)
+		self.spin = overshoot[(len(overshoot) - 1) * self.CALIBRATE_PERCENTILE // 100]
+
+	def wait_until(self, deadline: int) -> int:
+		"""
+		deadline(perf_counter_ns)まで待機する
+		期限からの遅れ[ns]を返す
+		"""
+		if self.spin is None:
+			self.calibrate()
+		remain = deadline - time.perf_counter_ns()
+		if remain > self.spin:
+			time.sleep((remain - self.spin) / (1000 * 1000 * 1000))
+		now = time.perf_counter_ns()
+		while now < deadline:
+			now = time.perf_counter_ns()
+		return now - deadline
+
+
 class autosend_result:
+	"""
+	自動送信処理結果
+	送信しなかったときは共有インスタンス(NONE/WAIT)を返すので、これらは変更しないこと。
+	"""
+	__slots__ = (
+		"send_ref", "data", "timestamp", "timestamp_tx_begin", "timestamp_tx_end", "delay_deadline",
+		"_send_data", "_wait_time",
+	)
+	# 共有インスタンス: 処理なし
+	NONE: 'autosend_result' = None
+	# 共有インスタンス: wait中
+	WAIT: 'autosend_result' = None
+
 	def __init__(self) -> None:
 		# データ
 		self.send_ref: send_data_node = None
+		self.data: bytes = None
 		self.timestamp: int = None
+		# 実送信時間(送信スレッドが設定する)
+		self.timestamp_tx_begin: int = None
+		self.timestamp_tx_end: int = None
+		# 応答遅延の期限(応答遅延で送信したときのみ)
+		self.delay_deadline: int = None
 		# フラグ
 		self._send_data: bool = False
 		self._wait_time: bool = False
 
 	def set_send(self, node:send_data_node, timestamp:int):
 		self.send_ref = node
+		# 送信時点のデータを保持しておく
+		self.data = node.data_bytes
 		self.timestamp = timestamp
 		self._send_data = True
 
+	def set_tx_time(self, begin:int, end:int):
+		"""
+		実送信開始/完了時間を設定する
+		"""
+		self.timestamp_tx_begin = begin
+		self.timestamp_tx_end = end
+
 	def set_wait(self):
 		self._wait_time = True
 
 	def is_send(self) -> bool:
 		return self._send_data
 
+autosend_result.NONE = autosend_result()
+autosend_result.WAIT = autosend_result()
+autosend_result.WAIT.set_wait()
+
 class autosend_mng:
 
 	def __init__(self, autosend, mng: send_mng) -> None:
 		# コールバック
 		# データ送信
-		self._send_cb: Callable[[bytes], None] = None
+		self._send_cb: Callable[[bytes, autosend_result], None] = None
 		# ボタン更新:自動送信有効化
 		self._cb_btn_activate: Callable[[int], None] = None
 		# ボタン更新:自動送信無効化
@@ -172,6 +266,13 @@ class autosend_mng:
 		self._active_node: autosend_node = None
 		self._pos: int = 0
 		self._timestamp: int = 0
+		# 応答遅延
+		# 遅延時間[ns]、期限(perf_counter_ns, 0は未確定)、期限前の待機中か、遅延誤差の通知先
+		self._timer = delay_timer()
+		self._delay: int = 0
+		self._delay_deadline: int = 0
+		self._delay_waiting: bool = False
+		self._delay_report: Callable[[int], None] = None
 		# nodeリスト
 		self._data_list: List[autosend_node] = []
 		self._data_dict: Dict[str, autosend_node] = {}
@@ -205,7 +306,7 @@ class autosend_mng:
 	def set_cb_btn_inactivate(self, cb: Callable[[int], None]) -> None:
 		self._cb_btn_inactivate = cb
 
-	def set_send_cb(self, cb: Callable[[bytes], None]) -> None:
+	def set_send_cb(self, cb: Callable[[bytes, autosend_result], None]) -> None:
 		self._send_cb = cb
 
 	def set_exit_cb(self, cb: Callable[[int], None]) -> None:
@@ -215,6 +316,12 @@ class autosend_mng:
 		self._gui_update_cb = cb
 
 
+	def timer_calibrate(self) -> None:
+		"""
+		応答遅延タイマを較正する
+		"""
+		self._timer.calibrate()
+
 	def start(self, idx: int) -> None:
 		self.activate(self._data_list[idx])
 
@@ -233,10 +340,13 @@ class autosend_mng:
 		if self._active_node is not None:
 			self._active_node.enable = False
 			self._active_node = None
+		self._delay = 0
 
-	def activate(self, node:autosend_node):
+	def activate(self, node:autosend_node, delay: int = 0, report: Callable[[int], None] = None):
 		"""
 		指定のnodeで自動送信を有効化する
+		delay[ns]を指定したときは、次のrun()に渡される時間(受信フレーム末尾の受信時間)からdelay経過後に開始する。
+		開始時の期限からの遅れ[ns]はreportに通知する。
 		"""
 		disable_row: int = None
 		enable_row: int = None
@@ -255,6 +365,10 @@ class autosend_mng:
 		# パラメータ初期化
 		self._pos = 0
 		#self._timestamp = 0
+		self._delay = delay
+		self._delay_deadline = 0
+		self._delay_waiting = False
+		self._delay_report = report
 		# GUI更新
 		enable_row = node.row
 		self._cb_btn_activate(enable_row)
@@ -276,18 +390,82 @@ class autosend_mng:
 		else:
 			return False
 
+	def next_deadline(self) -> int:
+		"""
+		次に自動送信処理が必要になる時間(perf_counter_ns)を返す。
+		即時処理が必要なら0、待つべきイベントが無ければNoneを返す。
+		"""
+		# スレッド間排他のために最初にノードを取り出しておく
+		tgt_node = self._active_node
+		if tgt_node is None:
+			return None
+		if self._delay > 0:
+			# 応答遅延中は期限のspin前に起床して、残りはrun()でビジーウェイトする
+			if self._delay_deadline == 0 or self._timer.spin is None:
+				return 0
+			return self._delay_deadline - self._timer.spin
+		tgt_data = tgt_node.data_list[self._pos]
+		node_type = tgt_data._node_type
+		if node_type == autosend_data.WAIT:
+			if self._timestamp == 0:
+				return 0
+			return self._timestamp + tgt_data._wait_time
+		if node_type == autosend_data.SEND and tgt_data._send_ref.size <= 0:
+			# 送信データが空のときは進まないので待機不要
+			return None
+		return 0
+
 	def run(self, idx: int, timestamp: int) -> autosend_result:
 		# 処理結果情報初期化
-		self._result = autosend_result()
+		# 送信するときだけインスタンスを作成する
+		self._result = autosend_result.NONE
 		# 自動送信処理
 		# スレッド間排他のために最初にノードを取り出しておく
 		tgt_node = self._active_node
 		if tgt_node is not None:
-			tgt_data = tgt_node.data_list[self._pos]
-			self._run_impl(tgt_node, tgt_data, timestamp)
+			if self._delay > 0:
+				# 応答遅延
+				delay_deadline = self._run_delay(timestamp)
+				if delay_deadline is None:
+					return self._result
+				tgt_data = tgt_node.data_list[self._pos]
+				self._run_impl(tgt_node, tgt_data, timestamp)
+				if self._result.is_send():
+					self._result.delay_deadline = delay_deadline
+			else:
+				tgt_data = tgt_node.data_list[self._pos]
+				self._run_impl(tgt_node, tgt_data, timestamp)
 		# 結果を返す
 		return self._result
 
+	def _run_delay(self, timestamp: int) -> int:
+		"""
+		応答遅延の期限まで待機する
+		期限のspin前を過ぎていれば期限までビジーウェイトして期限を返す。それより前ならNoneを返す。
+		期限のspin前までは呼び出し側(シリアル通信スレッドの受信待ち)で待機するので、その間も受信は処理できる。
+		"""
+		if self._delay_deadline == 0:
+			# 有効化後の最初のrun()で期限を決める
+			self._delay_deadline = timestamp + self._delay
+		if self._timer.spin is None:
+			# 未較正なら較正する(通常は接続時に較正済み)
+			self._timer.calibrate()
+		wakeup = self._delay_deadline - self._timer.spin
+		now = time.perf_counter_ns()
+		if now < wakeup:
+			self._result = autosend_result.WAIT
+			self._delay_waiting = True
+			return None
+		if self._delay_waiting:
+			# 待機からの起床の遅れでspinを補正する
+			self._timer.update(now - wakeup)
+			self._delay_waiting = False
+		error = self._timer.wait_until(self._delay_deadline)
+		self._delay = 0
+		if self._delay_report is not None:
+			self._delay_report(error)
+		return self._delay_deadline
+
 	def _run_impl(self, node: autosend_node, data: autosend_data, timestamp: int) -> None:
 		node_type = data._node_type
 		if node_type == autosend_data.SEND:
@@ -303,12 +481,14 @@ class autosend_mng:
 		if data._send_ref.size > 0:
 			# タイムスタンプ更新
 			self._timestamp = time.perf_counter_ns()
-			# 送信実行
-			self._send_cb(data._send_ref.data_bytes)
-			# 次のシーケンスへ遷移
-			self._next(node)
 			# 結果作成
+			self._result = autosend_result()
 			self._result.set_send(data._send_ref, self._timestamp)
+			# 送信要求
+			# 送信完了は送信側から結果に設定される
+			self._send_cb(self._result.data, self._result)
+			# 次のシーケンスへ遷移
+			self._next(node)
 		else:
 			# タイムスタンプ更新
 			self._timestamp = timestamp
@@ -325,7 +505,7 @@ class autosend_mng:
 				self._timestamp = timestamp
 				self._next(node)
 		# 結果作成
-		self._result.set_wait()
+		self._result = autosend_result.WAIT
 
 	def _run_impl_jump(self, node: autosend_node, data: autosend_data, timestamp: int) -> None:
 		# タイムスタンプ更新
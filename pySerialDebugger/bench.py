@@ -0,0 +1,809 @@
+"""
+性能計測用スクリプト
+python -m pySerialDebugger.bench で実行する。
+実ポートは使わず、メモリ上の疑似ポートにデータを積んで計測する。
+"""
+import threading
+import time
+
+from . import serial_mng
+from . import thread
+from . import gui_mng
+from .send_node import send_mng
+from .autosend import autosend_data, autosend_mng, autosend_result
+from .autoresp import autoresp_data, autoresp_mng, autoresp_opt, frame_buffer, MatchMode
+
+
+class bench_port:
+	"""
+	計測用疑似シリアルポート
+	feed()で積んだデータを受信データとして返す。
+	capacityを指定したときは受信バッファの容量とし、溢れた分は捨ててlostに数える(オーバーラン)。
+	"""
+
+	def __init__(self, data: bytes = b'', capacity: int = 0) -> None:
+		self.is_open = True
+		self.timeout: float = 0
+		self._data = bytearray(data)
+		self._pos = 0
+		# 受信バッファ容量(0は無制限)と、溢れて失ったバイト数
+		self.capacity = capacity
+		self.lost = 0
+		self._cond = threading.Condition()
+		self._cancel = False
+		# 全データ読み出し完了時間
+		self.timestamp_end: int = None
+		# 送信時間
+		self.timestamp_tx: int = None
+		self.tx_event = threading.Event()
+
+	def feed(self, data: bytes) -> None:
+		with self._cond:
+			if self.capacity > 0:
+				space = max(self.capacity - self.in_waiting, 0)
+				if len(data) > space:
+					self.lost += len(data) - space
+					data = data[:space]
+			self._data += data
+			self.timestamp_end = None
+			self._cond.notify()
+
+	@property
+	def in_waiting(self) -> int:
+		return len(self._data) - self._pos
+
+	def read(self, size: int = 1) -> bytes:
+		with self._cond:
+			if self.in_waiting == 0 and self.timeout:
+				self._cond.wait_for(lambda: self.in_waiting > 0 or self._cancel, self.timeout)
+			self._cancel = False
+			result = bytes(self._data[self._pos:self._pos+size])
+			self._pos += len(result)
+			if self._pos >= len(self._data) and self.timestamp_end is None:
+				self.timestamp_end = time.perf_counter_ns()
+		return result
+
+	def readinto(self, b) -> int:
+		data = self.read(len(b))
+		n = len(data)
+		b[:n] = data
+		return n
+
+	def cancel_read(self) -> None:
+		with self._cond:
+			self._cancel = True
+			self._cond.notify()
+
+	def write(self, data: bytes) -> int:
+		self.timestamp_tx = time.perf_counter_ns()
+		self.tx_event.set()
+		return len(data)
+
+	def flush(self) -> None:
+		pass
+
+	def reset_input_buffer(self) -> None:
+		pass
+
+	def close(self) -> None:
+		self.is_open = False
+
+
+def bench_settings():
+	"""
+	計測用の送信/自動送信/自動応答設定
+	"""
+	hex = autoresp_data.byte
+	any = autoresp_data.any
+	send = [
+		[	"Resp_A",	bytes.fromhex('01AA000000FF'),	-1,	6,	0,	4,	],
+		[	"Resp_B",	bytes.fromhex('01BB000000FF'),	-1,	6,	0,	4,	],
+	]
+	autosend = [
+		[	False,	"AutoResp_A",	[autosend_data.send("Resp_A"), autosend_data.exit()]],
+		[	False,	"AutoResp_B",	[autosend_data.send("Resp_B"), autosend_data.exit()]],
+	]
+	autoresp = [
+		[	True,	"Rule_A",	[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp_A",	None,	None,],
+		[	True,	"Rule_B",	[hex('00'), hex('BB'), any(1), any(1)],		"AutoResp_B",	None,	None,],
+		[	True,	"Rule_C",	[any(1), any(1), hex('02')],				"AutoResp_B",	None,	None,],
+	]
+	return (send, autosend, autoresp)
+
+
+def make_serial_manager(data: bytes, delay_us: int = 0) -> serial_mng.serial_manager:
+	"""
+	疑似ポートに接続したserial_managerを作成する
+	@param delay_us 自動応答設定の応答遅延
+	"""
+	send, autosend, autoresp = bench_settings()
+	if delay_us > 0:
+		autoresp = [resp + [autoresp_opt(delay_us=delay_us)] for resp in autoresp]
+	s_mng = send_mng(send)
+	as_mng = autosend_mng(autosend, s_mng)
+	as_mng.set_cb_btn_activate(lambda row: None)
+	as_mng.set_cb_btn_inactivate(lambda row: None)
+	ar_mng = autoresp_mng(autoresp, as_mng, s_mng)
+	mng = serial_mng.serial_manager()
+	mng.autoresp(ar_mng)
+	mng.autosend(as_mng)
+	mng._serial = bench_port(data)
+	mng._is_open = True
+	return mng
+
+
+def bench_hdlr(counter: dict, delay: float = 0) -> None:
+	"""
+	管理スレッド相当の受信処理
+	シリアル通信スレッドからのメッセージを読み捨てる。
+	@param delay バッチごとの処理時間(GUI処理が重い状況を模擬する)
+	"""
+	while True:
+		thread.messenger.wait_notify_serial2hdrl(0.1)
+		if delay:
+			time.sleep(delay)
+		for msg in thread.messenger.get_notify_serial2hdrl_batch():
+			counter["msg"] += 1
+			if msg.notify == thread.ThreadNotify.DISCONNECTED:
+				return
+
+
+def bench_start(mng: serial_mng.serial_manager, hdlr_delay: float = 0):
+	"""
+	シリアル通信スレッドと管理スレッド相当の処理を開始する
+	"""
+	counter = {"msg": 0}
+	hdlr = threading.Thread(target=bench_hdlr, args=(counter, hdlr_delay))
+	hdlr.start()
+	serial = threading.Thread(target=mng.connect)
+	serial.start()
+	return (hdlr, serial)
+
+
+def bench_stop(threads) -> None:
+	thread.messenger.notify_exit_serial()
+	for th in threads:
+		th.join()
+
+
+def bench_rx_baseline(mng: serial_mng.serial_manager) -> None:
+	"""
+	比較用の元の受信ループ
+	timeout=0のread(1)で1バイトずつ受信し、1バイトごとに受信解析・自動送信・解析結果の通知を実施する。
+	自動応答の送信もシリアル通信スレッドで書き込む。
+	"""
+	port: bench_port = mng._serial
+	ar_mng = mng._autoresp_mng
+	as_mng = mng._autosend_mng
+	as_mng.set_send_cb(lambda data, result: port.write(data))
+	ar_mng.recv_analyze_init()
+	port.timeout = 0
+	timestamp_rx_prev = 0
+	while not thread.messenger.has_exit_serial():
+		recv = port.read(1)
+		timestamp = time.perf_counter_ns()
+		if len(recv) > 0:
+			result = ar_mng.recv_analyze(recv)
+			as_result = as_mng.run(0, timestamp)
+			if result.has_notify():
+				result.set_timestamp(timestamp, timestamp_rx_prev)
+				thread.messenger.notify_hdlr_recv_analyze(result)
+			if as_result.is_send():
+				thread.messenger.notify_hdlr_send(as_result)
+			timestamp_rx_prev = timestamp
+		else:
+			as_result = as_mng.run(0, timestamp)
+			if as_result.is_send():
+				thread.messenger.notify_hdlr_send(as_result)
+		# 元のキューは積んだ時点で管理スレッドから見える
+		thread.messenger.flush_notify_serial2hdrl()
+	thread.messenger.clear_exit_serial()
+	thread.messenger.notify_hdlr_autoresp_disconnected()
+	thread.messenger.flush_notify_serial2hdrl()
+	mng.autosend(as_mng)
+
+
+def bench_rx_throughput(mode: serial_mng.RxMode, size: int, bps: int = 0, capacity: int = 4096):
+	"""
+	受信処理スループット計測
+	mode=Noneは元の受信ループ(bench_rx_baseline())で計測する。
+	bps=0のときは疑似ポートに積んだデータをすべて処理し終えるまでの時間からbytes/secを算出する(受信バッファ容量は無制限)。
+	bpsを指定したときはその速度でデータが届くように疑似ポートに積んでいき、
+	受信バッファ(capacityバイト)から溢れて失ったバイト数を数える。
+	@return (bytes/sec, 管理スレッドへの通知の破棄数, 失ったバイト数)
+	"""
+	frame = bytes.fromhex("00AA0101" "00BB0202" "0055AA" "00FF02")
+	data = (frame * (size // len(frame) + 1))[:size]
+	serial_mng.DEBUG = False
+	mng = make_serial_manager(data if bps == 0 else b'')
+	port: bench_port = mng._serial
+	if mode is not None:
+		mng.rxopt_mode_update(mode)
+	if bps > 0:
+		port.capacity = capacity
+	overflow = thread.messenger.overflow_notify_serial2hdrl()
+	timestamp_begin = time.perf_counter_ns()
+	if mode is None:
+		counter = {"msg": 0}
+		threads = (threading.Thread(target=bench_hdlr, args=(counter,)), threading.Thread(target=bench_rx_baseline, args=(mng,)))
+		for th in threads:
+			th.start()
+	else:
+		threads = bench_start(mng)
+	# bps指定時: 経過時間分のデータを積む
+	fed = size if bps == 0 else 0
+	while fed < size:
+		time.sleep(0.001)
+		elapsed = (time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000)
+		end = min(int(elapsed * bps), size)
+		if end > fed:
+			port.feed(data[fed:end])
+			fed = end
+	while port.in_waiting > 0 or port.timestamp_end is None:
+		time.sleep(0.001)
+	bench_stop(threads)
+	elapsed = (port.timestamp_end - timestamp_begin) / (1000 * 1000 * 1000)
+	return ((size - port.lost) / elapsed, thread.messenger.overflow_notify_serial2hdrl() - overflow, port.lost)
+
+
+def bench_rx_idle(blocking: bool, idle_time: float = 1.0, count: int = 50):
+	"""
+	無通信時のCPU使用率と、受信から自動応答送信までのレイテンシを計測する
+	"""
+	serial_mng.DEBUG = False
+	mng = make_serial_manager(b'')
+	mng.rxopt_blocking_update(blocking)
+	threads = bench_start(mng)
+	port: bench_port = mng._serial
+	time.sleep(0.1)
+	# 無通信時CPU使用率
+	cpu_begin = time.process_time()
+	time.sleep(idle_time)
+	cpu = (time.process_time() - cpu_begin) / idle_time
+	# 受信->自動応答レイテンシ
+	latency = []
+	for i in range(count):
+		port.tx_event.clear()
+		timestamp_rx = time.perf_counter_ns()
+		port.feed(bytes.fromhex("00AA0101"))
+		port.tx_event.wait(1.0)
+		latency.append(port.timestamp_tx - timestamp_rx)
+		time.sleep(0.01)
+	bench_stop(threads)
+	latency.sort()
+	return (cpu, latency[len(latency) // 2], latency[-1])
+
+
+def bench_resp_delay(delay_us: int, count: int = 50):
+	"""
+	応答遅延の精度を計測する
+	シリアル通信スレッドで計測した期限からの遅れと、受信データを積んでから送信するまでの時間の遅延時間からの誤差を返す。
+	"""
+	serial_mng.DEBUG = False
+	mng = make_serial_manager(b'', delay_us)
+	mng.rxopt_blocking_update(True)
+	threads = bench_start(mng)
+	port: bench_port = mng._serial
+	time.sleep(0.1)
+	error = []
+	for i in range(count):
+		port.tx_event.clear()
+		timestamp_rx = time.perf_counter_ns()
+		port.feed(bytes.fromhex("00AA0101"))
+		port.tx_event.wait(1.0)
+		error.append(port.timestamp_tx - timestamp_rx - delay_us * 1000)
+		time.sleep(0.01)
+	bench_stop(threads)
+	stats = mng._autoresp_mng.stats_table()[0]
+	error.sort()
+	return (stats[8], stats[9], stats[10], error[len(error) // 2], error[-1])
+
+
+def bench_queue_policy(policy: thread.QueuePolicy, size: int, capacity: int = 256, hdlr_delay: float = 0.005):
+	"""
+	管理スレッドの処理が遅いときのキューポリシーごとの受信処理スループットと統計情報
+	"""
+	frame = bytes.fromhex("00AA0101" "00BB0202" "0055AA" "00FF02")
+	data = (frame * (size // len(frame) + 1))[:size]
+	serial_mng.DEBUG = False
+	mng = make_serial_manager(data)
+	mng.rxopt_mode_update(serial_mng.RxMode.CHUNK)
+	q = thread.messenger.q_serial2hdlr_msg
+	policy_prev, capacity_prev = (q.policy, q.capacity)
+	thread.messenger.config_queue("serial2hdlr", policy, capacity)
+	# 統計情報をリセット
+	q.high_water = q.overflow = q.coalesced = q.blocked = 0
+	timestamp_begin = time.perf_counter_ns()
+	threads = bench_start(mng, hdlr_delay)
+	port: bench_port = mng._serial
+	while port.timestamp_end is None:
+		time.sleep(0.001)
+	elapsed = (port.timestamp_end - timestamp_begin) / (1000 * 1000 * 1000)
+	bench_stop(threads)
+	stats = q.stats()
+	thread.messenger.config_queue("serial2hdlr", policy_prev, capacity_prev)
+	return (size / elapsed, stats)
+
+
+def bench_rx_alloc(size: int = 10000, loop: int = 1000, baseline: bool = False):
+	"""
+	受信1バイトあたりのメモリ確保量
+	管理スレッドを動かさずに受信処理を実施し、キューに残ったメッセージのメモリと、処理中のピークメモリを計測する。
+	また、受信の無いループでの自動送信処理1回あたりのメモリ確保数を計測する。
+	baseline=Trueは比較用に、元の受信ループと同じく1バイトごとにread(1)相当のbytesを作成し、
+	マッチ途中のデータをbytesの連結で蓄積して、1バイトごとに解析結果を通知する。
+	"""
+	import gc
+	import sys
+	import tracemalloc
+	frame = bytes.fromhex("00AA0101" "00BB0202" "0055AA" "00FF02")
+	data = (frame * (size // len(frame) + 1))[:size]
+	serial_mng.DEBUG = False
+	mng = make_serial_manager(b'')
+	mng._byte_time = 0
+	mng._timestamp_rx = time.perf_counter_ns()
+	mng._timestamp_rx_prev = mng._timestamp_rx
+	mng._autoresp_mng.recv_analyze_init()
+	mng._segmenter.config(None, 0, 0)
+	q = thread.messenger.q_serial2hdlr_msg
+	capacity = q.capacity
+	q.capacity = size * 2
+	q.clear()
+	recv = memoryview(bytearray(data))
+	# 受信処理: キューに積まれたメッセージ分を計測
+	gc.collect()
+	gc.disable()
+	tracemalloc.start()
+	blocks_begin = sys.getallocatedblocks()
+	mem_begin = tracemalloc.get_traced_memory()[0]
+	if baseline:
+		ar_mng = mng._autoresp_mng
+		as_mng = mng._autosend_mng
+		buff = b''
+		for i in range(size):
+			byte = bytes(recv[i:i+1])
+			result = ar_mng.recv_analyze(byte)
+			if ar_mng._prev_recv_analyze_result:
+				buff += byte
+			if result.buff_commit() or not ar_mng._prev_recv_analyze_result:
+				buff = b''
+			thread.messenger.notify_hdlr_recv_analyze(result)
+			as_mng.run(0, mng._timestamp_rx)
+	else:
+		mng._recv_proc(recv)
+	rx_blocks = (sys.getallocatedblocks() - blocks_begin) / size
+	rx_bytes = (tracemalloc.get_traced_memory()[0] - mem_begin) / size
+	rx_peak = (tracemalloc.get_traced_memory()[1] - mem_begin) / size
+	tracemalloc.stop()
+	q.clear()
+	q.capacity = capacity
+	# 無受信ループ: 自動送信処理
+	as_mng = mng._autosend_mng
+	as_mng.start(0)
+	as_mng._active_node.data_list[0]._send_ref.size = 0
+	results = []
+	blocks_begin = sys.getallocatedblocks()
+	for i in range(loop):
+		results.append(as_mng.run(0, 0))
+	as_blocks = (sys.getallocatedblocks() - blocks_begin) / loop
+	gc.enable()
+	return (rx_blocks, rx_bytes, rx_peak, as_blocks)
+
+
+def bench_matcher(rule_count: int, size: int = 100 * 1000):
+	"""
+	受信解析の状態遷移方式ごとのスループット
+	ルール: 00 [ID 2byte] * * FF と、固定値の分岐に重なる * * * 02
+	解析ツリーの構築時間とは別に、TABLEへの切り替え時に作成する遷移表の作成時間とサイズを返す。
+	"""
+	hex = autoresp_data.byte
+	any = autoresp_data.any
+	send, autosend, autoresp = bench_settings()
+	autoresp = []
+	for i in range(rule_count):
+		autoresp.append([True, "Rule_{0}".format(i), [hex('00'), hex(format(i, "04X")), any(1), any(1), hex('FF')], "AutoResp_A", None, None])
+	autoresp.append([True, "Rule_any", [any(1), any(1), any(1), hex('02')], "AutoResp_B", None, None])
+	s_mng = send_mng(send)
+	as_mng = autosend_mng(autosend, s_mng)
+	as_mng.set_cb_btn_activate(lambda row: None)
+	as_mng.set_cb_btn_inactivate(lambda row: None)
+	timestamp_build = time.perf_counter_ns()
+	ar_mng = autoresp_mng(autoresp, as_mng, s_mng)
+	build = (time.perf_counter_ns() - timestamp_build) / (1000 * 1000 * 1000)
+	# 受信データ: ルールを順に当てたフレームと、途中で外れるフレーム
+	stream = bytearray()
+	i = 0
+	while len(stream) < size:
+		stream += bytes.fromhex("00" + format(i % rule_count, "04X") + "1234FF" "00FFFF0102")
+		i += 1
+	recv = memoryview(bytes(stream[:size]))
+	result = {}
+	chunk_result = {}
+	trans_result = {}
+	table_build = 0
+	for mode in MatchMode:
+		timestamp_build = time.perf_counter_ns()
+		ar_mng.matcher_update(mode)
+		if mode == MatchMode.TABLE:
+			table_build = (time.perf_counter_ns() - timestamp_build) / (1000 * 1000 * 1000)
+		# 受信解析全体
+		recv_analyze = ar_mng.recv_analyze
+		timestamp_begin = time.perf_counter_ns()
+		for i in range(size):
+			recv_analyze(recv[i:i+1])
+		elapsed = (time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000)
+		result[mode] = size / elapsed
+		# 一括解析: 4096バイトずつ
+		ar_mng.recv_analyze_init()
+		timestamp_begin = time.perf_counter_ns()
+		for i in range(0, size, 4096):
+			ar_mng.recv_analyze_chunk(recv[i:i+4096])
+		elapsed = (time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000)
+		chunk_result[mode] = size / elapsed
+		# 状態遷移のみ
+		ar_mng.recv_analyze_init()
+		trans = ar_mng._recv_analyze_trans
+		timestamp_begin = time.perf_counter_ns()
+		for i in range(size):
+			data = recv[i:i+1]
+			if not trans(data):
+				ar_mng.recv_analyze_init()
+				trans(data)
+		elapsed = (time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000)
+		trans_result[mode] = size / elapsed
+	return (len(ar_mng._ruleset.nodes), build, table_build, len(ar_mng._table.trans) * 4, result, chunk_result, trans_result)
+
+
+def bench_ruleset_swap(rule_count: int, stepped: bool = True, chunk: int = 256):
+	"""
+	解析ツリー一式の差し替え中の受信解析
+	rule_count件の解析ツリー一式を構築して差し替える間、シリアル通信スレッドと同じく
+	受信データ1chunkの解析と、受信が途切れたときのruleset_sync()を交互に実施する。
+	受信解析が止まる時間として、1chunkの解析時間とruleset_sync()の時間それぞれの最大値を計測する。
+	stepped=Trueはruleset_create()で作成してruleset_sync()で分割構築する(破棄完了まで計測)、
+	Falseは比較用に別スレッドでruleset_build()で構築する。
+	"""
+	hex = autoresp_data.byte
+	any = autoresp_data.any
+	send, autosend, autoresp = bench_settings()
+	autoresp_new = []
+	for i in range(rule_count):
+		autoresp_new.append([True, "Rule_{0}".format(i), [hex('00'), hex(format(i, "04X")), any(1), any(1), hex('FF')], "AutoResp_A", None, None])
+	s_mng = send_mng(send)
+	as_mng = autosend_mng(autosend, s_mng)
+	as_mng.set_cb_btn_activate(lambda row: None)
+	as_mng.set_cb_btn_inactivate(lambda row: None)
+	ar_mng = autoresp_mng(autoresp, as_mng, s_mng)
+	stream = bytearray()
+	i = 0
+	while len(stream) < 64 * 1024:
+		stream += bytes.fromhex("00" + format(i % rule_count, "04X") + "1234FF" "00FFFF0102")
+		i += 1
+	recv = memoryview(bytes(stream))
+	swapped = threading.Event()
+	matched = []
+
+	def build():
+		if stepped:
+			ar_mng.ruleset_publish(ar_mng.ruleset_create(autoresp_new), swapped.set)
+		else:
+			ar_mng.ruleset_publish(ar_mng.ruleset_build(autoresp_new), swapped.set)
+
+	pos = 0
+
+	def analyze() -> int:
+		# 1chunk分の受信解析時間
+		nonlocal pos
+		if pos + chunk > len(recv):
+			pos = 0
+		timestamp_begin = time.perf_counter_ns()
+		for ar in ar_mng.recv_analyze_chunk(recv[pos:pos+chunk]):
+			if ar.buff_commit():
+				matched.append(ar.id)
+		pos += chunk
+		return time.perf_counter_ns() - timestamp_begin
+
+	def sync() -> int:
+		# 受信が途切れたときの処理時間
+		timestamp_begin = time.perf_counter_ns()
+		ar_mng.ruleset_sync()
+		return time.perf_counter_ns() - timestamp_begin
+
+	# 差し替え無し
+	count = 2000
+	base_max = 0
+	base_elapsed = 0
+	for i in range(count):
+		latency = analyze()
+		base_max = max(base_max, latency)
+		base_elapsed += latency
+	# 差し替え中
+	builder = threading.Thread(target=build)
+	timestamp_begin = time.perf_counter_ns()
+	builder.start()
+	latency_max = 0
+	sync_max = 0
+	elapsed = 0
+	count = 0
+	while builder.is_alive() or ar_mng.ruleset_busy():
+		latency = analyze()
+		latency_max = max(latency_max, latency)
+		elapsed += latency
+		count += 1
+		sync_max = max(sync_max, sync())
+	build_time = time.perf_counter_ns() - timestamp_begin
+	builder.join()
+	assert swapped.is_set()
+	# 差し替え後は新しい設定でマッチする
+	matched.clear()
+	for i in range(64):
+		analyze()
+	assert "Rule_1" in matched
+	return (build_time, base_max, (2000 * chunk) / (base_elapsed / (1000 * 1000 * 1000)), latency_max, sync_max, (count * chunk) / (elapsed / (1000 * 1000 * 1000)))
+
+
+def bench_frame_accum(frame_size: int, chunk: int = 1):
+	"""
+	フレーム蓄積のスループット
+	受信解析のマッチ途中データと管理スレッドの受信ログについて、
+	従来の連結(bytes += / str += hex)とframe_bufferを比較する。
+	chunkバイトずつ追加して、frame_sizeバイトたまったらフレームとして取り出す。
+	"""
+	frame_count = max(1, (256 * 1024) // frame_size)
+	data = memoryview(bytes(range(256)) * (frame_size // 256 + 1))[:frame_size]
+	pieces = [data[i:i+chunk] for i in range(0, frame_size, chunk)]
+
+	class log_holder:
+		pass
+
+	result = {}
+	# 受信解析: bytes連結 + 最長パターン長でトリム
+	timestamp_begin = time.perf_counter_ns()
+	for i in range(frame_count):
+		buff = b''
+		for piece in pieces:
+			buff += piece
+			if len(buff) > frame_size:
+				buff = buff[-frame_size:]
+		frame = buff[-frame_size:]
+	result["match concat"] = (frame_count * frame_size) / ((time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000))
+	# 受信解析: frame_buffer
+	buff = frame_buffer(0, frame_size)
+	timestamp_begin = time.perf_counter_ns()
+	for i in range(frame_count):
+		buff.clear()
+		for piece in pieces:
+			buff.push(piece)
+		frame = buff.view(frame_size)
+	frame.release()
+	result["match buffer"] = (frame_count * frame_size) / ((time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000))
+	# 受信ログ: str連結
+	holder = log_holder()
+	timestamp_begin = time.perf_counter_ns()
+	for i in range(frame_count):
+		holder.log_str = ""
+		for piece in pieces:
+			holder.log_str += piece.hex()
+		holder.log = holder.log_str
+	result["log concat"] = (frame_count * frame_size) / ((time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000))
+	# 受信ログ: frame_buffer
+	holder.log_buff = frame_buffer(4096)
+	timestamp_begin = time.perf_counter_ns()
+	for i in range(frame_count):
+		holder.log_buff.clear()
+		for piece in pieces:
+			holder.log_buff.push(piece)
+		holder.log = holder.log_buff.view().hex()
+	result["log buffer"] = (frame_count * frame_size) / ((time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000))
+	return result
+
+
+def bench_length_frame(payload_size: int, size: int = 1000 * 1000, fcc: bool = False):
+	"""
+	長さフィールドで可変長のフレームの受信解析スループット
+	ルール: 00 CC [長さ 2byte] ペイロード 03
+	ペイロードはルールの先頭に一致するデータで埋めて、読み飛ばしが効いているかを見る。
+	fcc=Trueのときは末尾の03をフレーム全体のFCC(総和)にして、tail到達時のFCCチェックを含めて計測する。
+	"""
+	hex = autoresp_data.byte
+	length = autoresp_data.length
+	send, autosend, autoresp = bench_settings()
+	autoresp = [
+		[True, "Length", [hex('00'), hex('CC'), length(2), autoresp_data.fcc_sum() if fcc else hex('03')], "AutoResp_A", None, None],
+		[True, "Short", [hex('00'), hex('CC'), hex('00')], "AutoResp_B", None, None],
+	]
+	s_mng = send_mng(send)
+	as_mng = autosend_mng(autosend, s_mng)
+	as_mng.set_cb_btn_activate(lambda row: None)
+	as_mng.set_cb_btn_inactivate(lambda row: None)
+	ar_mng = autoresp_mng(autoresp, as_mng, s_mng)
+	frame = bytes.fromhex("00CC") + payload_size.to_bytes(2, "big") + bytes.fromhex("00CC") * (payload_size // 2) + b'\x00' * (payload_size % 2)
+	frame += bytes([sum(frame) % 256]) if fcc else bytes.fromhex("03")
+	recv = memoryview(frame * max(1, size // len(frame)))
+	size = len(recv)
+	result = {}
+	for mode in MatchMode:
+		ar_mng.matcher_update(mode)
+		# 1バイトずつ解析
+		recv_analyze = ar_mng.recv_analyze
+		count = 0
+		timestamp_begin = time.perf_counter_ns()
+		for i in range(size):
+			if recv_analyze(recv[i:i+1]).buff_commit():
+				count += 1
+		bps = size / ((time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000))
+		assert count == size // len(frame)
+		# 一括解析: 4096バイトずつ
+		ar_mng.recv_analyze_init()
+		count = 0
+		timestamp_begin = time.perf_counter_ns()
+		for i in range(0, size, 4096):
+			for ar in ar_mng.recv_analyze_chunk(recv[i:i+4096]):
+				if ar.buff_commit():
+					count += 1
+		chunk_bps = size / ((time.perf_counter_ns() - timestamp_begin) / (1000 * 1000 * 1000))
+		assert count == size // len(frame)
+		result[mode] = (bps, chunk_bps)
+	assert ar_mng.data_dict["Length"].stats.fcc_error == 0
+	return (len(ar_mng._ruleset.nodes), result)
+
+
+def bench_fcc_check(frame_size: int, loop: int = 100):
+	"""
+	受信FCCチェック1回あたりの時間(ns)
+	tail到達時にフレームのmemoryviewに対してsum()で総和を取る方式と、
+	比較用に受信1バイトごとにPythonで総和を積み上げる方式(フレーム長分の加算)を計測する。
+	"""
+	from .autoresp import autoresp_fcc
+	from .send_node import ChecksumType
+	frame = memoryview(bytes(range(256)) * (frame_size // 256) + bytes(frame_size % 256))
+	fcc = autoresp_fcc(ChecksumType.SUM, 0, frame_size - 1)
+	timestamp_begin = time.perf_counter_ns()
+	for i in range(loop):
+		fcc.check(frame)
+	tail = (time.perf_counter_ns() - timestamp_begin) / loop
+	timestamp_begin = time.perf_counter_ns()
+	for i in range(loop):
+		total = 0
+		for byte in frame[:frame_size-1]:
+			total += byte
+	stream = (time.perf_counter_ns() - timestamp_begin) / loop
+	return (tail, stream)
+
+
+class bench_window:
+	"""
+	計測用疑似ウインドウ
+	"""
+
+	def write_event_value(self, key, value) -> None:
+		pass
+
+	def close(self) -> None:
+		pass
+
+
+def bench_hdlr_polling(gui: gui_mng.gui_manager) -> None:
+	"""
+	従来の管理スレッド相当の処理
+	メッセージの有無をポーリングして、1usスリープでGUIに処理を回す。
+	"""
+	while True:
+		for msg in thread.messenger.get_notify_serial2hdrl_batch():
+			if msg.notify == thread.ThreadNotify.EXIT_HDLR:
+				return
+			if msg.notify == thread.ThreadNotify.COMMIT_TX:
+				result = msg.as_result
+				gui.comm_hdle_log_output("TX", result.data.hex().upper(), result.send_ref.id, result.timestamp_tx_begin)
+		time.sleep(0.000001)
+
+
+def bench_hdlr_idle(idle_time: float = 1.0, count: int = 50, polling: bool = False):
+	"""
+	管理スレッド(comm_hdle)の無通信時CPU使用率と、通知から処理までのレイテンシを計測する
+	@param polling Trueのときは従来のポーリング方式(bench_hdlr_polling)で計測する
+	"""
+	mng = make_serial_manager(b'')
+	node = mng._autoresp_mng._send_mng._send_data_list[0]
+	# GUIを作成せずに管理スレッドだけ動かす
+	gui = gui_mng.gui_manager.__new__(gui_mng.gui_manager)
+	gui._window = bench_window()
+	gui._serial = mng
+	gui._autoresp_mng = mng._autoresp_mng
+	gui._gui_hdl_autoresp_update_btn = None
+	timestamp_log = []
+	log_event = threading.Event()
+	def log_output(rxtx, data, data_id, timestamp, anlyz_log = None):
+		timestamp_log.append(time.perf_counter_ns())
+		log_event.set()
+	gui.comm_hdle_log_output = log_output
+	if polling:
+		hdlr = threading.Thread(target=bench_hdlr_polling, args=(gui,))
+	else:
+		hdlr = threading.Thread(target=gui.comm_hdle)
+	hdlr.start()
+	time.sleep(0.1)
+	# 無通信時CPU使用率
+	cpu_begin = time.process_time()
+	time.sleep(idle_time)
+	cpu = (time.process_time() - cpu_begin) / idle_time
+	# 通知->処理レイテンシ
+	latency = []
+	for i in range(count):
+		result = autosend_result()
+		result.set_send(node, 0)
+		result.set_tx_time(0, 0)
+		log_event.clear()
+		timestamp = time.perf_counter_ns()
+		thread.messenger.notify_hdlr_send(result)
+		log_event.wait(1.0)
+		latency.append(timestamp_log[-1] - timestamp)
+		time.sleep(0.01)
+	thread.messenger.notify_exit_hdlr()
+	hdlr.join()
+	latency.sort()
+	return (cpu, latency[len(latency) // 2], latency[-1])
+
+
+if __name__ == "__main__":
+	size = 200 * 1000
+	print("[RX throughput]")
+	for mode in (None, serial_mng.RxMode.BYTE, serial_mng.RxMode.CHUNK):
+		bps, overflow, lost = bench_rx_throughput(mode, size)
+		# 8N1: 1バイト=10bit
+		print("  {0:8}: {1:10.0f} bytes/sec (= {2:8.0f} baud @8N1)  dropped {3} msgs".format("baseline" if mode is None else mode.name, bps, bps * 10, overflow))
+	print("[RX overrun (4096 bytes port buffer)]")
+	for baud in (115200, 460800, 921600):
+		for mode in (None, serial_mng.RxMode.BYTE, serial_mng.RxMode.CHUNK):
+			bps, overflow, lost = bench_rx_throughput(mode, size, baud // 10)
+			print("  {0:7} baud {1:8}: lost {2:7} bytes  dropped {3} msgs".format(baud, "baseline" if mode is None else mode.name, lost, overflow))
+	print("[RX idle CPU / RX->TX latency]")
+	for blocking in (False, True):
+		cpu, lat_med, lat_max = bench_rx_idle(blocking)
+		print("  {0:8}: cpu {1:6.1%}  latency median {2:7.1f} us  max {3:7.1f} us".format("blocking" if blocking else "polling", cpu, lat_med / 1000, lat_max / 1000))
+	print("[Response delay]")
+	for delay_us in (500, 3500, 20 * 1000):
+		delay_count, sched_avg, sched_max, err_med, err_max = bench_resp_delay(delay_us)
+		print("  delay {0:6} us: schedule error avg {1:6.1f} us  max {2:6.1f} us ({3} times)   RX->TX error median {4:7.1f} us  max {5:7.1f} us".format(
+			delay_us, sched_avg, sched_max, delay_count, err_med / 1000, err_max / 1000))
+	print("[autoresp matcher]")
+	for rule_count in (10, 100, 1000):
+		states, build, table_build, table_size, result, chunk_result, trans_result = bench_matcher(rule_count)
+		print("  rules {0:4}: states {1:5}  build {2:6.3f} sec  table {3:6.3f} sec {4:6.1f} MB".format(rule_count, states, build, table_build, table_size / (1000 * 1000)))
+		for mode in MatchMode:
+			print("    {0:5}: recv_analyze {1:8.0f} bytes/sec  chunk {2:8.0f} bytes/sec  transition only {3:8.0f} bytes/sec".format(mode.name, result[mode], chunk_result[mode], trans_result[mode]))
+	print("[Ruleset hot swap]")
+	for rule_count in (100, 1000):
+		for stepped in (False, True):
+			build_time, base_max, base_bps, latency_max, sync_max, bps = bench_ruleset_swap(rule_count, stepped)
+			print("  rules {0:4} {1:7}: build+swap {2:6.3f} sec  chunk latency max {3:8.1f} us (no swap {4:6.1f} us)  ruleset_sync max {5:8.1f} us  {6:10.0f} bytes/sec (no swap {7:10.0f} bytes/sec)".format(
+				rule_count, "stepped" if stepped else "thread", build_time / (1000 * 1000 * 1000), latency_max / 1000, base_max / 1000, sync_max / 1000, bps, base_bps))
+	print("[Length field frame]")
+	for payload_size in (1024, 64 * 1024 - 1):
+		for fcc in (False, True):
+			states, result = bench_length_frame(payload_size, fcc=fcc)
+			print("  payload {0:6}{1}: states {2:3}".format(payload_size, " +FCC" if fcc else "", states))
+			for mode, (bps, chunk_bps) in result.items():
+				print("    {0:5}: recv_analyze {1:10.0f} bytes/sec  chunk {2:12.0f} bytes/sec".format(mode.name, bps, chunk_bps))
+	print("[Receive FCC check per frame]")
+	for frame_size in (16, 1024, 64 * 1024):
+		tail, stream = bench_fcc_check(frame_size)
+		print("  frame {0:6}: tail sum() {1:9.1f} us  per-byte accumulation {2:9.1f} us".format(frame_size, tail / 1000, stream / 1000))
+	print("[Frame accumulation]")
+	for frame_size in (1024, 64 * 1024):
+		for chunk in (1, 64):
+			result = bench_frame_accum(frame_size, chunk)
+			print("  frame {0:6} chunk {1:3}: ".format(frame_size, chunk) + "  ".join(["{0} {1:10.0f}".format(key, bps) for key, bps in result.items()]) + " bytes/sec")
+	print("[Allocations]")
+	for baseline in (True, False):
+		rx_blocks, rx_bytes, rx_peak, as_blocks = bench_rx_alloc(baseline=baseline)
+		print("  {0:8}: RX per byte: {1:5.1f} blocks {2:7.1f} bytes (peak {3:7.1f} bytes)   autosend.run() idle: {4:5.1f} blocks".format(
+			"per-byte" if baseline else "chunk", rx_blocks, rx_bytes, rx_peak, as_blocks))
+	print("[RX throughput with slow handler / queue policy]")
+	for policy in (thread.QueuePolicy.DROP_NEWEST, thread.QueuePolicy.DROP_OLDEST, thread.QueuePolicy.COALESCE):
+		bps, stats = bench_queue_policy(policy, size)
+		print("  {0:11}: {1:10.0f} bytes/sec  {2}".format(policy.name, bps, stats))
+	print("[Handler idle CPU / notify->handle latency]")
+	for polling in (True, False):
+		cpu, lat_med, lat_max = bench_hdlr_idle(polling=polling)
+		print("  {0:9}: cpu {1:6.1%}  latency median {2:7.1f} us  max {3:7.1f} us".format("polling" if polling else "comm_hdle", cpu, lat_med / 1000, lat_max / 1000))
@@ -7,7 +7,7 @@ import enum
 from . import serial_mng
 from .send_node import send_data, send_data_node, send_mng, send_data_list
 from .autosend import autosend_data, autosend_mng, autosend_node, autosend_list
-from .autoresp import analyze_result, autoresp_data, autoresp_list, autoresp_mng
+from .autoresp import analyze_result, autoresp_data, autoresp_list, autoresp_mng, frame_buffer
 from . import user_settings
 from . import thread
 
@@ -46,6 +46,7 @@ class gui_manager:
 		# Window Info
 		self._window: sg.Window = None
 		self._init_com()
+		self._init_queue()
 		self._init_window()
 		self._init_window_inf()		# window作成後に実行する
 		self._init_event()
@@ -70,6 +71,14 @@ class gui_manager:
 		self._bytesize_list = [8, 5, 6, 7]
 		self._parity_list = ["EVEN", "None", "ODD", "MARK", "SPACE"]
 		self._stopbit_list = [1,1.5,2]
+		# フレーム間ギャップ(キャラクタ数)
+		self._frame_gap_list = ["None", 3.5, 10, 20]
+		# 受信解析のキャラクタ間タイムアウト(キャラクタ数)
+		self._recv_timeout_list = ["None", 3.5, 10, 20, 100]
+
+	def _init_queue(self):
+		for name, policy, capacity in user_settings.queue_settings():
+			thread.messenger.config_queue(name, policy, capacity)
 
 	def _init_window(self):
 		sg.theme("Dark Blue 3")
@@ -79,6 +88,7 @@ class gui_manager:
 		]
 		layout_serial_status = [
 			sg.Text("---", key="text_status", size=(50,1)),
+			sg.Text("", key="text_queue_status", size=(90,1), font=("Consolas", 9)),
 		]
 		# Define: Serial Setting View
 		layout_serial_settings = [
@@ -96,6 +106,12 @@ class gui_manager:
 			sg.Text(" "),
 			sg.Text("StopBit:"),
 			sg.Combo(self._stopbit_list, key="cmb_stop_bit", default_value=self._stopbit_list[0], size=(7, 1)),
+			sg.Text(" "),
+			sg.Text("FrameGap:"),
+			sg.Combo(self._frame_gap_list, key="cmb_frame_gap", default_value=self._frame_gap_list[0], size=(7, 1), tooltip="指定キャラクタ時間の無通信で受信フレームを区切る"),
+			sg.Text(" "),
+			sg.Text("RxTimeout:"),
+			sg.Combo(self._recv_timeout_list, key="cmb_recv_timeout", default_value=self._recv_timeout_list[0], size=(7, 1), tooltip="自動応答の受信解析中に指定キャラクタ時間の無通信があればマッチ途中のデータを破棄する"),
 		]
 		# GUI共通部品定義
 		self._gui_param_init()
@@ -142,6 +158,20 @@ class gui_manager:
 			[sg.Column(layout_serial_auto_resp, scrollable=True, vertical_scroll_only=False, size=self._size_rxtx, vertical_alignment="top")],
 			[sg.Button("Update", key="btn_autoresp_update", size=(15, 1), enable_events=True)],
 		]
+		# Define: AutoResponse Stats View
+		layout_serial_autoresp_stats_column = [
+			[sg.Table(
+				self._autoresp_mng.stats_table(), key="table_autoresp_stats",
+				headings=["受信解析ID", "Match", "Abort", "FCC NG", "Bytes", "解析回数", "解析合計[us]", "解析最大[us]", "遅延回数", "遅れ平均[us]", "遅れ最大[us]"],
+				col_widths=[20, 10, 10, 10, 12, 10, 14, 14, 10, 14, 14], auto_size_columns=False, justification="right",
+				num_rows=12, font=self._log_font,
+			)],
+			[
+				sg.Button("Refresh", key="btn_autoresp_stats_refresh", size=(15, 1), enable_events=True),
+				sg.Button("Clear", key="btn_autoresp_stats_clear", size=(15, 1), enable_events=True),
+				sg.Button("Dump", key="btn_autoresp_stats_dump", size=(15, 1), enable_events=True, tooltip="解析合計時間の降順でログに出力する"),
+			],
+		]
 		# Define: log View
 		layout_serial_log_col = [
 			[
@@ -172,6 +202,7 @@ class gui_manager:
 				sg.Tab('Auto Response Settings', layout_serial_auto_resp_column),
 				sg.Tab('Manual Send Settings', layout_serial_send_column),
 				sg.Tab('Auto Send Settings', layout_serial_autosend_column),
+				sg.Tab('Auto Response Stats', layout_serial_autoresp_stats_column),
 			]])],
 			[sg.Frame("Log:", layout_serial_log)],
 		]
@@ -198,6 +229,10 @@ class gui_manager:
 			"autoresp_enable": self._hdl_autoresp_enable,
 			# データ更新
 			"btn_autoresp_update": self._hdl_btn_autoresp_update,
+			# 統計情報
+			"btn_autoresp_stats_refresh": self._hdl_btn_autoresp_stats_refresh,
+			"btn_autoresp_stats_clear": self._hdl_btn_autoresp_stats_clear,
+			"btn_autoresp_stats_dump": self._hdl_btn_autoresp_stats_dump,
 			### 送信
 			# 送信ボタン
 			"btn_send": self._hdl_btn_send,
@@ -215,6 +250,8 @@ class gui_manager:
 			"_swe_disconnected": self._hdl_swe_disconnected,
 			"_swe_autosend_disable": self._hdl_autosend_disable,
 			"_swe_autosend_gui_update": self._hdl_autosend_gui_update,
+			"_swe_send_gui_refresh": self._hdl_send_gui_refresh,
+			"_swe_queue_status": self._hdl_queue_status,
 		}
 		# event init
 		self._gui_hdl_init()
@@ -226,6 +263,7 @@ class gui_manager:
 	def _gui_hdl_init(self):
 		self._conn_btn_hdl = self._window["btn_connect"]
 		self._conn_status_hdl = self._window["text_status"]
+		self._queue_status_hdl = self._window["text_queue_status"]
 		self._gui_hdl_autoresp_update_btn = self._window["btn_autoresp_update"]
 
 	def _hdl_send_gui(self, values, row, col):
@@ -235,6 +273,13 @@ class gui_manager:
 		part: sg.Element = self._window[("send", row, col)]
 		self._update_send_gui(part, "send", row, col)
 
+	def _hdl_send_gui_refresh(self, values):
+		"""
+		自動応答からのコールバック
+		GUIスレッド以外で更新した送信データをGUIに反映する
+		"""
+		self._send_mng.gui_refresh()
+
 	def _hdl_btn_connect(self, values):
 		#print("Button Pushed!")
 		# 状態ごとに処理を実施
@@ -341,6 +386,22 @@ class gui_manager:
 			# 非通信時は直接更新
 			self._autoresp_update()
 
+	def _hdl_btn_autoresp_stats_refresh(self, values):
+		"""
+		イベントハンドラ：自動応答統計情報表示更新
+		統計情報はシリアル通信スレッドが更新するが、表示用に読み出すだけなので直接参照する
+		"""
+		self._window["table_autoresp_stats"].update(values=self._autoresp_mng.stats_table())
+
+	def _hdl_btn_autoresp_stats_clear(self, values):
+		self._autoresp_mng.stats_clear()
+		self._hdl_btn_autoresp_stats_refresh(values)
+
+	def _hdl_btn_autoresp_stats_dump(self, values):
+		# 解析合計時間の降順
+		print(self._autoresp_mng.dump_stats(sort=6))
+		self._hdl_btn_autoresp_stats_refresh(values)
+
 	def _hdl_btn_send(self, values, row, col):
 		self._req_send_bytes(row)
 
@@ -360,6 +421,8 @@ class gui_manager:
 				# 自動送信無効のとき
 				# 自動送信を有効にする
 				self._autosend_mng.start(row)
+				# 受信待ち中のシリアル通信スレッドを起床させる
+				thread.messenger.wakeup_serial()
 				# GUI更新
 				self._window[("btn_autosend", row, col)].Update(text="Sending..")
 
@@ -382,6 +445,13 @@ class gui_manager:
 		# GUI更新
 		self._window[("btn_autosend", values["_swe_autosend_disable"], None)].Update(text="Start")
 
+	def _hdl_queue_status(self, values):
+		"""
+		管理スレッドからのコールバック
+		スレッド間キューの統計情報を表示する
+		"""
+		self._queue_status_hdl.Update(value=values["_swe_queue_status"])
+
 	def _hdl_autosend_gui_update(self, values):
 		# 引数取得
 		row, col_disable, col_enable = values["_swe_autosend_gui_update"]
@@ -435,20 +505,36 @@ class gui_manager:
 		print("Exit: wnd_proc()")
 
 	def comm_hdle(self):
-		self.log_str = ""
+		# 受信ログバッファ
+		# ログ出力までの受信データを蓄積する
+		self.log_buff = frame_buffer(4096)
 		self.log_pos = 0
 		timestamp_curr: int = 0
 		timestamp_rx: int = 0
 		rx_commit_interval: int = 1 * 1000 * 1000 * 1000	# 1sec無受信でコミット
+		overflow: int = 0
+		queue_status: str = ""
+		timestamp_status: int = 0
+		status_interval: int = 1 * 1000 * 1000 * 1000	# キュー統計は1secごとに更新
+		hdlr_exit: bool = False
 		try:
 			# exit通知があるまでループ
-			while not thread.messenger.has_exit_hdlr():
+			while not hdlr_exit:
+				# シリアル通信からの指令を待機
+				# 受信ログバッファにデータがあればコミット時間まで、無ければ通知があるまで待つ
+				timeout = status_interval / (1000 * 1000 * 1000)
+				if len(self.log_buff) > 0:
+					timeout = min(timeout, max(0, timestamp_rx + rx_commit_interval - time.perf_counter_ns()) / (1000 * 1000 * 1000))
+				thread.messenger.wait_notify_serial2hdrl(timeout)
 				# 今回現在時間取得
 				timestamp_curr = time.perf_counter_ns()
-				# シリアル通信からの指令を待機
-				if thread.messenger.has_notify_serial2hdrl():
-					msg = thread.messenger.get_notify_serial2hdrl()
-					if msg.notify == thread.ThreadNotify.AUTORESP_UPDATE_FIN:
+				# シリアル通信からの指令をまとめて処理
+				for msg in thread.messenger.get_notify_serial2hdrl_batch():
+					if msg.notify == thread.ThreadNotify.EXIT_HDLR:
+						# 終了通知
+						# 同じバッチ内の残りのメッセージは処理してから終了する
+						hdlr_exit = True
+					elif msg.notify == thread.ThreadNotify.AUTORESP_UPDATE_FIN:
 						# データ更新でボタン有効化
 						self._gui_hdl_autoresp_update_btn.Update(text="Update", disabled=False)
 					elif msg.notify == thread.ThreadNotify.DISCONNECTED:
@@ -457,46 +543,75 @@ class gui_manager:
 						self._window.write_event_value("_swe_disconnected", "")
 					elif msg.notify == thread.ThreadNotify.RECV_ANALYZE:
 						# 受信解析結果メッセージ
-						result = msg.result
-						if result.prev_buff_commit():
-							# 直前までのバッファを出力
-							if self.log_str != "":
-								# ログ出力
-								self.comm_hdle_log_output("RX", self.log_str, "", result._timestamp_rx_prev)
-								# バッファクリア
-								self.log_str = ""
-						if result.new_data_push():
-							# 受信データをバッファに追加要求
-							# 受信時タイムスタンプ取得
-							timestamp_rx = result._timestamp_rx
-							# ログバッファに受信データを追加
-							# ログ出力は実施しない
-							#self.log_str += format(result.data, "02X")
-							self.log_str += result.data.hex()
-						if result.buff_commit():
-							# 受信データを出力する
-							if self.log_str != "":
-								# ログ出力
-								self.comm_hdle_log_output("RX", self.log_str, result.id, result._timestamp_rx, result.anlyz_log)
-								# バッファクリア
-								self.log_str = ""
-						pass
+						# COALESCEでまとめたメッセージは複数の解析結果を持つ
+						for result in msg.analyze_results():
+							if result.prev_buff_commit():
+								# 直前までのバッファを出力
+								if len(self.log_buff) > 0:
+									# ログ出力
+									self.comm_hdle_log_output("RX", self.log_buff.view().hex(), "", result._timestamp_rx_prev)
+									# バッファクリア
+									self.log_buff.clear()
+							if result.new_data_push():
+								# 受信データをバッファに追加要求
+								# 受信時タイムスタンプ取得
+								timestamp_rx = result._timestamp_rx
+								# ログバッファに受信データを追加
+								# ログ出力は実施しない
+								self.log_buff.push(result.data)
+							if result.buff_commit():
+								# 受信データを出力する
+								if len(self.log_buff) > 0:
+									# ログバッファのmemoryviewは保持しないように、すぐに文字列にする
+									log_data = self.log_buff.view().hex()
+									# マッチしたフレームより前のデータは、マッチしなかったデータとして先に出力
+									frame_pos = len(log_data) - result.frame_len * 2
+									if frame_pos > 0:
+										self.comm_hdle_log_output("RX", log_data[:frame_pos], "", result._timestamp_rx_prev)
+										log_data = log_data[frame_pos:]
+									# ログ出力
+									data_id = result.id
+									if result.fcc_error:
+										data_id += " FCC NG"
+									self.comm_hdle_log_output("RX", log_data, data_id, result._timestamp_rx, result.anlyz_log)
+									# バッファクリア
+									self.log_buff.clear()
+					elif msg.notify == thread.ThreadNotify.RX_FRAME:
+						# フレーム間ギャップで受信フレーム確定
+						frame = msg.frame
+						if len(self.log_buff) > 0:
+							# ログ出力
+							self.comm_hdle_log_output("RX", self.log_buff.view().hex(), self.comm_hdle_frame_detail(frame), frame.timestamp_end)
+							# バッファクリア
+							self.log_buff.clear()
 					elif msg.notify == thread.ThreadNotify.COMMIT_TX:
 						result = msg.as_result
 						# 送信データをログ出力
-						self.comm_hdle_log_output("TX", result.send_ref.data_bytes.hex().upper(), result.send_ref.id, result.timestamp)
+						data_id = result.send_ref.id
+						if result.delay_deadline is not None:
+							# 応答遅延の期限に対する実送信開始時間の遅れ
+							data_id += " delay {0:+.1f}us".format((result.timestamp_tx_begin - result.delay_deadline) / 1000)
+						self.comm_hdle_log_output("TX", result.data.hex().upper(), data_id, result.timestamp_tx_begin)
 					else:
 						pass
+				# 通知の破棄チェック
+				if thread.messenger.overflow_notify_serial2hdrl() != overflow:
+					overflow = thread.messenger.overflow_notify_serial2hdrl()
+					print("*warning* RX notify queue overflow: total " + str(overflow) + " messages dropped.")
+				# キュー統計をGUIに通知
+				if (timestamp_curr - timestamp_status) > status_interval:
+					timestamp_status = timestamp_curr
+					status = "  ".join([str(stats) for stats in thread.messenger.queue_stats()])
+					if status != queue_status:
+						queue_status = status
+						self._window.write_event_value("_swe_queue_status", status)
 				# 一定時間受信が無ければ送信バッファをコミット
 				if (timestamp_curr - timestamp_rx) > rx_commit_interval:
-					if self.log_str != "":
+					if len(self.log_buff) > 0:
 						# ログ出力
-						self.comm_hdle_log_output("RX", self.log_str, "", timestamp_rx)
+						self.comm_hdle_log_output("RX", self.log_buff.view().hex(), "", timestamp_rx)
 						# バッファクリア
-						self.log_str = ""
-				# GUIに処理を回す
-				time.sleep(0.000001)
-				#print("Run: serial_hdle()")
+						self.log_buff.clear()
 			# 処理終了
 			print("Exit: serial_hdle()")
 		except:
@@ -505,6 +620,17 @@ class gui_manager:
 		# スレッド終了をメインスレッドに通知
 		self._window.write_event_value("_swe_hdrl_exit", "")
 
+	def comm_hdle_frame_detail(self, frame: serial_mng.rx_frame) -> str:
+		"""
+		フレーム間ギャップで区切った受信フレームの詳細
+		"""
+		detail = []
+		if frame.gap_error:
+			detail.append("T1.5 NG")
+		if frame.overflow:
+			detail.append("overflow")
+		return ",".join(detail)
+
 	def comm_hdle_log_output(self, rxtx:str, data:str, data_id:str, timestamp:int, anlyz_log = None):
 		# タイムスタンプ整形
 		ts_next, ts_ns = divmod(timestamp, 1000)	# nano sec
@@ -529,8 +655,13 @@ class gui_manager:
 		if self._window:
 			self._window.close()
 		self._serial.close()
+		# 受信解析(観測のみ)スレッド停止
+		self._autoresp_mng.anlyz_worker_shutdown()
 
 	def _serial_open(self) -> bool:
+		# 受信オプション
+		self._serial.rxopt_frame_gap_update(self._get_com_frame_gap())
+		self._serial.rxopt_recv_timeout_update(self._get_com_recv_timeout())
 		result = self._serial.open(
 			self._get_com_port(),
 			self._get_com_baudrate(),
@@ -558,6 +689,25 @@ class gui_manager:
 	def _get_com_stopbit(self) -> int:
 		return self._window["cmb_stop_bit"].Get()
 
+	def _get_com_frame_gap(self) -> float:
+		return self._get_com_chars("cmb_frame_gap")
+
+	def _get_com_recv_timeout(self) -> float:
+		return self._get_com_chars("cmb_recv_timeout")
+
+	def _get_com_chars(self, key: str) -> float:
+		"""
+		キャラクタ数の設定を取得する。無効設定はNone。
+		"""
+		value = self._window[key].Get()
+		try:
+			gap = float(value)
+		except (TypeError, ValueError):
+			return None
+		if gap <= 0:
+			return None
+		return gap
+
 	def _get_com_info(self) -> str:
 		result = ""
 		result += "Port:[" + self._get_com_port() + "]"
@@ -569,6 +719,8 @@ class gui_manager:
 		result += "Parity:[" + self._get_com_parity() + "]"
 		result += "  "
 		result += "StopBit:[" + str(self._get_com_stopbit()) + "]"
+		result += "  "
+		result += "FrameGap:[" + str(self._get_com_frame_gap()) + "]"
 		return result
 
 	def _gui_param_init(self) -> None:
@@ -677,7 +829,7 @@ class gui_manager:
 			# Add Name
 			parts.append(sg.Text(resp[autoresp_list.ID], size=self._size_ar_id, font=self._font_id))
 			# Add SendDataID
-			parts.append(sg.Text(resp[autoresp_list.SENDDATA_ID], size=self._size_ar_id, font=self._font_id))
+			parts.append(sg.Text(str(resp[autoresp_list.SENDDATA_ID]), size=self._size_ar_id, font=self._font_id))
 			# Add RecvData
 			parts.extend(self._init_gui_rx("resp", row, resp))
 			# GUI更新
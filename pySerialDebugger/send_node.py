@@ -1,4 +1,5 @@
 import re
+import threading
 from typing import Any, List, Dict, Tuple
 import PySimpleGUI as sg
 import enum
@@ -9,6 +10,19 @@ class ChecksumType(enum.Enum):
 	TWOS_COMPL = enum.auto()	# 2の補数
 	ONES_COMPL = enum.auto()	# 2の補数
 
+def calc_checksum(checksum: ChecksumType, total: int) -> int:
+	"""
+	データの総和からチェックサムを計算する
+	"""
+	match checksum:
+		case ChecksumType.SUM:
+			# 総和のみ
+			return total % 256
+		case ChecksumType.ONES_COMPL:
+			return ((total ^ 0xFF)) % 256
+		case _:
+			return ((total ^ 0xFF) + 1) % 256
+
 class send_data:
 	"""
 
@@ -100,6 +114,7 @@ class send_data:
 		# サイズチェック
 		if self.size < bf_pos:
 			raise Exception("send_node: BITFIELD values takes too large bit_size.")
+		self.value = value
 
 	@classmethod
 	def input(cls, hex: str):
@@ -195,6 +210,18 @@ class send_data:
 		# size取得
 		byte_size = self.get_size()
 		self.value = int.from_bytes(tx_data[idx:idx+byte_size], byteorder=self.endian, signed=False)
+		if self.type == send_data.BITFIELD:
+			self._set_value_bitfield()
+
+	def _set_value_bitfield(self) -> None:
+		"""
+		BITFIELDの値を各フィールドに分配する
+		"""
+		bf_pos = 0
+		for val in self.values:
+			bf_size = val[send_data.BF_SIZE]
+			val[send_data.BF_NODE].value = (self.value >> bf_pos) & ((1 << bf_size) - 1)
+			bf_pos += bf_size
 
 	def get_bytes(self) -> bytes:
 		# タイプごとに処理
@@ -225,7 +252,7 @@ class send_data:
 	def _get_bytes_bitfield(self) -> bytes:
 		# size取得
 		byte_size = self.get_size()
-		return b'\88'
+		return self.value.to_bytes(byte_size, self.endian)
 
 	def get_gui(self, key, row, col) -> Any:
 		# タイプごとに処理
@@ -343,6 +370,8 @@ class send_data_node:
 		self.fcc_pos = None
 		self.fcc_calc_begin = None
 		self.fcc_calc_end = None
+		# FCC計算範囲の総和(差分更新用)
+		self._fcc_sum: int = 0
 		if send_data_list.FCC_CALC_END < data_len:
 			self.fcc_pos = data[send_data_list.FCC_POS]
 			self.fcc_calc_begin = data[send_data_list.FCC_CALC_BEGIN]
@@ -502,17 +531,48 @@ class send_data_node:
 		for i in range(self.fcc_calc_begin, self.fcc_calc_end):
 			if (i != self.fcc_pos) and (i < self.size):
 				fcc += self.data_array[i]
+		self._fcc_sum = fcc
 		# FCC計算タイプ
-		match self.fcc_type:
-			case ChecksumType.SUM:
-				# 総和のみ
-				# fcc = fcc
-				pass
-			case ChecksumType.ONES_COMPL:
-				fcc = ((fcc ^ 0xFF)) % 256
-			case _:
-				fcc = ((fcc ^ 0xFF) + 1) % 256
-		return fcc
+		return calc_checksum(self.fcc_type, fcc)
+
+	def _fcc_range_sum(self, begin: int, end: int) -> int:
+		"""
+		[begin,end)のうちFCC計算範囲に含まれる要素の総和
+		"""
+		begin = max(begin, self.fcc_calc_begin)
+		end = min(end, self.fcc_calc_end, self.size)
+		if begin >= end:
+			return 0
+		total = sum(self.data_array[begin:end])
+		if begin <= self.fcc_pos < end:
+			total -= self.data_array[self.fcc_pos]
+		return total
+
+	def write_bytes(self, pos: int, data) -> None:
+		"""
+		送信データのpos位置からdataを書き込む
+		FCCは書き込み前後の差分で更新する。
+		data_bytesへの反映はupdate_bytes()、GUIへの反映はrefresh_gui()で行うので、
+		複数箇所を書き込むときは最後に1回だけ呼び出せばいい。
+		"""
+		end = pos + len(data)
+		if self.fcc_pos is None:
+			self.data_array[pos:end] = data
+			return
+		before = self._fcc_range_sum(pos, end)
+		self.data_array[pos:end] = data
+		self._fcc_sum += self._fcc_range_sum(pos, end) - before
+		self.data_array[self.fcc_pos] = calc_checksum(self.fcc_type, self._fcc_sum)
+
+	def write_value(self, pos: int, value: int) -> None:
+		"""
+		送信データのpos位置にあるGUI部品の値としてvalueを書き込む
+		"""
+		col = self.map_data2gui[pos]
+		data = self.data_list[col]
+		byte_size = data.get_size()
+		value &= (1 << (byte_size * 8)) - 1
+		self.write_bytes(self.map_gui2data[col], value.to_bytes(byte_size, data.endian))
 
 	def update_bytes(self):
 		"""
@@ -567,6 +627,22 @@ class send_data_node:
 			gui_fcc = wnd[(key, row, fcc_idx)]
 			gui_fcc.Update(value=fcc_data.get_gui_value())
 
+	def refresh_gui(self) -> None:
+		"""
+		送信データのbytearrayをGUIに反映する
+		GUIスレッドから呼び出すこと
+		"""
+		if self._wnd is None:
+			return
+		for col, data in enumerate(self.data_list):
+			data.set_value(self.data_array, self.map_gui2data[col])
+			if data.type == send_data.BITFIELD:
+				# BITFIELDはフィールドごとのGUI部品に反映する
+				for bf_idx, val in enumerate(data.values):
+					self._wnd[("gui_input_bf", self._gui_key, self._gui_row, (col, bf_idx))].Update(value=val[send_data.BF_NODE].get_gui_value())
+			else:
+				self._wnd[(self._gui_key, self._gui_row, col)].Update(value=data.get_gui_value())
+
 	def update_gui(self, pos:int, value:int):
 		"""
 		GUIと送信データを更新する
@@ -588,6 +664,11 @@ class send_mng:
 		self._send_data_list: List[send_data_node] = []
 		# 定義データ最大サイズ
 		self._max_size: int = 0
+		# GUI反映待ちの送信データ
+		# GUIスレッド以外で更新した送信データは、まとめてGUIスレッドで反映する
+		self._wnd: sg.Window = None
+		self._gui_dirty: Dict[str, send_data_node] = {}
+		self._gui_dirty_lock = threading.Lock()
 		#
 		for i, data in enumerate(send):
 			# send_data管理ノード作成
@@ -607,9 +688,34 @@ class send_mng:
 		"""
 		window作成後に、windowインスタンスへの参照を設定する
 		"""
+		self._wnd = wnd
 		for node in self._send_data_list:
 			node.init_wnd(wnd)
 
+	def gui_refresh_req(self, node: send_data_node) -> None:
+		"""
+		送信データのGUI反映を要求する
+		反映待ちが無いときだけGUIスレッドに通知するので、GUI反映までの更新はまとめて1回で反映される。
+		"""
+		if self._wnd is None:
+			return
+		with self._gui_dirty_lock:
+			notify = not self._gui_dirty
+			self._gui_dirty[node.id] = node
+		if notify:
+			self._wnd.write_event_value("_swe_send_gui_refresh", "")
+
+	def gui_refresh(self) -> None:
+		"""
+		GUI反映待ちの送信データをGUIに反映する
+		GUIスレッドから呼び出すこと
+		"""
+		with self._gui_dirty_lock:
+			dirty = self._gui_dirty
+			self._gui_dirty = {}
+		for node in dirty.values():
+			node.refresh_gui()
+
 
 
 if __name__ == "__main__":
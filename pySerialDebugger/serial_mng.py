@@ -3,8 +3,10 @@ import serial
 from serial.tools import list_ports, list_ports_common
 import time
 import enum
+import threading
+import collections
 
-from .autoresp import autoresp_data, autoresp_list, autoresp_mng
+from .autoresp import autoresp_data, autoresp_list, autoresp_mng, analyze_result
 from .autosend import autosend_data, autosend_mng, autosend_node, autosend_list, autosend_result
 from . import thread
 
@@ -28,6 +30,248 @@ class ThreadNotify(enum.Enum):
 	EXIT_TASK = enum.auto()					# シリアルタスク終了
 
 
+class RxMode(enum.Enum):
+	"""
+	シリアル受信モード
+	"""
+	BYTE = enum.auto()						# 1バイトずつ受信
+	CHUNK = enum.auto()						# 受信済みデータを一括受信
+
+
+
+class rx_frame:
+	"""
+	フレーム間ギャップで区切った受信フレーム
+	受信データは受信解析結果として管理スレッドに渡しているので、フレームの区切りの情報だけを持つ。
+	"""
+
+	def __init__(self, size: int, timestamp_begin: int, timestamp_end: int, gap_error: bool, overflow: bool) -> None:
+		# 受信データのバイト数
+		self.size = size
+		# 先頭バイト/末尾バイトの受信時間
+		self.timestamp_begin = timestamp_begin
+		self.timestamp_end = timestamp_end
+		# フレーム内でT1.5を超えるキャラクタ間ギャップがあった
+		self.gap_error = gap_error
+		# 最大フレーム長を超えたので途中で区切った
+		self.overflow = overflow
+
+
+class frame_segmenter:
+	"""
+	無通信時間(フレーム間ギャップ)による受信フレーム分割
+	Modbus-RTUと同様に、T3.5(3.5キャラクタ時間)以上の無通信でフレームの区切りとする。
+	フレーム内のT1.5を超えるキャラクタ間ギャップはエラーとして記録する。
+	19200bps超ではModbus-RTUの規定に倣い、1キャラクタ=500usとして扱う。
+	"""
+
+	def __init__(self) -> None:
+		# フレーム区切りとするギャップ(キャラクタ数)、Noneで無効
+		self.gap_chars: float = None
+		# ギャップ時間(ns)
+		self._gap: int = 0
+		self._gap_char: int = 0
+		# 最大フレーム長
+		self._size_max: int = 4096
+		# 受信中フレーム情報
+		self._size: int = 0
+		self._timestamp_begin: int = 0
+		self._timestamp_end: int = 0
+		self._gap_error: bool = False
+
+	def enable(self) -> bool:
+		return self.gap_chars is not None
+
+	def config(self, gap_chars: float, bps: int, byte_time: int) -> None:
+		"""
+		ギャップ設定
+		"""
+		self.gap_chars = gap_chars
+		if gap_chars is None:
+			return
+		# 1キャラクタ時間
+		char_time = byte_time
+		if bps > 19200:
+			char_time = 500 * 1000
+		self._gap = int(char_time * gap_chars)
+		self._gap_char = int(char_time * 1.5)
+		self.init()
+
+	def init(self) -> None:
+		self._size = 0
+		self._timestamp_begin = 0
+		self._timestamp_end = 0
+		self._gap_error = False
+
+	def deadline(self) -> int:
+		"""
+		受信中フレームが確定する時間を返す。受信中フレームが無ければNone。
+		"""
+		if self._size == 0:
+			return None
+		return self._timestamp_end + self._gap
+
+	def push(self, data: memoryview, timestamp_begin: int, timestamp_end: int) -> rx_frame:
+		"""
+		受信データを追加する
+		前回受信からギャップ以上経過していたら、追加前に受信中フレームを確定して返す。
+		最大フレーム長に達したかは、追加したデータを受信解析した後にcheck_overflow()で確認する。
+		"""
+		frame = None
+		if self._size > 0:
+			gap = timestamp_begin - self._timestamp_end
+			if gap >= self._gap:
+				frame = self._commit(False)
+			elif gap > self._gap_char:
+				self._gap_error = True
+		if self._size == 0:
+			self._timestamp_begin = timestamp_begin
+		self._size += len(data)
+		self._timestamp_end = timestamp_end
+		return frame
+
+	def check_overflow(self) -> rx_frame:
+		"""
+		最大フレーム長チェック
+		受信中フレームが最大フレーム長に達していたら確定して返す。
+		"""
+		if self._size >= self._size_max:
+			return self._commit(True)
+		return None
+
+	def check(self, timestamp: int) -> rx_frame:
+		"""
+		ギャップ経過チェック
+		受信中フレームのギャップが経過していたら確定して返す。
+		"""
+		if self._size > 0 and (timestamp - self._timestamp_end) >= self._gap:
+			return self._commit(False)
+		return None
+
+	def _commit(self, overflow: bool) -> rx_frame:
+		frame = rx_frame(self._size, self._timestamp_begin, self._timestamp_end, self._gap_error, overflow)
+		self.init()
+		return frame
+
+
+
+class tx_writer:
+	"""
+	シリアル送信スレッド
+	送信要求をキューに積み、専用スレッドでwrite/flushを実施する。
+	シリアル通信スレッドは送信完了を待たずに受信処理を継続できる。
+	キューに連続して積まれた送信要求は1回のwriteにまとめて送信する。
+	送信スレッドで例外が発生したら送信スレッドは終了し、以降のcheck()/push()で例外を送出する。
+	"""
+
+	def __init__(self) -> None:
+		self._serial: serial.Serial = None
+		self._byte_time: int = 0
+		# 送信キュー: (送信データ, 送信結果)
+		# dequeのappend/popleftはスレッドセーフ
+		self._queue = collections.deque()
+		self._event = threading.Event()
+		self._exit: bool = False
+		self._thread: threading.Thread = None
+		# 送信スレッドで発生した例外
+		self._error: BaseException = None
+		# 1回のwriteにまとめる最大サイズ
+		self._write_max: int = 4096
+
+	def start(self, port: serial.Serial, byte_time: int) -> None:
+		"""
+		送信スレッド開始
+		@param port Noneのときは送信を実施しない(DEBUG)
+		"""
+		self._serial = port
+		self._byte_time = byte_time
+		self._queue.clear()
+		self._event.clear()
+		self._exit = False
+		self._error = None
+		self._thread = threading.Thread(target=self._run, name="tx_writer", daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		"""
+		送信スレッド停止
+		キューに残っている送信要求は送信してから終了する。
+		"""
+		if self._thread is not None:
+			self._exit = True
+			self._event.set()
+			self._thread.join()
+			self._thread = None
+
+	def check(self) -> None:
+		"""
+		送信スレッドの異常チェック
+		送信スレッドが例外で終了していたら、シリアル通信スレッドに例外を送出する。
+		"""
+		if self._error is not None:
+			raise Exception("TX writer stopped: " + repr(self._error)) from self._error
+
+	def push(self, data: bytes, result: autosend_result) -> None:
+		"""
+		送信要求
+		送信スレッドが終了していたら送信要求は積まずに例外を送出する。
+		"""
+		self.check()
+		self._queue.append((data, result))
+		self._event.set()
+
+	def _run(self) -> None:
+		try:
+			while True:
+				self._event.wait()
+				self._event.clear()
+				while self._queue:
+					self._write(self._pop_batch())
+				if self._exit:
+					break
+		except Exception as e:
+			import traceback
+			traceback.print_exc()
+			print("TX writer occur exception!")
+			# シリアル通信スレッドに通知して切断させる
+			self._error = e
+			thread.messenger.wakeup_serial()
+
+	def _pop_batch(self) -> list:
+		"""
+		キューに積まれている送信要求を最大サイズまでまとめて取り出す
+		"""
+		batch = [self._queue.popleft()]
+		size = len(batch[0][0])
+		while self._queue and size + len(self._queue[0][0]) <= self._write_max:
+			req = self._queue.popleft()
+			size += len(req[0])
+			batch.append(req)
+		return batch
+
+	def _write(self, batch: list) -> None:
+		"""
+		まとめた送信要求を1回で送信し、各送信要求の送信開始/完了時間を設定する
+		"""
+		data = b''.join([req[0] for req in batch])
+		timestamp_begin = time.perf_counter_ns()
+		if self._serial is not None:
+			self._serial.write(data)
+			self._serial.flush()
+		timestamp_end = time.perf_counter_ns()
+		# flush完了時に送信完了したとみなし、送信開始時間を逆算する
+		timestamp_wire = max(timestamp_begin, timestamp_end - len(data) * self._byte_time)
+		# 各送信要求の送信時間を算出
+		pos = 0
+		for req_data, result in batch:
+			begin = timestamp_wire + pos * self._byte_time
+			pos += len(req_data)
+			end = min(timestamp_wire + pos * self._byte_time, timestamp_end)
+			result.set_tx_time(begin, end)
+			# 送信実施を通知
+			thread.messenger.notify_hdlr_send(result)
+
+
 
 class serial_manager:
 	
@@ -37,6 +281,42 @@ class serial_manager:
 		# フレーム受信中に手動送信することを防ぐ
 		# 前回受信から特定時間経過するまで手動送信しない
 		self._send_tx_delay: int = 0
+		# 1バイト送受信時間(ns)
+		# 一括受信したデータの各バイトの受信時間を復元するために使う
+		self._byte_time: int = 0
+		self._bps: int = 0
+		# フレーム間ギャップによるフレーム分割
+		self._segmenter = frame_segmenter()
+		self._frame_gap: float = None
+		# 受信解析のキャラクタ間タイムアウト
+		# マッチ途中で指定キャラクタ時間以上受信が途切れたら、マッチ途中のデータを破棄する
+		self._recv_timeout_chars: float = None
+		self._recv_timeout: int = 0
+		# 受信モード
+		self._rx_mode: RxMode = RxMode.CHUNK
+		# 一括受信時の最大サイズ
+		self._rx_chunk_max: int = 4096
+		# 受信リングバッファ
+		# 受信データはreadintoでリングバッファに直接格納し、memoryviewで受信解析に渡す。
+		# 管理スレッドへ通知するデータはコピーする(キューに積んでいる間に上書きされうるため)。
+		# 1回の受信データは必ず連続領域に格納する(末尾に収まらなければ先頭に戻る)。
+		self._rx_buf_size: int = 64 * 1024
+		self._rx_buf = bytearray(self._rx_buf_size)
+		self._rx_buf_view = memoryview(self._rx_buf)
+		self._rx_buf_pos: int = 0
+		# 受信待機設定
+		# Trueのとき次のイベント(受信/自動送信/GUI通知)まで受信待ちでブロックする
+		# Falseのときはノンブロッキングでポーリングする
+		self._rx_blocking: bool = True
+		# 受信待ち最大時間(ns)
+		self._rx_wait_max: int = 100 * 1000 * 1000
+		# シリアルポートに設定中のtimeout(sec)
+		self._serial_timeout: float = 0
+		# 設定中のtimeoutが要求より短いときに、再設定せずにそのまま使う割合
+		# 次のイベントより早く起床するだけなので、要求の(1-この割合)以上なら再設定しない
+		self._serial_timeout_early: float = 0.25
+		# 送信スレッド
+		self._tx = tx_writer()
 		# autoresp管理
 		self._autoresp_mng: autoresp_mng = None
 		# autosend管理
@@ -85,6 +365,9 @@ class serial_manager:
 			_sb = stopbit_tbl[stopbit]
 		else:
 			return False
+		# 1バイト送受信時間
+		self._byte_time = self.calc_byte_time(bps, bytesize, parity, stopbit)
+		self._bps = bps
 		# Serial Open
 		try:
 			self._serial = serial.Serial(port, bps, _bs, _parity, _sb, 0)
@@ -96,6 +379,17 @@ class serial_manager:
 			self._is_open = False
 			return False
 
+	@staticmethod
+	def calc_byte_time(bps:int, bytesize:int, parity:str, stopbit:float) -> int:
+		"""
+		1バイト(1キャラクタ)の送受信時間をnsで返す
+		スタートビット + データビット + パリティビット + ストップビット
+		"""
+		bits = 1 + bytesize + stopbit
+		if parity != "None":
+			bits += 1
+		return int(bits * 1000 * 1000 * 1000 / bps)
+
 	def close(self) -> None:
 		if self._serial is not None:
 			if self._serial.is_open:
@@ -118,14 +412,13 @@ class serial_manager:
 		self._autosend_mng = mng
 		self._autosend_mng.set_send_cb(self.cb_autosend)
 
-	def cb_autosend(self, data: bytes):
+	def cb_autosend(self, data: bytes, result: autosend_result):
 		"""
 		自動送信用コールバック関数
+		送信スレッドに送信要求を積む。送信完了は送信スレッドから通知する。
 		"""
-		if len(data) > 0 and not DEBUG:
-			#if self._serial.out_waiting > 0:
-			self._serial.write(data)
-			self._serial.flush()
+		if len(data) > 0:
+			self._tx.push(data, result)
 
 	def sendopt_txdelay_update(self, time: int) -> None:
 		"""
@@ -134,6 +427,34 @@ class serial_manager:
 		# ナノ秒に直しておく
 		self._send_tx_delay = time * 1000
 
+	def rxopt_mode_update(self, mode: RxMode) -> None:
+		"""
+		受信モードを設定する
+		"""
+		self._rx_mode = mode
+
+	def rxopt_frame_gap_update(self, gap_chars: float) -> None:
+		"""
+		フレーム間ギャップ設定を更新する
+		@param gap_chars フレーム区切りとする無通信時間(キャラクタ数)、Noneで無効
+		次回接続時に反映する。
+		"""
+		self._frame_gap = gap_chars
+
+	def rxopt_recv_timeout_update(self, timeout_chars: float) -> None:
+		"""
+		受信解析のキャラクタ間タイムアウト設定を更新する
+		@param timeout_chars マッチ途中のデータを破棄する無通信時間(キャラクタ数)、Noneで無効
+		次回接続時に反映する。
+		"""
+		self._recv_timeout_chars = timeout_chars
+
+	def rxopt_blocking_update(self, blocking: bool) -> None:
+		"""
+		受信待機設定を更新する
+		"""
+		self._rx_blocking = blocking
+
 	def connect(self) -> None:
 		"""
 		Serial open and communicate.
@@ -149,7 +470,14 @@ class serial_manager:
 
 		# 自動応答初期化
 		self._autoresp_mng.recv_analyze_init()
-		as_result = autosend_result()
+		# 応答遅延タイマ較正
+		self._autosend_mng.timer_calibrate()
+		# フレーム分割初期化
+		self._segmenter.config(self._frame_gap, self._bps, self._byte_time)
+		# キャラクタ間タイムアウト(ns)
+		self._recv_timeout = 0
+		if self._recv_timeout_chars is not None:
+			self._recv_timeout = int(self._byte_time * self._recv_timeout_chars)
 
 		if not DEBUG:
 			# シリアルポートオープン
@@ -165,17 +493,24 @@ class serial_manager:
 					return
 			# 念のためシリアル通信受信バッファを空にする
 			self._serial.reset_input_buffer()
+			# 受信待ちの起床はcancel_read()で行う
+			self._serial_timeout = self._serial.timeout
+			thread.messenger.set_serial_wakeup(self._serial.cancel_read)
+			# 送信スレッド開始
+			self._tx.start(self._serial, self._byte_time)
 		else:
 			self._debug_serial_read_init()
+			thread.messenger.set_serial_wakeup(self._debug_wakeup.set)
+			self._tx.start(None, self._byte_time)
 		try:
 			# listening
 			while not thread.messenger.has_exit_serial():
-				if not DEBUG:
-					# シリアル通信バッファチェック
-					recv = self._serial.read(1)
-				else:
-					recv = self._debug_serial_read(1)
-					#recv = b''
+				# 送信スレッドが異常終了していたら切断する
+				self._tx.check()
+				# 受信待ちに入る前に管理スレッドへの通知を公開する
+				thread.messenger.flush_notify_serial2hdrl()
+				# シリアル通信バッファチェック
+				recv = self._serial_read()
 				# 現在時間取得
 				self._timestamp = time.perf_counter_ns()
 				# データを受信した場合
@@ -183,26 +518,20 @@ class serial_manager:
 					# 受信時の現在時間取得
 					self._timestamp_rx = self._timestamp
 					# 受信解析実行
-					result = self._autoresp_mng.recv_analyze(recv)
-					# 自動送信実行
-					# 受信解析結果から送信要求があればこの中で実施される
-					as_result = self._autosend_mng.run(0, self._timestamp_rx)
-					# 解析結果処理
-					if result.has_notify():
-						result.set_timestamp(self._timestamp_rx, self._timestamp_rx_prev)
-						thread.messenger.notify_hdlr_recv_analyze(result)
-					if as_result.is_send():
-						# 自動応答送信データが有効なときだけ送信実行
-						thread.messenger.notify_hdlr_send(as_result)
+					self._recv_proc(recv)
 					# 前回受信時間
 					self._timestamp_rx_prev = self._timestamp_rx
 				else:
+					# 受信が途切れたら差し替え待ちの自動応答設定を構築・反映
+					self._autoresp_mng.ruleset_sync()
+					# フレーム間ギャップチェック
+					if self._segmenter.enable():
+						frame = self._segmenter.check(self._timestamp)
+						if frame is not None:
+							thread.messenger.notify_hdlr_rx_frame(frame)
 					# 自動送信実行
-					# 受信解析結果から送信要求があればこの中で実施される
-					as_result = self._autosend_mng.run(0, self._timestamp)
-					if as_result.is_send():
-						# 自動応答送信データが有効なときだけ送信実行
-						thread.messenger.notify_hdlr_send(as_result)
+					# 送信データがあればこの中で送信スレッドに送信要求を積む
+					self._autosend_mng.run(0, self._timestamp)
 				# GUIからの通知チェック
 				if thread.messenger.has_notify_serial():
 					# 前回シリアル受信から一定時間内は受信中とみなし送信を抑制する
@@ -212,14 +541,11 @@ class serial_manager:
 						msg = thread.messenger.get_notify_serial()
 						if msg.notify == thread.ThreadNotify.TX_BYTES:
 							if msg.node is not None:
-								if not DEBUG:
-									# 手動送信
-									self._serial.write(msg.node.data_bytes)
-									self._serial.flush()
-								# 送信実施を通知
+								# 手動送信
+								# 送信実施は送信スレッドから通知する
 								send_result = autosend_result()
 								send_result.set_send(msg.node, self._timestamp_rx_prev)
-								thread.messenger.notify_hdlr_send(send_result)
+								self._tx.push(send_result.data, send_result)
 						if msg.notify == thread.ThreadNotify.AUTORESP_UPDATE:
 							# コールバック関数で更新を実施
 							msg.cb()
@@ -228,6 +554,10 @@ class serial_manager:
 		except:
 			import traceback
 			traceback.print_exc()
+			thread.messenger.set_serial_wakeup(None)
+			self._tx.stop()
+			self._autoresp_mng.anlyz_worker_shutdown()
+			self._autoresp_mng.ruleset_suspend()
 			# 処理を終了することを通知
 			thread.messenger.notify_hdlr_autoresp_disconnected()
 			print("Serial Manager occur exception!")
@@ -237,6 +567,13 @@ class serial_manager:
 		# 本スレッドが稼働しなければ自動送信も動かないので、
 		# とりあえず動作を止めずに終了する。
 		# self._autosend_mng.stop()
+		thread.messenger.set_serial_wakeup(None)
+		# 送信スレッド停止
+		self._tx.stop()
+		# 受信解析(観測のみ)スレッド停止
+		self._autoresp_mng.anlyz_worker_shutdown()
+		# 自動応答設定の構築中断
+		self._autoresp_mng.ruleset_suspend()
 		# シリアル通信切断
 		self.close()
 		# exit通知クリア
@@ -245,6 +582,169 @@ class serial_manager:
 		thread.messenger.notify_hdlr_autoresp_disconnected()
 		print("Exit: connect()")
 
+	def _serial_read(self) -> memoryview:
+		"""
+		受信モードに応じてシリアル受信を実施する
+		CHUNKモードでは受信済みデータを1回のreadですべて取得する。
+		受信待機が有効なときは、次のイベントまで受信待ちでブロックする。
+		受信済みデータがあるときや待機しないときはtimeoutを変更しない(変更はポート再設定になる)。
+		受信データはリングバッファに格納し、その領域のmemoryviewを返す。
+		"""
+		timeout = 0
+		if self._rx_blocking:
+			timeout = self._rx_wait_time()
+		# リングバッファ末尾に1回分の領域が無ければ先頭に戻る
+		if self._rx_buf_size - self._rx_buf_pos < self._rx_chunk_max:
+			self._rx_buf_pos = 0
+		pos = self._rx_buf_pos
+		buf = self._rx_buf_view
+		if DEBUG:
+			recv = self._debug_serial_read_wait(timeout)
+			size = len(recv)
+			buf[pos:pos+size] = recv
+		elif self._rx_mode == RxMode.CHUNK:
+			size = self._serial.in_waiting
+			if size > 0:
+				# 受信済みの分だけ読むのでtimeoutに関係なく待機しない(timeoutは変更しない)
+				size = self._serial.readinto(buf[pos:pos+min(size, self._rx_chunk_max)])
+			elif timeout > 0:
+				# 先頭1バイトを待機し、以降は受信済みデータを一括取得
+				self._serial_set_timeout(timeout)
+				size = self._serial.readinto(buf[pos:pos+1])
+				if size > 0:
+					remain = min(self._serial.in_waiting, self._rx_chunk_max - 1)
+					if remain > 0:
+						size += self._serial.readinto(buf[pos+1:pos+1+remain])
+		else:
+			size = 0
+			if self._serial.in_waiting > 0:
+				size = self._serial.readinto(buf[pos:pos+1])
+			elif timeout > 0:
+				self._serial_set_timeout(timeout)
+				size = self._serial.readinto(buf[pos:pos+1])
+		self._rx_buf_pos += size
+		return buf[pos:pos+size]
+
+	def _serial_set_timeout(self, timeout: float) -> None:
+		"""
+		シリアルポートのtimeoutを設定する
+		設定変更はポート再設定が発生するので、必要なときだけ実施する。
+		- 設定中のtimeoutが要求より長い: 次のイベントに遅れるので再設定する
+		- 設定中のtimeoutが要求より少しだけ短い: 少し早く起床するだけなので再設定しない
+		受信待ちの間は期限までの時間が毎回少しずつ短くなるので、変化のたびには再設定しない。
+		"""
+		current = self._serial_timeout
+		if current is None or not (timeout * (1 - self._serial_timeout_early) <= current <= timeout):
+			self._serial.timeout = timeout
+			self._serial_timeout = timeout
+
+	def _rx_wait_time(self) -> float:
+		"""
+		次に処理が必要なイベントまでの時間(sec)を返す
+		- 自動送信の次回処理時間
+		- 手動送信(GUI通知)の送信抑制時間
+		- 受信中フレームのフレーム間ギャップ経過
+		自動応答設定の構築中は受信の合間に構築を進めるので待機しない。
+		timeoutは切り上げずにそのまま渡す。起床の遅れは応答遅延タイマのspinで吸収する。
+		"""
+		if self._autoresp_mng.ruleset_busy():
+			return 0
+		now = time.perf_counter_ns()
+		deadline = now + self._rx_wait_max
+		# 自動送信
+		as_deadline = self._autosend_mng.next_deadline()
+		if as_deadline is not None and as_deadline < deadline:
+			deadline = as_deadline
+		# 受信フレーム確定
+		frame_deadline = self._segmenter.deadline()
+		if frame_deadline is not None and frame_deadline < deadline:
+			deadline = frame_deadline
+		# GUIからの通知
+		if thread.messenger.has_notify_serial():
+			tx_deadline = self._timestamp_rx_prev + self._send_tx_delay
+			if tx_deadline < deadline:
+				deadline = tx_deadline
+		if deadline <= now:
+			return 0
+		return (deadline - now) / (1000 * 1000 * 1000)
+
+	def _recv_proc(self, recv: memoryview) -> None:
+		"""
+		受信データ処理
+		受信データをまとめて処理する。
+		受信解析は一括で実施し、イベント単位の解析結果ごとに通知する。
+		自動応答が発生したときはその場で自動送信を実行する。
+		自動送信の時間経過処理はデータ末尾で1回だけ実施する。
+		各バイトの受信時間はボーレートから復元する。
+		"""
+		timestamp_chunk = self._timestamp_rx
+		timestamp_rx_prev = self._timestamp_rx_prev
+		timestamp_begin = self._recv_timestamp_begin(len(recv), timestamp_chunk, timestamp_rx_prev)
+		# キャラクタ間タイムアウト
+		# 一括受信したデータ内のバイト間は途切れていないので、先頭バイトだけチェックすればよい
+		if self._recv_timeout > 0 and timestamp_rx_prev != 0 and (timestamp_begin - timestamp_rx_prev) >= self._recv_timeout:
+			self._autoresp_mng.recv_analyze_timeout()
+		# フレーム分割
+		if self._segmenter.enable():
+			frame = self._segmenter.push(recv, timestamp_begin, timestamp_chunk)
+			if frame is not None:
+				thread.messenger.notify_hdlr_rx_frame(frame)
+
+		def timestamp_of(pos: int) -> int:
+			# posバイト目の受信時間
+			# 負値は前回までの受信データで、前回受信の末尾バイトから1バイト送受信時間ずつ遡る
+			if pos < 0:
+				return timestamp_rx_prev + (pos + 1) * self._byte_time
+			return min(timestamp_begin + pos * self._byte_time, timestamp_chunk)
+
+		def notify(result: analyze_result) -> None:
+			# 解析結果末尾バイトの受信時間
+			end = result.offset + len(result.data) - 1
+			timestamp = timestamp_of(end)
+			self._timestamp_rx = timestamp
+			if result.buff_commit() and result.frame_len > 1:
+				# フレームより前のデータの受信時間(フレーム先頭の直前)
+				result.set_timestamp(timestamp, timestamp_of(end - result.frame_len))
+			else:
+				result.set_timestamp(timestamp, timestamp_of(result.offset - 1))
+			# dataはリングバッファを参照しているので、キューに積む前にコピーする
+			# (管理スレッドが読み出す前にリングバッファが一周して上書きされうる)
+			result.data = bytes(result.data)
+			thread.messenger.notify_hdlr_recv_analyze(result)
+			if result.trans_req():
+				# 自動応答発生時は即時に自動送信実行
+				self._recv_proc_autosend()
+
+		# 受信解析実行
+		self._autoresp_mng.recv_analyze_chunk(recv, notify)
+		# 最大フレーム長で区切るときは、今回受信データの後ろを区切りとする
+		if self._segmenter.enable():
+			frame = self._segmenter.check_overflow()
+			if frame is not None:
+				thread.messenger.notify_hdlr_rx_frame(frame)
+		# 末尾バイトの受信時間
+		self._timestamp_rx = timestamp_of(len(recv) - 1)
+		# 自動送信実行
+		# 受信解析結果から送信要求があればこの中で実施される
+		self._recv_proc_autosend()
+
+	def _recv_timestamp_begin(self, size: int, timestamp_chunk: int, timestamp_rx_prev: int) -> int:
+		"""
+		一括受信したデータの先頭バイトの受信時間を復元する
+		末尾バイトをread完了時間に受信したとみなし、1バイト送受信時間ずつ遡る。
+		ただし前回受信の末尾バイトより前にはならない。
+		"""
+		timestamp = timestamp_chunk - (size - 1) * self._byte_time
+		if timestamp_rx_prev != 0:
+			timestamp_min = timestamp_rx_prev + self._byte_time
+			if timestamp < timestamp_min:
+				timestamp = min(timestamp_min, timestamp_chunk)
+		return timestamp
+
+	def _recv_proc_autosend(self) -> None:
+		# 送信データがあればこの中で送信スレッドに送信要求を積む
+		self._autosend_mng.run(0, self._timestamp_rx)
+
 	def _debug_serial_read_init(self) -> None:
 		self._debug_data_list = [
 			bytes.fromhex("00AA0101"),
@@ -276,6 +776,31 @@ class serial_manager:
 		# timestamp
 		self._debug_timestamp = 0
 		self._debug_timestamp_prev = 0
+		# 受信待ち起床用
+		self._debug_wakeup = threading.Event()
+
+	def _debug_serial_read_wait(self, timeout: float) -> bytes:
+		"""
+		疑似受信データの次回受信まで待機してから疑似受信を実施する
+		"""
+		if timeout > 0:
+			wait = self._debug_serial_next()
+			if wait > 0:
+				self._debug_wakeup.wait(min(timeout, wait / (1000 * 1000 * 1000)))
+				self._debug_wakeup.clear()
+		if self._rx_mode == RxMode.CHUNK:
+			return self._debug_serial_read(self._rx_chunk_max)
+		else:
+			return self._debug_serial_read(1)
+
+	def _debug_serial_next(self) -> int:
+		"""
+		次の疑似受信データまでの時間(ns)を返す
+		"""
+		if self._debug_data_type is int:
+			return (self._debug_wait_begin + self._debug_data) - time.perf_counter_ns()
+		# bytesのときは受信中
+		return 0
 
 	def _debug_serial_read(self, size:int) -> bytes:
 		# timestamp
@@ -289,9 +814,11 @@ class serial_manager:
 			# 受信ディレイ待機
 			if timestamp_diff > self._debug_bytes_delay:
 				# 受信データ作成
-				result = self._debug_data[self._debug_bytes_pos].to_bytes(1, 'little')
+				# 経過時間分のデータを受信したとみなす(最大size)
+				count = min(size, timestamp_diff // self._debug_bytes_delay, len(self._debug_data) - self._debug_bytes_pos)
+				result = self._debug_data[self._debug_bytes_pos:self._debug_bytes_pos+count]
 				# 受信データ数チェック
-				self._debug_bytes_pos += 1
+				self._debug_bytes_pos += count
 				if self._debug_bytes_pos >= len(self._debug_data):
 					self._debug_bytes_pos = 0
 					self._debug_serial_update_data()
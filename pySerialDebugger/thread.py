@@ -1,6 +1,9 @@
 import enum
 import queue
-from typing import Callable
+import collections
+import threading
+import time
+from typing import Callable, List
 from . import autoresp
 from pySerialDebugger.autosend import autosend_result
 from pySerialDebugger.send_node import send_data_node
@@ -11,11 +14,14 @@ class ThreadNotify(enum.Enum):
 	"""
 	# GUIへの通知
 	RECV_ANALYZE = enum.auto()				# 受信解析結果通知
+	RX_FRAME = enum.auto()					# 受信フレーム(フレーム間ギャップで区切り)通知
 	COMMIT_RX = enum.auto()					# 受信バッファ出力
 	PUSH_RX = enum.auto()					# 受信データをバッファに追加
 	COMMIT_TX = enum.auto()					# 自動応答データを出力
 	DISCONNECTED = enum.auto()				# シリアル切断
 	AUTORESP_UPDATE_FIN = enum.auto()		# 自動応答データ更新完了
+	# 管理スレッドへの通知
+	EXIT_HDLR = enum.auto()					# 管理スレッド終了
 	# Serialへの通知
 	TX_BYTES = enum.auto()					# シリアル送信(手動)
 	AUTORESP_UPDATE = enum.auto()			# 自動応答データ更新
@@ -26,7 +32,9 @@ class ThreadNotify(enum.Enum):
 class serial_msg:
 	"""
 	シリアル通信スレッドが作成するメッセージ
+	受信1バイトごとに作成されるので__slots__で省メモリ化する。
 	"""
+	__slots__ = ("notify", "id", "data", "timestamp", "result", "results", "as_result", "frame")
 
 	def __init__(self) -> None:
 		self.notify: ThreadNotify = None
@@ -34,7 +42,11 @@ class serial_msg:
 		self.data: bytes = None
 		self.timestamp: int = None
 		self.result: autoresp.analyze_result = None
+		# COALESCEでまとめた受信解析結果(resultは末尾の解析結果)
+		self.results: List[autoresp.analyze_result] = None
 		self.as_result: autosend_result = None
+		# serial_mng.rx_frame
+		self.frame = None
 
 	def autoresp_updated(self):
 		self.notify = ThreadNotify.AUTORESP_UPDATE_FIN
@@ -53,18 +65,32 @@ class serial_msg:
 		self.notify = ThreadNotify.RECV_ANALYZE
 		self.result = result
 
+	def analyze_results(self) -> List[autoresp.analyze_result]:
+		"""
+		受信解析結果を受信順に取得する
+		COALESCEでまとめたメッセージは複数の解析結果を持つ
+		"""
+		if self.results is None:
+			return (self.result,)
+		return self.results
+
+	def rx_frame(self, frame):
+		self.notify = ThreadNotify.RX_FRAME
+		self.frame = frame
+
 
 class gui_msg:
 	"""
 	メインスレッドが作成するメッセージ
 	"""
+	__slots__ = ("notify", "cb", "id", "data", "node")
 
 	def __init__(self) -> None:
 		self.notify: ThreadNotify = None
 		self.cb: Callable[[None], None] = None
 		self.id: str = None
 		self.data: bytes = None
-		node: send_data_node = None
+		self.node: send_data_node = None
 
 	def autoresp_update(self, cb):
 		self.notify = ThreadNotify.AUTORESP_UPDATE
@@ -74,6 +100,69 @@ class gui_msg:
 		self.notify = ThreadNotify.TX_BYTES
 		self.node = node
 
+	def exit_hdlr(self):
+		self.notify = ThreadNotify.EXIT_HDLR
+
+
+def serial_msg_droppable(msg: serial_msg) -> bool:
+	"""
+	DROP_OLDESTで破棄してよいシリアル通信スレッドのメッセージ
+	受信データ以外の通知は破棄しない
+	"""
+	return msg.notify == ThreadNotify.RECV_ANALYZE or msg.notify == ThreadNotify.RX_FRAME
+
+
+def serial_msg_coalesce(pending: serial_msg, msg: serial_msg) -> serial_msg:
+	"""
+	COALESCE: 受信解析結果メッセージをまとめる
+	続く受信解析結果を1メッセージに集める。
+	ログバッファへの追加だけを要求する解析結果が続くときは、受信データを連結して1つの解析結果にする。
+	@return まとめたメッセージ、まとめられないときNone
+	"""
+	if pending.notify != ThreadNotify.RECV_ANALYZE or msg.notify != ThreadNotify.RECV_ANALYZE:
+		return None
+	if pending.results is None:
+		pending.results = [pending.result]
+	tail = msg.result
+	if analyze_result_concat(pending.result, tail):
+		pending.results[-1] = tail
+	else:
+		pending.results.append(tail)
+	pending.result = tail
+	return pending
+
+
+def analyze_result_concat(head: autoresp.analyze_result, tail: autoresp.analyze_result) -> bool:
+	"""
+	ログバッファへの追加だけを要求する解析結果の後ろに、続く解析結果の受信データを連結する
+	連結後の解析結果(tail)は後ろの解析結果(コミット要求、自動応答ID)を引き継ぐ。
+	@return 連結したときTrue
+	"""
+	if head.buff_commit() or tail.prev_buff_commit():
+		return False
+	# 直前バッファのコミットとフレーム前データの出力は受信時間が異なるのでまとめない
+	if head.prev_buff_commit() and tail.buff_commit():
+		return False
+	if not head.new_data_push() or not tail.new_data_push():
+		return False
+	# 先頭の解析結果のデータをbytearrayにして連結する
+	if not isinstance(head.data, bytearray):
+		head.data = bytearray(head.data)
+	head.data += tail.data
+	tail.data = head.data
+	if head.prev_buff_commit():
+		tail._rx_buf_commit_prev = True
+		tail._timestamp_rx_prev = head._timestamp_rx_prev
+	return True
+
+
+def gui_msg_droppable(msg: gui_msg) -> bool:
+	"""
+	DROP_OLDESTで破棄してよいGUIのメッセージ
+	手動送信要求だけ破棄してよい
+	"""
+	return msg.notify == ThreadNotify.TX_BYTES
+
 
 class hdlr_msg:
 	"""
@@ -85,57 +174,336 @@ class hdlr_msg:
 
 
 
+class QueuePolicy(enum.Enum):
+	"""
+	キュー容量超過時のポリシー
+	"""
+	BLOCK = enum.auto()						# 空きができるまで送信側が待機する
+	DROP_OLDEST = enum.auto()				# 最も古い破棄可能メッセージを捨てて追加する
+	DROP_NEWEST = enum.auto()				# 追加しようとしたメッセージを捨てる
+	COALESCE = enum.auto()					# 受信データを1メッセージにまとめる(まとめられないものはDROP_NEWEST)
+
+
+class queue_stats:
+	"""
+	キュー統計情報
+	"""
+
+	def __init__(self, name: str, policy: QueuePolicy, capacity: int) -> None:
+		self.name = name
+		self.policy = policy
+		self.capacity = capacity
+		# 現在メッセージ数
+		self.size: int = 0
+		# 最大メッセージ数(ハイウォーターマーク)
+		self.high_water: int = 0
+		# 破棄したメッセージ数
+		self.dropped: int = 0
+		# まとめたメッセージ数
+		self.coalesced: int = 0
+		# 空き待ちで待機した回数
+		self.blocked: int = 0
+
+	def __str__(self) -> str:
+		return "{0}[{1}]: {2}/{3} hw={4} drop={5} coal={6} blk={7}".format(
+			self.name, self.policy.name, self.size, self.capacity, self.high_water, self.dropped, self.coalesced, self.blocked
+		)
+
+
+class batch_queue:
+	"""
+	バッチ転送キュー
+	送信側はメッセージを追加し、N件ごと、またはT時間ごとに受信側へ公開(起床通知)する。
+	受信側は公開されたメッセージをまとめて取り出す。
+	排他は2つのロックで行う。両方取るときは_lock -> _count_lockの順に取る。
+	- _count_lock: 末尾への追加(容量チェック込み)、未公開メッセージ数、統計情報
+	  制御メッセージを追加する他スレッドとも共有する。
+	- _lock: 先頭からの取り出し(get/get_batch)と、DROP_OLDESTでのキュー途中の削除
+	  インデックスでの削除は途中でpopleftされると別のメッセージを消すので、取り出しと排他する。
+	容量を超えたときの動作はpolicyで選択する。
+	"""
+
+	def __init__(self, capacity: int, batch_size: int, batch_time: int, policy: QueuePolicy = QueuePolicy.DROP_NEWEST, name: str = "") -> None:
+		self._queue = collections.deque()
+		self._event = threading.Event()
+		# 受信側が取り出したときに送信側を起床させる(BLOCK用)
+		self._space = threading.Event()
+		# DROP_OLDESTで送信側が先頭を操作するときの排他
+		self._lock = threading.Lock()
+		# 未公開メッセージ数、統計情報の排他
+		self._count_lock = threading.Lock()
+		self.name = name
+		# 最大メッセージ数
+		self.capacity = capacity
+		# 公開単位: メッセージ数
+		self.batch_size = batch_size
+		# 公開単位: 時間(ns)
+		self.batch_time = batch_time
+		# 容量超過時ポリシー
+		self.policy = policy
+		# DROP_OLDESTで破棄してよいメッセージの判定
+		self.droppable: Callable[[object], bool] = None
+		# COALESCEでメッセージをまとめる処理: (まとめ先, 追加メッセージ) -> まとめたメッセージ or None
+		self.coalesce: Callable[[object, object], object] = None
+		# COALESCE: 容量超過中にまとめているメッセージ(送信側のみが触る)
+		self._pending = None
+		# 未公開メッセージ数
+		self._unpublished: int = 0
+		self._timestamp_publish: int = 0
+		# 統計情報
+		self.high_water: int = 0
+		# 容量超過で破棄したメッセージ数
+		self.overflow: int = 0
+		self.coalesced: int = 0
+		self.blocked: int = 0
+
+	def put(self, msg, droppable: bool = True) -> bool:
+		"""
+		メッセージ追加
+		@param droppable Falseのときは容量を超えても追加して即時公開する(制御メッセージ用)
+		"""
+		if not droppable:
+			# 制御メッセージは他スレッドからも追加されるので、送信側が持つまとめ中メッセージには触らない
+			self._append(msg)
+			self.publish()
+			return True
+		if self._pending is not None:
+			# まとめ中のメッセージがあれば順序を守るため先に処理する
+			pending = self.coalesce(self._pending, msg)
+			if pending is not None:
+				self._pending = pending
+				with self._count_lock:
+					self.coalesced += 1
+				self._flush_pending(False)
+				return True
+			if not self._flush_pending(False):
+				self._drop()
+				return False
+		if not self._append(msg, True):
+			if not self._overflow(msg):
+				return False
+		if self._unpublished >= self.batch_size:
+			self.publish()
+		elif time.perf_counter_ns() - self._timestamp_publish >= self.batch_time:
+			self.publish()
+		return True
+
+	def put_shared(self, msg) -> bool:
+		"""
+		他の送信側スレッドからのメッセージ追加
+		送信側が持つまとめ中メッセージには触らず、容量を超えていれば破棄する。追加したら即時公開する。
+		"""
+		if not self._append(msg, True):
+			self._drop()
+			return False
+		self.publish()
+		return True
+
+	def _drop(self) -> None:
+		# 破棄数は複数の送信側スレッドから更新される
+		with self._count_lock:
+			self.overflow += 1
+
+	def _append(self, msg, limit: bool = False) -> bool:
+		"""
+		メッセージをキュー末尾に追加する
+		@param limit Trueのときは容量を超えるなら追加しない(容量チェックと追加は他の送信側スレッドと排他する)
+		@return 追加したときTrue
+		"""
+		queue = self._queue
+		with self._count_lock:
+			if limit and len(queue) >= self.capacity:
+				return False
+			queue.append(msg)
+			self._unpublished += 1
+			if len(queue) > self.high_water:
+				self.high_water = len(queue)
+		return True
+
+	def _overflow(self, msg) -> bool:
+		"""
+		容量超過時の処理
+		@return メッセージを追加した(まとめた)ときTrue
+		"""
+		policy = self.policy
+		if policy == QueuePolicy.BLOCK:
+			# 受信側が取り出すまで待機
+			with self._count_lock:
+				self.blocked += 1
+			while len(self._queue) >= self.capacity:
+				self._space.clear()
+				self.publish()
+				if len(self._queue) < self.capacity:
+					break
+				self._space.wait(0.01)
+			self._append(msg)
+			return True
+		if policy == QueuePolicy.DROP_OLDEST:
+			# 受信側と先頭を取り合わないようにロックして、最も古い破棄可能メッセージを捨てる
+			# 他の送信側スレッドが末尾に追加することはあるので、イテレータは使わずインデックスで走査する
+			with self._lock:
+				queue = self._queue
+				for i in range(len(queue)):
+					if self.droppable is None or self.droppable(queue[i]):
+						del queue[i]
+						self._drop()
+						self._append(msg)
+						return True
+		if policy == QueuePolicy.COALESCE and self.coalesce is not None:
+			# 送信側でまとめて保持し、空きができたら追加する
+			self._pending = msg
+			return True
+		self._drop()
+		return False
+
+	def _flush_pending(self, force: bool) -> bool:
+		"""
+		まとめ中のメッセージをキューに追加する
+		@param force Trueのときは容量を超えても追加する
+		@return まとめ中のメッセージが無くなったときTrue
+		"""
+		if self._pending is None:
+			return True
+		if self._append(self._pending, not force):
+			self._pending = None
+			return True
+		return False
+
+	def flush(self, force: bool = False) -> None:
+		"""
+		まとめ中のメッセージも含めて受信側に公開する
+		まとめ中のメッセージは空きがあるときだけ追加し、空きが無ければ次回のflush/putまで保持する。
+		送信側スレッドから実施する
+		@param force Trueのときは容量を超えてもまとめ中のメッセージを追加する(切断時など最後の公開用)
+		"""
+		self._flush_pending(force)
+		self.publish()
+
+	def publish(self) -> None:
+		"""
+		未公開メッセージを受信側に公開する
+		"""
+		with self._count_lock:
+			if self._unpublished == 0:
+				return
+			self._unpublished = 0
+			self._timestamp_publish = time.perf_counter_ns()
+		self._event.set()
+
+	def wait(self, timeout: float) -> bool:
+		"""
+		メッセージが公開されるまで待機する
+		"""
+		result = self._event.wait(timeout)
+		self._event.clear()
+		return result
+
+	def get_batch(self) -> List:
+		"""
+		キュー内のメッセージをすべて取り出す
+		"""
+		batch = []
+		queue = self._queue
+		with self._lock:
+			while queue:
+				batch.append(queue.popleft())
+		self._space.set()
+		return batch
+
+	def get(self):
+		with self._lock:
+			msg = self._queue.popleft()
+		self._space.set()
+		return msg
+
+	def empty(self) -> bool:
+		return not self._queue
+
+	def full(self) -> bool:
+		return len(self._queue) >= self.capacity
+
+	def clear(self) -> None:
+		with self._lock, self._count_lock:
+			self._queue.clear()
+			self._pending = None
+			self._unpublished = 0
+		self._space.set()
+
+	def stats(self) -> queue_stats:
+		result = queue_stats(self.name, self.policy, self.capacity)
+		result.size = len(self._queue)
+		result.high_water = self.high_water
+		result.dropped = self.overflow
+		result.coalesced = self.coalesced
+		result.blocked = self.blocked
+		return result
+
+
 class msg_manager:
 	def __init__(self) -> None:
 		# メッセージ通知用キュー
 		### from シリアル通信スレッド
 		# 処理通知
-		self.q_serial2hdlr_msg = queue.Queue(10)
+		# 受信データごとにメッセージが発生するのでバッチ転送する
+		# シリアル通信スレッドはGUI側の処理を待たないようにBLOCKは選択不可
+		self.q_serial2hdlr_msg = batch_queue(4096, 64, 1 * 1000 * 1000, QueuePolicy.COALESCE, "serial2hdlr")
+		self.q_serial2hdlr_msg.droppable = serial_msg_droppable
+		self.q_serial2hdlr_msg.coalesce = serial_msg_coalesce
 		### from 管理スレッド
 		# 処理通知
 		# None
 		### from メインスレッド(GUI)
 		# 終了通知
 		self.q_gui2serial_exit = queue.Queue(10)
-		self.q_gui2hdlr_exit = queue.Queue(10)
 		# 処理通知
-		self.q_gui2serial_msg = queue.Queue(10)
+		# シリアル通信スレッドは受信処理の合間に取り出すのでバッチ化しない
+		self.q_gui2serial_msg = batch_queue(16, 1, 0, QueuePolicy.BLOCK, "gui2serial")
+		self.q_gui2serial_msg.droppable = gui_msg_droppable
 		self.q_gui2hdlr_msg = queue.Queue(10)
 		# なし
+		### シリアル通信スレッド起床用コールバック
+		# シリアル通信スレッドは受信待ちでブロックするため、通知時に起床させる
+		self._serial_wakeup_cb: Callable[[], None] = None
+
+	"""
+	シリアル通信スレッド起床
+	"""
+	def set_serial_wakeup(self, cb: Callable[[], None]):
+		self._serial_wakeup_cb = cb
+
+	def wakeup_serial(self):
+		cb = self._serial_wakeup_cb
+		if cb is not None:
+			cb()
 
 	"""
 	Exit通知
 	"""
 	def notify_exit_serial(self):
 		self.q_gui2serial_exit.put(True)
+		self.wakeup_serial()
 
 	def notify_exit_hdlr(self):
-		self.q_gui2hdlr_exit.put(True)
+		# 管理スレッドはメッセージ待ちでブロックしているので、同じキューで通知する
+		new_msg = gui_msg()
+		new_msg.exit_hdlr()
+		self.q_serial2hdlr_msg.put(new_msg, droppable=False)
 
 	def has_exit_serial(self):
 		return not self.q_gui2serial_exit.empty()
 
-	def has_exit_hdlr(self):
-		return not self.q_gui2hdlr_exit.empty()
-
 	def clear_exit_serial(self):
 		# queueを空にしておく
 		while not self.q_gui2serial_exit.empty():
 			self.q_gui2serial_exit.get_nowait()
 
-	def clear_exit_hdlr(self):
-		# queueを空にしておく
-		while not self.q_gui2hdlr_exit.empty():
-			self.q_gui2hdlr_exit.get_nowait()
-
 	"""
 	シリアル通信スレッドへ通知
 	"""
 
 	def clear_notify_serial(self):
 		# queueを空にしておく
-		while not self.q_gui2serial_msg.empty():
-			self.q_gui2serial_msg.get_nowait()
+		self.q_gui2serial_msg.clear()
 
 	def is_full_notify_serial(self):
 		return self.q_gui2serial_msg.full()
@@ -144,7 +512,7 @@ class msg_manager:
 		return not self.q_gui2serial_msg.empty()
 
 	def get_notify_serial(self) -> gui_msg:
-		return self.q_gui2serial_msg.get_nowait()
+		return self.q_gui2serial_msg.get()
 
 	def notify_serial_autoresp_update(self, cb:Callable[[None], None]):
 		"""
@@ -155,29 +523,82 @@ class msg_manager:
 		new_msg = gui_msg()
 		new_msg.autoresp_update(cb)
 		# メッセージ送信
-		self.q_gui2serial_msg.put(new_msg, block=True, timeout=None)
+		self.q_gui2serial_msg.put(new_msg)
+		self.wakeup_serial()
 
 	def notify_serial_send(self, node: send_data_node):
 		# メッセージ作成
 		new_msg = gui_msg()
 		new_msg.send(node)
 		# メッセージ送信
-		self.q_gui2serial_msg.put(new_msg, block=True, timeout=None)
+		self.q_gui2serial_msg.put(new_msg)
+		self.wakeup_serial()
 
 	"""
 	管理制御スレッドへ通知
 	"""
 
+	"""
+	キュー設定
+	"""
+	def queues(self) -> List[batch_queue]:
+		return [self.q_serial2hdlr_msg, self.q_gui2serial_msg]
+
+	def config_queue(self, name: str, policy: QueuePolicy = None, capacity: int = None):
+		"""
+		キューの容量超過時ポリシー/容量を設定する
+		@param name キュー名: "serial2hdlr", "gui2serial"
+		"""
+		for q in self.queues():
+			if q.name == name:
+				if policy is not None:
+					if q is self.q_serial2hdlr_msg and policy == QueuePolicy.BLOCK:
+						raise ValueError("serial2hdlr: BLOCK policy is not allowed, serial thread must not wait for GUI.")
+					q.policy = policy
+				if capacity is not None:
+					q.capacity = capacity
+				return
+		raise ValueError("unknown queue: " + name)
+
+	def queue_stats(self) -> List[queue_stats]:
+		return [q.stats() for q in self.queues()]
+
 	def clear_notify_serial2hdrl(self):
 		# queueを空にしておく
-		while not self.q_serial2hdlr_msg.empty():
-			self.q_serial2hdlr_msg.get_nowait()
+		self.q_serial2hdlr_msg.clear()
+
+	def config_notify_serial2hdrl(self, capacity: int, batch_size: int, batch_time_us: int):
+		"""
+		バッチ転送設定
+		@param capacity 最大メッセージ数
+		@param batch_size 公開単位: メッセージ数
+		@param batch_time_us 公開単位: 時間(マイクロ秒)
+		"""
+		self.q_serial2hdlr_msg.capacity = capacity
+		self.q_serial2hdlr_msg.batch_size = batch_size
+		self.q_serial2hdlr_msg.batch_time = batch_time_us * 1000
 
 	def has_notify_serial2hdrl(self):
 		return not self.q_serial2hdlr_msg.empty()
 
 	def get_notify_serial2hdrl(self) -> serial_msg:
-		return self.q_serial2hdlr_msg.get_nowait()
+		return self.q_serial2hdlr_msg.get()
+
+	def get_notify_serial2hdrl_batch(self) -> List[serial_msg]:
+		return self.q_serial2hdlr_msg.get_batch()
+
+	def wait_notify_serial2hdrl(self, timeout: float) -> bool:
+		return self.q_serial2hdlr_msg.wait(timeout)
+
+	def flush_notify_serial2hdrl(self):
+		"""
+		未公開のメッセージを管理スレッドに公開する
+		シリアル通信スレッドは受信待ちに入る前に実施する
+		"""
+		self.q_serial2hdlr_msg.flush()
+
+	def overflow_notify_serial2hdrl(self) -> int:
+		return self.q_serial2hdlr_msg.overflow
 
 
 	def notify_hdlr_autoresp_updated(self):
@@ -185,28 +606,39 @@ class msg_manager:
 		new_msg = serial_msg()
 		new_msg.autoresp_updated()
 		# メッセージ送信
-		self.q_serial2hdlr_msg.put(new_msg, block=True, timeout=None)
+		self.q_serial2hdlr_msg.put(new_msg, droppable=False)
 
 	def notify_hdlr_autoresp_disconnected(self):
 		# メッセージ作成
 		new_msg = serial_msg()
 		new_msg.autoresp_disconnected()
 		# メッセージ送信
-		self.q_serial2hdlr_msg.put(new_msg, block=True, timeout=None)
+		# 切断前の受信データを先に渡す
+		self.q_serial2hdlr_msg.flush(True)
+		self.q_serial2hdlr_msg.put(new_msg, droppable=False)
 
 	def notify_hdlr_send(self, result:autosend_result):
 		# メッセージ作成
 		new_msg = serial_msg()
 		new_msg.send(result)
 		# メッセージ送信
-		self.q_serial2hdlr_msg.put(new_msg, block=True, timeout=None)
+		# 送信スレッドから通知されるので即時公開する
+		# 送信ログなので容量を超えたら破棄する
+		self.q_serial2hdlr_msg.put_shared(new_msg)
 
 	def notify_hdlr_recv_analyze(self, result: autoresp.analyze_result):
 		# メッセージ作成
 		new_msg = serial_msg()
 		new_msg.recv_analyze(result)
 		# メッセージ送信
-		self.q_serial2hdlr_msg.put(new_msg, block=True, timeout=None)
+		self.q_serial2hdlr_msg.put(new_msg)
+
+	def notify_hdlr_rx_frame(self, frame):
+		# メッセージ作成
+		new_msg = serial_msg()
+		new_msg.rx_frame(frame)
+		# メッセージ送信
+		self.q_serial2hdlr_msg.put(new_msg)
 
 
 messenger = msg_manager()
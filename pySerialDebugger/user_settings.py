@@ -1,7 +1,8 @@
 
-from .autoresp import autoresp_data, recvdata_adapter
+from .autoresp import autoresp_data, autoresp_opt, autoresp_select, autoresp_echo, recvdata_adapter
 from .send_node import send_data
 from .autosend import autosend_data
+from .thread import QueuePolicy
 
 def hex2bytes(hex: str) -> bytes:
 	return bytes.fromhex(hex)
@@ -56,7 +57,7 @@ def autosend_settings() -> None:
 	※処理負荷軽減のために有効にできるのは1つの設定のみ。
 	"""
 	send = autosend_data.send		# 手動送信で設定した送信データ(名称で指定)を送信する
-	wait = autosend_data.wait_ms	# 指定時間だけwaitする(※100ms前後くらい処理時間ありそう。)
+	wait = autosend_data.wait_ms	# 指定時間だけwaitする(※100ms前後くらい処理時間ありそう。受信から応答までの遅延は自動応答設定のopt(delay_us=)を使う)
 	exit = autosend_data.exit		# 自動送信を終了する
 	jump = autosend_data.jump		# autosendリスト内の指定idx(0開始)にジャンプする
 
@@ -80,6 +81,23 @@ def autosend_settings() -> None:
 	return (caption, head, data)
 
 
+def queue_settings():
+	"""
+	スレッド間キュー設定
+	キューが一杯になったときの動作をキューごとに選択する。
+	  BLOCK       : 空きができるまで待つ(serial2hdlrには設定不可)
+	  DROP_OLDEST : 古い受信データ/送信要求を捨てる
+	  DROP_NEWEST : 新しいメッセージを捨てる
+	  COALESCE    : 受信データを1メッセージにまとめる
+	"""
+	data = [
+		# キュー名			# ポリシー					# 容量
+		[	"serial2hdlr",	QueuePolicy.COALESCE,		4096,	],
+		[	"gui2serial",	QueuePolicy.BLOCK,			16,		],
+	]
+	return data
+
+
 class test_data_buff:
 	def __init__(self) -> None:
 		self.B_data = 0
@@ -136,6 +154,20 @@ def auto_response_settings():
 	"""
 	hex = autoresp_data.byte
 	any = autoresp_data.any		# 現状1バイト固定
+	length = autoresp_data.length	# 長さフィールド: length(バイト数, エンディアン, オフセット, 倍率)
+	mask = autoresp_data.mask		# マスク付き固定値: mask(マスク, 値)
+	byte_range = autoresp_data.byte_range	# 範囲指定: byte_range(最小値, 最大値)
+	fcc = autoresp_data.fcc_2compl	# FCCチェック: fcc(計算開始位置)
+	fcc_nml = autoresp_data.fcc_sum
+	fcc_1compl = autoresp_data.fcc_1compl
+	# オプション(省略可): 受信解析:データが自動応答に影響しなければobserve()で別スレッドで実施する
+	observe = autoresp_opt.observe
+	# 応答データ名の代わりに指定すると、受信値で応答データを選択する: select(位置, {受信値: 応答データ名}, default=応答データ名)
+	select = autoresp_select
+	# オプション(省略可): 受信フレームのフィールドを応答データにコピーする: opt(echo=[echo(送信データ名, コピー先位置, コピー元位置, バイト数)])
+	opt = autoresp_opt
+	echo = autoresp_echo
+	# オプション(省略可): 受信フレーム末尾から指定時間後に応答する: opt(delay_us=遅延時間[us])
 
 	caption = [
 		"[自動応答データ設定]"
@@ -0,0 +1,718 @@
+import gc
+import threading
+import time
+import weakref
+from typing import List
+
+import pytest
+
+from pySerialDebugger.send_node import send_mng
+from pySerialDebugger.autosend import autosend_data, autosend_mng, autosend_result
+from pySerialDebugger import autoresp
+from pySerialDebugger.autoresp import (
+	autoresp_data, autoresp_list, autoresp_mng, autoresp_opt, autoresp_select, autoresp_echo,
+	frame_buffer, MatchMode,
+)
+
+
+hex = autoresp_data.byte
+any = autoresp_data.any
+length = autoresp_data.length
+
+
+def make_mng(data) -> autoresp_mng:
+	s_mng = send_mng([["Resp", bytes.fromhex('00'), -1, None, 0, 0]])
+	as_mng = autosend_mng([[False, "AutoResp", [autosend_data.send("Resp"), autosend_data.exit()]]], s_mng)
+	as_mng.set_cb_btn_activate(lambda row: None)
+	as_mng.set_cb_btn_inactivate(lambda row: None)
+	as_mng.set_send_cb(lambda data, result: None)
+	return autoresp_mng(data, as_mng, s_mng)
+
+
+def make_select_mng(data) -> autoresp_mng:
+	s_mng = send_mng([["Resp", bytes.fromhex('00'), -1, None, 0, 0], ["EchoResp", bytes.fromhex('000000'), -1, 3, 0, 2]])
+	as_mng = autosend_mng([[False, name, [autosend_data.send("Resp"), autosend_data.exit()]] for name in ["A", "B", "C"]], s_mng)
+	as_mng.set_cb_btn_activate(lambda row: None)
+	as_mng.set_cb_btn_inactivate(lambda row: None)
+	as_mng.set_send_cb(lambda data, result: None)
+	return autoresp_mng(data, as_mng, s_mng)
+
+
+def match(mng: autoresp_mng, hex_str: str) -> List[str]:
+	"""
+	受信データを解析してマッチした自動応答設定名を返す
+	"""
+	mng.recv_analyze_init()
+	recv = memoryview(bytes.fromhex(hex_str))
+	result = []
+	for i in range(len(recv)):
+		ar = mng.recv_analyze(recv[i:i+1])
+		if ar.buff_commit():
+			result.append(ar.id)
+	return result
+
+
+def log(mng: autoresp_mng, hex_str: str, chunk: int = 0) -> List[tuple]:
+	"""
+	受信データを解析して、管理スレッドと同じ手順で作成したログを返す
+	chunkを指定したときはchunkバイトずつ一括解析する
+	"""
+	mng.recv_analyze_init()
+	recv = memoryview(bytes.fromhex(hex_str))
+	if chunk > 0:
+		ar_list = []
+		for i in range(0, len(recv), chunk):
+			ar_list.extend(mng.recv_analyze_chunk(recv[i:i+chunk]))
+	else:
+		ar_list = [mng.recv_analyze(recv[i:i+1]) for i in range(len(recv))]
+	result = []
+	buff = ""
+	for ar in ar_list:
+		if ar.prev_buff_commit() and buff != "":
+			result.append((buff, ""))
+			buff = ""
+		if ar.new_data_push():
+			buff += ar.data.hex().upper()
+		if ar.buff_commit():
+			frame_pos = len(buff) - ar.frame_len * 2
+			if frame_pos > 0:
+				result.append((buff[:frame_pos], ""))
+				buff = buff[frame_pos:]
+			result.append((buff, ar.id))
+			buff = ""
+	if buff != "":
+		result.append((buff, ""))
+	return result
+
+
+def assert_chunk_log(mng: autoresp_mng, hex_list: List[str]) -> None:
+	"""
+	一括解析でも1バイトずつ解析したときと同じログになる
+	"""
+	for hex_str in hex_list:
+		for chunk in range(1, len(hex_str) // 2 + 1):
+			assert log(mng, hex_str, chunk) == log(mng, hex_str), (hex_str, chunk)
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_priority(mode):
+	"""
+		data1: 0*2
+		data2: 01*
+		data3: 1*2
+		data4: **2
+		data5: **0
+	"""
+	data = [
+			#有効		# 受信値		# 自動応答対象							# 応答データ名
+			#設定		# 名称			# 受信データパターン					# (自動送信設定)
+		[	True,		"Test1",		[hex('00'), any(1), hex('02')],		"AutoResp",	None,	None,],
+		[	True,		"Test2",		[hex('00'), hex('01'), any(1)],		"AutoResp",	None,	None,],
+		[	True,		"Test3",		[hex('01'), any(1), hex('02')],		"AutoResp",	None,	None,],
+		[	True,		"Test4",		[any(1), any(1), hex('02')],		"AutoResp",	None,	None,],
+		[	True,		"Test5",		[any(1), any(1), hex('00')],		"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	# 同時にマッチしたときは定義順で先の設定を優先
+	assert match(mng, "000502") == ["Test1"]
+	assert match(mng, "000102") == ["Test1"]
+	assert match(mng, "000105") == ["Test2"]
+	assert match(mng, "010502") == ["Test3"]
+	assert match(mng, "050002") == ["Test4"]
+	# 固定値の分岐に入った後でもanyのパターンにマッチする
+	assert match(mng, "000500") == ["Test5"]
+	assert match(mng, "000100") == ["Test2"]
+	assert match(mng, "010500") == ["Test5"]
+	assert match(mng, "05FF03") == []
+	# 無効化した設定は次の有効な設定にマッチする
+	mng.update_enable(False, 0)
+	mng.update_tree()
+	assert match(mng, "000502") == ["Test4"]
+	assert match(mng, "000102") == ["Test2"]
+
+
+def test_duplicate():
+	# 同じパターンで有効な設定が重複したときは後の設定を無効化
+	dup = [
+		[	True,		"Dup1",			[hex('00'), any(1)],				"AutoResp",	None,	None,],
+		[	True,		"Dup2",			[hex('00'), any(1)],				"AutoResp",	None,	None,],
+	]
+	mng = make_mng(dup)
+	assert dup[1][autoresp_list.ENABLE] is False
+	assert match(mng, "0011") == ["Dup1"]
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_restart(mode):
+	"""
+		data1: 01**0*
+		data2: 02**0*
+		data2: 03**0*
+		data3: 04**0*
+		data4: 05**0*
+	"""
+	data = [
+			#有効		# 受信値		# 自動応答対象															# 応答データ名
+			#設定		# 名称			# 受信データパターン													# (自動送信設定)
+		[	True,		"Test1",		[hex('00'), hex('01'), any(1), any(1), hex('00'), any(1)],				"AutoResp",	None,	None,],
+		[	True,		"Test2",		[hex('00'), hex('02'), any(1), any(1), hex('00'), any(1)],				"AutoResp",	None,	None,],
+		[	True,		"Test3",		[hex('00'), hex('03'), any(1), any(1), hex('00'), any(1)],				"AutoResp",	None,	None,],
+		[	True,		"Test4",		[hex('00'), hex('04'), any(1), any(1), hex('00'), any(1)],				"AutoResp",	None,	None,],
+		[	True,		"Test5",		[hex('00'), hex('05'), any(1), any(1), hex('00'), any(1)],				"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	assert match(mng, "0003AABB00CC") == ["Test3"]
+	assert match(mng, "0005000000000001FFFF00FF") == ["Test5", "Test1"]
+	assert match(mng, "0006AABB00CC") == []
+	# マッチ途中のデータ列の中から始まるフレーム
+	assert log(mng, "000003AABB00CC") == [("00", ""), ("0003AABB00CC", "Test3")]
+	assert log(mng, "000000000200FF00CC") == [("000000", ""), ("000200FF00CC", "Test2")]
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_frame_log(mode):
+	data = [
+		[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	None,	None,],
+		[	True,		"Short",		[hex('BB'), hex('01')],						"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	assert log(mng, "0000AA0101") == [("00", ""), ("00AA0101", "Frame")]
+	assert log(mng, "FF00AA0102BB01") == [("FF", ""), ("00AA0102", "Frame"), ("BB01", "Short")]
+	# tailに到達したらフレーム終了、重なる次のフレームは探さない
+	assert log(mng, "00AA00AA0101") == [("00AA00AA", "Frame"), ("0101", "")]
+	# 長さの違う設定が同時にマッチしたときも定義順で先の設定を優先
+	assert log(mng, "00AABB01") == [("00AABB01", "Frame")]
+	assert_chunk_log(mng, ["0000AA0101", "FF00AA0102BB01", "00AA00AA0101", "00AABB01", "BB0100AA00BB01FF"])
+	# イベントの位置
+	mng.recv_analyze_init()
+	ar_list = mng.recv_analyze_chunk(memoryview(bytes.fromhex("FF00AA0102BB01")))
+	assert [(ar.offset, ar.prev_buff_commit(), ar.buff_commit(), ar.id) for ar in ar_list] == [
+		(0, False, False, ""), (1, True, True, "Frame"), (5, True, True, "Short")
+	]
+	mng.update_enable(False, 0)
+	mng.update_tree()
+	assert log(mng, "00AABB01") == [("00AA", ""), ("BB01", "Short")]
+	assert log(mng, "00AABB01", 3) == [("00AA", ""), ("BB01", "Short")]
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_ruleset_swap(mode):
+	# 解析ツリー一式の差し替えはフレームの切れ目で実施する
+	data = [
+		[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	None,	None,],
+	]
+	data_new = [
+		[	True,		"New",			[hex('BB'), hex('01')],						"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	swapped = []
+	def chunk_match(hex_list: List[str]) -> List[str]:
+		# 受信データを一括解析してマッチした自動応答設定名を返す
+		result = []
+		for hex_str in hex_list:
+			for ar in mng.recv_analyze_chunk(memoryview(bytes.fromhex(hex_str))):
+				if ar.buff_commit():
+					result.append(ar.id)
+		return result
+	# マッチ途中のデータが無ければ次の受信から
+	mng.recv_analyze_init()
+	mng.ruleset_publish(mng.ruleset_build(data_new), lambda: swapped.append(True))
+	assert chunk_match(["00AA0102BB01"]) == ["New"]
+	assert swapped == [True]
+	# マッチ途中のフレームは古い設定で最後まで解析して、tail到達後から新しい設定
+	mng.ruleset_publish(mng.ruleset_build(data))
+	mng.ruleset_publish(mng.ruleset_build(data_new))
+	assert chunk_match(["BB01"]) == ["New"]
+	assert chunk_match(["BB"]) == []
+	mng.ruleset_publish(mng.ruleset_build(data))
+	assert chunk_match(["0100AA0102"]) == ["New", "Frame"]
+	assert chunk_match(["00AA"]) == []
+	mng.ruleset_publish(mng.ruleset_build(data_new))
+	assert chunk_match(["0102BB01"]) == ["Frame", "New"]
+	# マッチしなくなった時点で差し替え
+	assert chunk_match(["BB"]) == []
+	mng.ruleset_publish(mng.ruleset_build(data))
+	assert chunk_match(["FF00AA0102"]) == ["Frame"]
+	# 受信が途切れたときはマッチ途中のデータを破棄して差し替え
+	assert chunk_match(["00AA"]) == []
+	mng.ruleset_publish(mng.ruleset_build(data_new))
+	assert mng.ruleset_sync()
+	assert chunk_match(["0102BB01"]) == ["New"]
+	assert not mng.ruleset_sync()
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_ruleset_steps(mode, monkeypatch):
+	# ruleset_create()した解析ツリー一式はruleset_sync()で少しずつ構築してから差し替え、差し替え前のものは少しずつ破棄する
+	monkeypatch.setattr(autoresp, "RULESET_STEP_BUDGET", 0)
+	data = [
+		[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	None,	None,],
+	]
+	data_new = [
+		[	True,		"New",			[hex('BB'), hex('01')],						"AutoResp",	None,	None,],
+		[	True,		"Len",			[hex('CC'), length(), hex('03')],			"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	tree = weakref.ref(mng.tree)
+	mng.ruleset_publish(mng.ruleset_create(data_new))
+	steps = 0
+	while not mng.ruleset_sync():
+		steps += 1
+		# 構築中はGCを止めて、受信解析は差し替え前の設定で続ける
+		assert not gc.isenabled()
+		assert log(mng, "00AA0102", chunk=4) == [("00AA0102", "Frame")]
+	assert steps > 1
+	assert gc.isenabled()
+	assert match(mng, "BB01CC02AAAA03") == ["New", "Len"]
+	# 差し替え前の解析ツリーは循環参照を切って参照カウントで解放する
+	while mng.ruleset_busy():
+		assert not mng.ruleset_sync()
+	assert tree() is None
+	# 構築中に再度要求されたら、構築途中のものは破棄して後の要求を構築する
+	swapped = []
+	ruleset = mng.ruleset_create(data)
+	tree = weakref.ref(ruleset.tree)
+	mng.ruleset_publish(ruleset, lambda: swapped.append("data"))
+	assert not mng.ruleset_sync()
+	del ruleset
+	mng.ruleset_publish(mng.ruleset_create(data_new), lambda: swapped.append("data_new"))
+	while mng.ruleset_busy():
+		mng.ruleset_sync()
+	assert swapped == ["data_new"]
+	assert match(mng, "00AA0102BB01") == ["New"]
+	assert tree() is None
+
+
+def test_table_lazy():
+	# 遷移表はTABLEを選択したときだけ作成し、遷移先がtailのときだけ負値にする
+	data = [
+		[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	assert mng._match_mode == MatchMode.TREE
+	assert mng._ruleset.table is None
+	assert mng.ruleset_create(data).use_table is False
+	mng.matcher_update(MatchMode.TABLE)
+	table = mng._ruleset.table
+	assert table is not None
+	for node in mng._ruleset.nodes:
+		row = table.trans[node.state*256:(node.state+1)*256]
+		for byte, next in node.next.items():
+			assert row[byte] == (~(next.state * 256) if next.tail else next.state * 256)
+	assert match(mng, "0000AA0102") == ["Frame"]
+	# TABLE選択中に作成した解析ツリー一式は遷移表も構築する
+	ruleset = mng.ruleset_create(data)
+	assert ruleset.use_table
+	ruleset.build()
+	assert ruleset.table is not None
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_anlyz_data_frame(mode):
+	# 受信データ解析にはマッチしたフレームを渡す
+	frames = []
+	data = [
+		[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	lambda hdl, data: frames.append(bytes(data)),	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	for chunk in range(0, 7):
+		frames.clear()
+		log(mng, "0000AA010200AA0304", chunk)
+		assert frames == [bytes.fromhex("00AA0102"), bytes.fromhex("00AA0304")], (chunk, frames)
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_length_field(mode):
+	# 長さフィールドで可変長のフレーム
+	frames = []
+	data = [
+		[	True,		"Len",			[hex('00'), hex('CC'), length(1), hex('03')],						"AutoResp",	lambda hdl, data: frames.append(bytes(data)),	None,],
+		[	True,		"Len2",			[hex('00'), hex('DD'), length(2, "little", 1, 2), any(1)],			"AutoResp",	None,	None,],
+		[	True,		"Short",		[hex('BB'), hex('01')],												"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	assert log(mng, "00CC03AABBCC03") == [("00CC03AABBCC03", "Len")]
+	# ペイロード内のデータはパターンとして解析しない
+	assert log(mng, "FF00CC02BB0103BB01") == [("FF", ""), ("00CC02BB0103", "Len"), ("BB01", "Short")]
+	assert log(mng, "00CC0003") == [("00CC0003", "Len")]
+	# ペイロード長 = 長さフィールド*2+1
+	assert log(mng, "00DD0100AABBCCEE") == [("00DD0100AABBCCEE", "Len2")]
+	assert log(mng, "00DD0000AAEE") == [("00DD0000AAEE", "Len2")]
+	# ペイロード以降が一致しなければNG
+	assert log(mng, "00CC01AA04BB01") == [("00CC01AA04", ""), ("BB01", "Short")]
+	assert_chunk_log(mng, ["00CC03AABBCC03", "FF00CC02BB0103BB01", "00CC0003BB01", "00DD0100AABBCCEE00CC0103", "00CC01AA04BB01", "0000CC0100CC0103"])
+	# 受信データ解析にはペイロードを含むフレーム全体を渡す
+	for chunk in range(0, 7):
+		frames.clear()
+		log(mng, "FF00CC0201020300CC0003", chunk)
+		assert frames == [bytes.fromhex("00CC02010203"), bytes.fromhex("00CC0003")], (chunk, frames)
+
+
+def test_length_field_limit():
+	# 長さフィールドは1パターンに1つまで
+	with pytest.raises(Exception):
+		make_mng([[True, "Bad", [length(1), length(1)], "AutoResp", None, None]])
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_mask_range(mode):
+	mask = autoresp_data.mask
+	byte_range = autoresp_data.byte_range
+	data = [
+		[	True,		"Fix",			[hex('00'), hex('15')],								"AutoResp",	None,	None,],
+		[	True,		"Range",		[hex('00'), byte_range('10', '1F')],				"AutoResp",	None,	None,],
+		[	True,		"Bit7",			[mask('80', '80'), hex('00')],						"AutoResp",	None,	None,],
+		[	True,		"Nibble",		[mask('F00F', '1002'), any(1)],						"AutoResp",	None,	None,],
+		[	True,		"Suffix",		[hex('CC'), length(1), byte_range('F0', 'FF')],		"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	assert match(mng, "0015") == ["Fix"]
+	assert match(mng, "0010") == ["Range"]
+	assert match(mng, "001F") == ["Range"]
+	assert match(mng, "0020") == []
+	assert match(mng, "8000") == ["Bit7"]
+	assert match(mng, "FF00") == ["Bit7"]
+	assert match(mng, "7F00") == []
+	assert match(mng, "1A5200") == ["Nibble"]
+	assert match(mng, "1A5300") == []
+	# 範囲指定の途中から始まるフレーム
+	assert log(mng, "00008000") == [("0000", ""), ("8000", "Bit7")]
+	# ペイロード後の範囲指定
+	assert log(mng, "CC01AAF5CC0000") == [("CC01AAF5", "Suffix"), ("CC00", "Bit7"), ("00", "")]
+	assert log(mng, "CC01AAEF") == [("CC01AAEF", "")]
+	assert_chunk_log(mng, ["00008000", "000010", "1A52001A", "CC01AAF5CC0000", "CC0180EF80000011"])
+
+
+@pytest.mark.parametrize("params", [("80", "01"), ("80", "8000")])
+def test_mask_error(params):
+	# マスク外のビットを指定した値はマッチしないのでエラー
+	with pytest.raises(Exception):
+		autoresp_data.mask(*params)
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_fcc(mode):
+	frames = []
+	fcc = autoresp_data.fcc_2compl
+	data = [
+		[	True,		"Fcc",			[hex('02'), any(1), any(1), fcc(1)],								"AutoResp",	lambda hdl, data: frames.append(bytes(data)),	None,],
+		[	True,		"FccLen",		[hex('05'), length(1), autoresp_data.fcc_sum(), hex('03')],			"AutoResp",	lambda hdl, data: frames.append(bytes(data)),	None,],
+	]
+	def fcc_log(mng: autoresp_mng, hex_str: str, chunk: int = 0) -> List[tuple]:
+		# FCC NGのフレームはidに付けて返す
+		mng.recv_analyze_init()
+		recv = memoryview(bytes.fromhex(hex_str))
+		ar_list = [mng.recv_analyze(recv[i:i+1]) for i in range(len(recv))] if chunk == 0 else [ar for i in range(0, len(recv), chunk) for ar in mng.recv_analyze_chunk(recv[i:i+chunk])]
+		return [(ar.id, ar.fcc_error, ar.trans_req()) for ar in ar_list if ar.buff_commit()]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	for chunk in range(0, 5):
+		frames.clear()
+		# 02 [10 20] FCC=-(0x30)=D0
+		assert fcc_log(mng, "021020D0", chunk) == [("Fcc", False, True)], chunk
+		# FCC NGのフレームは自動応答も受信データ解析もしない
+		assert fcc_log(mng, "021020D1", chunk) == [("Fcc", True, False)], chunk
+		# ペイロード後のFCC: 05 02 [01 02] FCC=05+02+01+02=0A 03
+		assert fcc_log(mng, "FF050201020A03", chunk) == [("FccLen", False, True)], chunk
+		assert fcc_log(mng, "05020102FF03", chunk) == [("FccLen", True, False)], chunk
+		assert frames == [bytes.fromhex("021020D0"), bytes.fromhex("050201020A03")], (chunk, frames)
+
+
+def test_observe():
+	# 観測のみの受信解析は別スレッドで、設定ごとに受信順で実施する
+	observed = []
+	def observe(hdl, data):
+		time.sleep(0.05)
+		observed.append((threading.current_thread().name, bytes(data)))
+	data = [
+		[	True,		"Observe",		[hex('00'), hex('AA'), any(1)],		"AutoResp",	observe,	None,	autoresp_opt.observe(),],
+		[	True,		"Inline",		[hex('00'), hex('BB'), any(1)],		"AutoResp",	lambda hdl, data: observed.append((threading.current_thread().name, bytes(data))),	None,	autoresp_opt(),],
+	]
+	mng = make_mng(data)
+	timestamp_begin = time.perf_counter()
+	assert log(mng, "00AA0100AA0200BB0300AA04", 5) == [("00AA01", "Observe"), ("00AA02", "Observe"), ("00BB03", "Inline"), ("00AA04", "Observe")]
+	assert time.perf_counter() - timestamp_begin < 0.1
+	mng.anlyz_worker_shutdown()
+	assert observed[0] == (threading.current_thread().name, bytes.fromhex("00BB03"))
+	assert [frame for name, frame in observed[1:]] == [bytes.fromhex("00AA01"), bytes.fromhex("00AA02"), bytes.fromhex("00AA04")]
+	assert all(name.startswith("anlyz_worker") for name, frame in observed[1:])
+
+
+STATS_DATA = [
+	[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	lambda hdl, data: time.sleep(0.001),	None,],
+	[	True,		"Short",		[hex('BB'), hex('01')],						"AutoResp",	None,	None,],
+	[	True,		"Len",			[hex('CC'), length(1), hex('03')],			"AutoResp",	None,	None,],
+]
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+@pytest.mark.parametrize("chunk", range(0, 5))
+def test_stats(mode, chunk):
+	mng = make_mng(STATS_DATA)
+	mng.matcher_update(mode)
+	# 00AB: Frame途中で外れる、BBFF: Short途中で外れる、CC0100FF: 長さフィールド後が外れる
+	log(mng, "00AA0102" "00AB" "BB01" "BBFF" "00AA0304" "CC010003" "CC0100FF", chunk)
+	stats = {row[0]: row[1:] for row in mng.stats_table()}
+	assert stats["Frame"][:5] == [2, 1, 0, 8, 2], stats
+	assert stats["Frame"][6] >= 1000
+	assert stats["Short"][:5] == [1, 1, 0, 2, 0], stats
+	assert stats["Len"][:5] == [1, 1, 0, 4, 0], stats
+
+
+def test_stats_swap():
+	mng = make_mng(STATS_DATA)
+	log(mng, "BB01BBFF")
+	# 解析ツリー一式を差し替えても同じIDの設定は統計情報を引き継ぐ
+	mng.ruleset_publish(mng.ruleset_build(STATS_DATA[1:]))
+	assert mng.ruleset_sync()
+	# マッチ途中で外れた回数は差し替え前の解析ツリー一式の破棄時に引き継ぐ
+	while mng.ruleset_busy():
+		mng.ruleset_sync()
+	log(mng, "BB01BBFF")
+	stats = {row[0]: row[1:] for row in mng.stats_table()}
+	assert list(stats.keys()) == ["Short", "Len"]
+	assert stats["Short"][:2] == [2, 2]
+	assert mng.dump_stats(sort=1).splitlines()[1].startswith("Short")
+	mng.stats_clear()
+	assert mng.stats_table()[0][1:] == [0] * 10
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_recv_timeout(mode):
+	# キャラクタ間タイムアウトでマッチ途中のデータを破棄する
+	data = [
+		[	True,		"Frame",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	mng.recv_analyze_init()
+	assert not mng.recv_analyze_timeout()
+	# 途切れなければ前回受信の続き
+	assert [ar.id for ar in mng.recv_analyze_chunk(memoryview(bytes.fromhex("00AA")))] == [""]
+	assert [ar.id for ar in mng.recv_analyze_chunk(memoryview(bytes.fromhex("0102")))] == ["Frame"]
+	# 途切れたらフレーム先頭から
+	mng.recv_analyze_chunk(memoryview(bytes.fromhex("00AA")))
+	assert mng.recv_analyze_timeout()
+	assert [ar.id for ar in mng.recv_analyze_chunk(memoryview(bytes.fromhex("0102")))] == [""]
+	assert [ar.id for ar in mng.recv_analyze_chunk(memoryview(bytes.fromhex("00AA0304")))] == ["Frame"]
+	assert mng.stats_table()[0][1:3] == [2, 1]
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_select(mode):
+	# 受信値による自動送信データの選択
+	data = [
+		[	True,		"Cmd",			[hex('00'), any(1), any(1)],				autoresp_select(1, {0x01: "A", 0x02: "B"}, default="C"),	None,	None,],
+		[	True,		"Cmd2",			[hex('01'), any(1), any(1), hex('FF')],		autoresp_select(-3, {0x0102: "B", 0x0201: "A"}, size=2, endian="little"),	None,	None,],
+	]
+	mng = make_select_mng(data)
+	mng.matcher_update(mode)
+	as_mng = mng._autosend_mng
+	for hex_str, send_id in [("000100", "A"), ("000200", "B"), ("0003FF", "C"), ("010102FF", "A"), ("010201FF", "B")]:
+		as_mng.stop()
+		assert log(mng, hex_str, 2)[-1][1] in ("Cmd", "Cmd2")
+		assert as_mng._active_node.id == send_id, (hex_str, as_mng._active_node.id)
+	# 表に無い受信値でdefaultも無ければ自動応答しない
+	as_mng.stop()
+	assert log(mng, "010303FF") == [("010303FF", "Cmd2")]
+	assert as_mng._active_node is None
+
+
+def test_select_error():
+	# 存在しない自動送信データ定義名を含む設定は無効化(フレームの区切りは判定する)
+	mng = make_select_mng([[True, "Bad", [hex('00'), any(1)], autoresp_select(1, {0x01: "X"}), None, None]])
+	assert match(mng, "0001") == [""]
+	# フレーム外の受信値は指定できない
+	with pytest.raises(Exception):
+		make_select_mng([[True, "Bad", [hex('00'), any(1)], autoresp_select(2, {0x01: "A"}), None, None]])
+
+
+class echo_wnd:
+	"""
+	GUI反映要求とGUI部品への設定値を記録する
+	"""
+	def __init__(self) -> None:
+		self.events = []
+		self.values = {}
+
+	def write_event_value(self, key, value):
+		self.events.append(key)
+
+	def __getitem__(self, key):
+		wnd = self
+		class part:
+			def Update(self, value):
+				wnd.values[key] = value
+		return part()
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_echo(mode):
+	# 受信フレームから送信データへのフィールドコピー
+	data = [
+		[	True,		"Echo",			[hex('00'), any(1), any(1), any(1)],		"A",	None,	None,	autoresp_opt(echo=[autoresp_echo("EchoResp", 1, 1, 2), autoresp_echo("EchoResp", 0, -1)]),],
+	]
+	mng = make_select_mng(data)
+	mng.matcher_update(mode)
+	s_mng = mng._send_mng
+	wnd = echo_wnd()
+	s_mng.init_wnd(wnd)
+	senddata = s_mng._send_data_dict["EchoResp"]
+	senddata._gui_key, senddata._gui_row = ("send", 0)
+	assert senddata.data_bytes == bytes.fromhex('00000000')
+	for hex_str in ["00123456", "00ABCDEF"]:
+		assert match(mng, hex_str) == ["Echo"]
+		# FCCは差分更新した結果と全体を計算し直した結果が一致する
+		fcc = senddata.data_array[3]
+		assert fcc == senddata.calc_fcc()
+		assert senddata.data_bytes == bytes.fromhex(hex_str[6:8] + hex_str[2:6]) + bytes([fcc])
+	# GUI反映要求はまとめて1回
+	assert wnd.events == ["_swe_send_gui_refresh"]
+	s_mng.gui_refresh()
+	assert wnd.values[("send", 0, 0)] == "EF" and wnd.values[("send", 0, 3)] == f"{fcc:02X}"
+	# 受信解析からの送信データ更新も同じ経路で反映する
+	mng.data_list[0].anlyz_adpt.senddata_update("EchoResp", 2, 0x1FF)
+	assert senddata.data_array[2] == 0xFF and senddata.data_array[3] == senddata.calc_fcc()
+	assert wnd.events == ["_swe_send_gui_refresh"] * 2
+
+
+@pytest.mark.parametrize("echo", [autoresp_echo("EchoResp", 0, 4), autoresp_echo("EchoResp", 3, 0, 2)])
+def test_echo_error(echo):
+	# コピー元はフレーム内、コピー先は送信データ内でなければならない
+	with pytest.raises(Exception):
+		make_select_mng([[True, "Bad", [hex('00'), any(1), any(1), any(1)], "A", None, None, autoresp_opt(echo=echo)]])
+
+
+def test_delay():
+	data = [
+		[	True,		"Delay",		[hex('00'), hex('AA'), any(1), any(1)],		"AutoResp",	None,	None,	autoresp_opt(delay_us=3000),],
+	]
+	mng = make_mng(data)
+	as_mng = mng._autosend_mng
+	sent = []
+	as_mng.set_send_cb(lambda data, result: sent.append((time.perf_counter_ns(), result)))
+	# 計測結果に依存しないように、期限の1ms前からビジーウェイトする設定にする
+	# (起床の遅れのサンプルも埋めておき、テスト中の1回の遅れでspinが伸びないようにする)
+	for i in range(as_mng._timer.CALIBRATE_WINDOW):
+		as_mng._timer.update(1000 * 1000)
+	for i in range(3):
+		assert match(mng, "00AA0102") == ["Delay"]
+		# 受信フレーム末尾の受信時間を起点に待機する
+		timestamp_rx = time.perf_counter_ns()
+		assert as_mng.run(0, timestamp_rx) is autosend_result.WAIT
+		assert as_mng.next_deadline() == timestamp_rx + 3000 * 1000 - as_mng._timer.spin
+		while not sent:
+			as_mng.run(0, time.perf_counter_ns())
+		timestamp_tx, result = sent.pop()
+		assert timestamp_tx - timestamp_rx >= 3000 * 1000
+		assert result.delay_deadline == timestamp_rx + 3000 * 1000
+	stats = mng.stats_table()[0]
+	assert stats[8] == 3 and stats[9] >= 0
+	# spinは起床の遅れの99%点(外れ値1回では伸びない)
+	timer = as_mng._timer
+	for i in range(timer.CALIBRATE_WINDOW):
+		timer.update(100 * 1000)
+	assert timer.spin == 100 * 1000
+	timer.update(10 * 1000 * 1000)
+	assert timer.spin == 100 * 1000
+	timer.update(10 * 1000 * 1000)
+	assert timer.spin == 10 * 1000 * 1000
+	# 応答遅延なしの設定は即時に送信する
+	mng = make_mng([row[:6] for row in data])
+	as_mng = mng._autosend_mng
+	as_mng.set_send_cb(lambda data, result: sent.append((time.perf_counter_ns(), result)))
+	match(mng, "00AA0102")
+	assert as_mng.run(0, time.perf_counter_ns()).is_send()
+	assert sent.pop()[1].delay_deadline is None
+
+
+def test_frame_buffer():
+	buff = frame_buffer(0, 4)
+	for i in range(10):
+		buff.push(bytes([i]))
+	assert bytes(buff.view()) == bytes([6, 7, 8, 9])
+	buff.push(bytes(range(20, 23)))
+	assert bytes(buff.view()) == bytes([9, 20, 21, 22])
+	assert bytes(buff.view(2)) == bytes([21, 22])
+	buff.push(bytes(range(30, 40)))
+	assert bytes(buff.view()) == bytes([36, 37, 38, 39])
+	buff = frame_buffer(2)
+	for i in range(10):
+		buff.push(bytes([i, i]))
+	assert len(buff) == 20 and bytes(buff.view(4)) == bytes([8, 8, 9, 9])
+
+
+def test_frame_buffer_grow_with_view():
+	# view()で取得したmemoryviewが残っていても拡張できる
+	buff = frame_buffer(4)
+	buff.push(bytes([1, 2, 3]))
+	view = buff.view(2)
+	buff.push(bytes(range(10, 20)))
+	assert bytes(buff.view()) == bytes([1, 2, 3]) + bytes(range(10, 20))
+	assert bytes(view) == bytes([2, 3])
+
+
+@pytest.mark.parametrize("mode", list(MatchMode))
+def test_length_field_tail(mode):
+	# 長さフィールド終端と同じノードで終わる設定は、定義順で先の有効な設定で読み飛ばすかフレーム終了かを決める
+	data = [
+		[	True,		"Len",			[hex('00'), length(1), hex('03')],		"AutoResp",	None,	None,],
+		[	True,		"Fix",			[hex('00'), hex('01')],					"AutoResp",	None,	None,],
+	]
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	assert log(mng, "000155030001AA03") == [("00015503", "Len"), ("0001AA03", "Len")]
+	# 長さフィールドを含む設定を無効化すると、同じノードで終わる設定にマッチする
+	mng.update_enable(False, 0)
+	mng.update_tree()
+	assert log(mng, "000155030001") == [("0001", "Fix"), ("5503", ""), ("0001", "Fix")]
+	assert_chunk_log(mng, ["000155030001", "0001000100"])
+	# すべて無効なら定義順で先の設定でフレームの区切りを判定する
+	mng.update_enable(False, 1)
+	mng.update_tree()
+	assert log(mng, "00015503") == [("00015503", "")]
+	# 先に定義した固定長の設定が有効なら読み飛ばさない
+	data = [row[:] for row in reversed(data)]
+	data[0][autoresp_list.ENABLE] = data[1][autoresp_list.ENABLE] = True
+	mng = make_mng(data)
+	mng.matcher_update(mode)
+	assert log(mng, "00015503") == [("0001", "Fix"), ("5503", "")]
+	mng.update_enable(False, 0)
+	mng.update_tree()
+	assert log(mng, "00015503") == [("00015503", "Len")]
+	assert_chunk_log(mng, ["00015503", "000100015503"])
+
+
+def test_observe_ruleset_swap():
+	# 観測のみの受信解析が無くなった設定のスレッドは差し替えで終了する
+	observed = []
+	def observe(hdl, data):
+		time.sleep(0.05)
+		observed.append(bytes(data))
+	data = [
+		[	True,		"Observe",		[hex('00'), hex('AA'), any(1)],		"AutoResp",	observe,	None,	autoresp_opt.observe(),],
+	]
+	mng = make_mng(data)
+	log(mng, "00AA01", 3)
+	assert [executer for executer in mng._anlyz_worker._executers if executer is not None]
+	# 同じ設定が残るときはスレッドも残す
+	mng.ruleset_publish(mng.ruleset_build(data))
+	assert mng.ruleset_sync()
+	assert [executer for executer in mng._anlyz_worker._executers if executer is not None]
+	mng.ruleset_publish(mng.ruleset_build([row[:4] + [None, None] for row in data]))
+	assert mng.ruleset_sync()
+	assert not [executer for executer in mng._anlyz_worker._executers if executer is not None]
+	# 実施待ちの受信解析は実施される
+	for i in range(20):
+		if observed:
+			break
+		time.sleep(0.01)
+	assert observed == [bytes.fromhex("00AA01")]
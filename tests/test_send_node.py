@@ -0,0 +1,31 @@
+from pySerialDebugger.send_node import send_data, send_data_node
+
+
+class gui_wnd:
+	"""
+	GUI部品への設定値を記録する
+	"""
+	def __init__(self) -> None:
+		self.values = {}
+
+	def __getitem__(self, key):
+		wnd = self
+		class part:
+			def Update(self, value):
+				wnd.values[key] = value
+		return part()
+
+
+def test_refresh_gui_bitfield():
+	# BITFIELDはフィールドごとのGUI部品に反映する
+	node = send_data_node(["BF", [send_data.input("01"), send_data.bf([(send_data.input("1"), 4), (send_data.input("2"), 4)]), send_data.input("03")]])
+	assert node.data_bytes == bytes.fromhex("012103")
+	wnd = gui_wnd()
+	node.init_wnd(wnd)
+	node._gui_key, node._gui_row = ("send", 0)
+	node.write_bytes(1, bytes.fromhex("5A"))
+	node.refresh_gui()
+	assert wnd.values[("send", 0, 0)] == "01"
+	assert wnd.values[("gui_input_bf", "send", 0, (1, 0))] == "0A"
+	assert wnd.values[("gui_input_bf", "send", 0, (1, 1))] == "05"
+	assert ("send", 0, 1) not in wnd.values
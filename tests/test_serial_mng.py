@@ -0,0 +1,190 @@
+import pytest
+
+from pySerialDebugger import serial_mng, thread
+from pySerialDebugger.autosend import autosend_result
+from pySerialDebugger.bench import make_serial_manager, bench_port
+
+
+ms = 1000 * 1000
+
+
+def recv_proc(mng: serial_mng.serial_manager, hex_str: str, timestamp_chunk: int, timestamp_rx_prev: int) -> list:
+	"""
+	一括受信したデータを処理して、通知した解析結果の (データ, 受信時間, 直前の受信時間) を返す
+	"""
+	thread.messenger.clear_notify_serial2hdrl()
+	recv = bytes.fromhex(hex_str)
+	mng._rx_buf[0:len(recv)] = recv
+	mng._timestamp_rx = timestamp_chunk
+	mng._timestamp_rx_prev = timestamp_rx_prev
+	mng._recv_proc(mng._rx_buf_view[0:len(recv)])
+	thread.messenger.flush_notify_serial2hdrl()
+	return [
+		(bytes(result.data).hex().upper(), result._timestamp_rx, result._timestamp_rx_prev)
+		for msg in thread.messenger.get_notify_serial2hdrl_batch() if msg.notify == thread.ThreadNotify.RECV_ANALYZE
+		for result in msg.analyze_results()
+	]
+
+
+def test_recv_analyze_copy():
+	# 管理スレッドに通知した受信データは、リングバッファが上書きされても変わらない
+	mng = make_serial_manager(b'')
+	# connect()の初期化のうち受信処理に必要な分
+	mng._timestamp_rx = mng._timestamp_rx_prev = 0
+	mng._autoresp_mng.recv_analyze_init()
+	thread.messenger.clear_notify_serial2hdrl()
+	recv = bytes.fromhex("00AA0102FF")
+	mng._rx_buf[0:len(recv)] = recv
+	mng._recv_proc(mng._rx_buf_view[0:len(recv)])
+	mng._rx_buf[0:len(recv)] = bytes(len(recv))
+	thread.messenger.flush_notify_serial2hdrl()
+	data = b"".join(bytes(result.data) for msg in thread.messenger.get_notify_serial2hdrl_batch() if msg.notify == thread.ThreadNotify.RECV_ANALYZE for result in msg.analyze_results())
+	assert data == recv
+
+
+def test_recv_timestamp():
+	# 一括受信したデータの各バイトの受信時間は、read完了時間を末尾バイトとして1バイト送受信時間ずつ遡って復元する
+	mng = make_serial_manager(b'')
+	mng._byte_time = 1 * ms
+	# 前回受信が無ければ遡った分だけ
+	assert mng._recv_timestamp_begin(5, 100 * ms, 0) == 96 * ms
+	# 前回受信の末尾バイトより後、かつread完了時間より前
+	assert mng._recv_timestamp_begin(5, 100 * ms, 95 * ms) == 96 * ms
+	assert mng._recv_timestamp_begin(5, 100 * ms, 97 * ms) == 98 * ms
+	assert mng._recv_timestamp_begin(5, 100 * ms, 100 * ms) == 100 * ms
+	# 解析結果ごとに末尾バイトの受信時間と、その直前のデータの受信時間を持つ
+	mng._autoresp_mng.recv_analyze_init()
+	results = recv_proc(mng, "FF00AA0102FF", 100 * ms, 0)
+	# マッチしたフレームは前のデータとまとめて通知し、直前の受信時間はフレーム先頭の直前のバイトとする
+	assert results == [
+		("FF00AA0102", 99 * ms, 95 * ms),
+		("FF", 100 * ms, 99 * ms),
+	]
+	assert mng._timestamp_rx == 100 * ms
+	# 前回受信の直後に続けて受信したときは、前回受信の末尾バイトから1バイトずつ進める
+	mng._autoresp_mng.recv_analyze_init()
+	results = recv_proc(mng, "00AA0102", 200 * ms, 198 * ms)
+	assert results == [("00AA0102", 200 * ms, 198 * ms)]
+	# 前回受信から続くフレームは、前回受信の末尾バイトから遡ってフレーム先頭の直前とする
+	mng._autoresp_mng.recv_analyze_init()
+	assert recv_proc(mng, "00AA", 100 * ms, 0) == [("00AA", 100 * ms, 0)]
+	assert recv_proc(mng, "0102", 200 * ms, 100 * ms) == [("0102", 200 * ms, 98 * ms)]
+
+
+def test_recv_timeout():
+	# 自動応答の受信解析中にキャラクタ間タイムアウトの無通信があれば、マッチ途中のデータを破棄する
+	# 直前の受信時間がフレーム先頭の直前ならマッチ、前回受信の末尾バイトならマッチしていない
+	mng = make_serial_manager(b'')
+	mng._byte_time = 1 * ms
+	mng._recv_timeout = 3500 * 1000
+	# 前回受信の末尾バイトから今回先頭バイトまでT3.5未満ならフレームは続く
+	mng._autoresp_mng.recv_analyze_init()
+	assert recv_proc(mng, "00AA", 100 * ms, 0) == [("00AA", 100 * ms, 0)]
+	assert recv_proc(mng, "0102", 104 * ms, 100 * ms) == [("0102", 104 * ms, 98 * ms)]
+	# ちょうどT3.5でタイムアウト
+	mng._autoresp_mng.recv_analyze_init()
+	assert recv_proc(mng, "00AA", 100 * ms, 0) == [("00AA", 100 * ms, 0)]
+	assert recv_proc(mng, "0102", 104500 * 1000, 100 * ms) == [("0102", 104500 * 1000, 100 * ms)]
+	# タイムアウト後は次の受信をフレーム先頭から解析する
+	assert recv_proc(mng, "FF00AA0102", 110 * ms, 104500 * 1000) == [("FF00AA0102", 110 * ms, 106 * ms)]
+	# タイムアウト無効なら受信間隔によらずマッチを続ける
+	mng._recv_timeout = 0
+	mng._autoresp_mng.recv_analyze_init()
+	assert recv_proc(mng, "00AA", 100 * ms, 0) == [("00AA", 100 * ms, 0)]
+	assert recv_proc(mng, "0102", 200 * ms, 100 * ms) == [("0102", 200 * ms, 98 * ms)]
+
+
+def test_frame_segmenter():
+	# 9600bps: 1キャラクタ約1.04ms
+	segmenter = serial_mng.frame_segmenter()
+	segmenter.config(3.5, 9600, 1042 * 1000)
+	segmenter._size_max = 8
+	ms = 1000 * 1000
+	assert segmenter.push(bytes(4), 0, 4 * ms) is None
+	assert segmenter.check_overflow() is None
+	# ギャップ経過後の受信では、追加前に受信中フレームを確定する
+	frame = segmenter.push(bytes(8), 10 * ms, 18 * ms)
+	assert (frame.size, frame.timestamp_begin, frame.timestamp_end, frame.overflow) == (4, 0, 4 * ms, False)
+	# 同じ受信で最大フレーム長に達したフレームも取りこぼさない
+	frame = segmenter.check_overflow()
+	assert (frame.size, frame.timestamp_begin, frame.overflow) == (8, 10 * ms, True)
+	assert segmenter.deadline() is None
+
+
+def test_serial_timeout():
+	# timeoutの再設定は、設定中のtimeoutでは次のイベントに遅れるときか、要求より大幅に早く起床するときだけ
+	class timeout_port(bench_port):
+		def __init__(self):
+			self.history = []
+			super().__init__()
+		@property
+		def timeout(self):
+			return self.history[-1] if self.history else None
+		@timeout.setter
+		def timeout(self, value):
+			self.history.append(value)
+	mng = make_serial_manager(b'')
+	port = timeout_port()
+	mng._serial = port
+	mng._serial_timeout = None
+	port.history.clear()
+	for timeout in (0.1, 0.1, 0.02, 0.025, 0.026, 0.019, 0.1, 0.09, 0):
+		mng._serial_set_timeout(timeout)
+	assert port.history == [0.1, 0.02, 0.019, 0.1, 0.09, 0]
+
+
+def test_frame_segmenter_gap():
+	# 1キャラクタ1ms: T1.5=1.5ms, T3.5=3.5ms
+	segmenter = serial_mng.frame_segmenter()
+	segmenter.config(3.5, 9600, 1 * ms)
+	assert segmenter.deadline() is None
+	assert segmenter.check(100 * ms) is None
+	assert segmenter.push(bytes(2), 0, 1 * ms) is None
+	assert segmenter.deadline() == 1 * ms + 3500 * 1000
+	# ちょうどT1.5のキャラクタ間ギャップはエラーにしない
+	assert segmenter.push(bytes(1), 2500 * 1000, 2500 * 1000) is None
+	assert not segmenter._gap_error
+	# T1.5を超えたらエラー、T3.5未満ならフレームは続く
+	assert segmenter.push(bytes(1), 4 * ms + 1, 4 * ms + 1) is None
+	assert segmenter._gap_error
+	assert segmenter.push(bytes(1), 7500 * 1000, 7500 * 1000) is None
+	# 受信の無いままT3.5経過したら確定する(経過前は確定しない)
+	deadline = segmenter.deadline()
+	assert deadline == 11 * ms
+	assert segmenter.check(deadline - 1) is None
+	frame = segmenter.check(deadline)
+	assert (frame.size, frame.timestamp_begin, frame.timestamp_end, frame.gap_error, frame.overflow) == (5, 0, 7500 * 1000, True, False)
+	assert segmenter.deadline() is None
+	# 次の受信がちょうどT3.5後なら、追加前に確定する
+	assert segmenter.push(bytes(1), 20 * ms, 20 * ms) is None
+	frame = segmenter.push(bytes(1), 23500 * 1000, 23500 * 1000)
+	assert (frame.size, frame.timestamp_begin, frame.gap_error) == (1, 20 * ms, False)
+	# T3.5未満なら同じフレームに追加する
+	assert segmenter.push(bytes(1), 27 * ms - 1, 27 * ms - 1) is None
+	frame = segmenter.check(30500 * 1000)
+	assert (frame.size, frame.timestamp_begin, frame.timestamp_end, frame.gap_error) == (2, 23500 * 1000, 27 * ms - 1, True)
+	# 19200bps超では1キャラクタ500us: T1.5=750us, T3.5=1750us
+	segmenter.config(3.5, 115200, 87 * 1000)
+	assert segmenter.push(bytes(1), 0, 0) is None
+	assert segmenter.push(bytes(1), 750 * 1000, 750 * 1000) is None
+	assert not segmenter._gap_error
+	assert segmenter.deadline() == 2500 * 1000
+	assert segmenter.check(2500 * 1000 - 1) is None
+	assert segmenter.check(2500 * 1000).size == 2
+
+
+def test_tx_writer_error():
+	# 送信スレッドの例外は、次の送信要求でシリアル通信スレッドに送出する
+	class error_port:
+		def write(self, data):
+			raise OSError("write failed")
+	tx = serial_mng.tx_writer()
+	tx.start(error_port(), 0)
+	tx.check()
+	tx.push(b'\x00', autosend_result())
+	tx._thread.join(1.0)
+	with pytest.raises(Exception):
+		tx.check()
+	with pytest.raises(Exception):
+		tx.push(b'\x00', autosend_result())
+	tx.stop()
@@ -0,0 +1,97 @@
+import threading
+
+from pySerialDebugger import thread
+from pySerialDebugger.autoresp import analyze_result
+
+
+def make_msg(data: bytes, commit: bool, frame_id: str = "") -> thread.serial_msg:
+	result = analyze_result(data)
+	if commit:
+		result.set_analyze_succeeded(None, None, len(data))
+		result.id = frame_id
+	else:
+		result.set_analyzing()
+	msg = thread.serial_msg()
+	msg.recv_analyze(result)
+	return msg
+
+
+def make_queue(capacity: int) -> thread.batch_queue:
+	q = thread.batch_queue(capacity, 64, 1000 * 1000 * 1000, thread.QueuePolicy.COALESCE, "test")
+	q.droppable = thread.serial_msg_droppable
+	q.coalesce = thread.serial_msg_coalesce
+	return q
+
+
+def test_coalesce_capacity():
+	# 受信側が取り出さなくても容量を超えず、受信解析結果はすべてまとめて残す
+	q = make_queue(8)
+	for i in range(100):
+		q.put(make_msg(bytes([i]), True, str(i)))
+		q.put(make_msg(bytes([i, i]), False))
+		q.flush()
+	assert q.high_water <= 8
+	assert q.overflow == 0
+	assert q.coalesced > 0
+	q.flush(True)
+	results = [result for msg in q.get_batch() for result in msg.analyze_results()]
+	assert [result.id for result in results if result.buff_commit()] == [str(i) for i in range(100)]
+	assert b"".join(bytes(result.data) for result in results) == b"".join(bytes([i]) + bytes([i, i]) for i in range(100))
+
+
+def test_coalesce_concat():
+	# ログバッファへの追加だけの解析結果は受信データを連結する
+	q = make_queue(1)
+	q.put(make_msg(bytes([0]), False))
+	q.put(make_msg(bytes([1]), False))
+	q.put(make_msg(bytes([2]), False))
+	q.put(make_msg(bytes([3]), True, "A"))
+	q.flush(True)
+	batch = q.get_batch()
+	assert len(batch) == 2
+	results = batch[1].analyze_results()
+	assert len(results) == 1
+	assert bytes(results[0].data) == bytes([1, 2, 3]) and results[0].id == "A"
+
+
+def test_control_msg_counter():
+	# 他スレッドからの制御メッセージと受信データの追加が競合しても未公開数が崩れない
+	q = make_queue(100000)
+	def control():
+		for i in range(20000):
+			msg = thread.serial_msg()
+			msg.autoresp_updated()
+			q.put(msg, droppable=False)
+	th = threading.Thread(target=control)
+	th.start()
+	for i in range(20000):
+		q.put(make_msg(bytes([0]), True))
+	th.join()
+	q.publish()
+	assert q._unpublished == 0
+	assert len(q.get_batch()) == 40000
+
+
+def test_drop_oldest_get():
+	# DROP_OLDESTの破棄と受信側のget()が競合しても、取り出したメッセージと破棄数が合う
+	q = thread.batch_queue(4, 1, 0, thread.QueuePolicy.DROP_OLDEST, "test")
+	count = 20000
+	received = []
+	done = threading.Event()
+	def consumer():
+		while not done.is_set() or not q.empty():
+			try:
+				received.append(q.get())
+			except IndexError:
+				pass
+	th = threading.Thread(target=consumer)
+	th.start()
+	try:
+		for i in range(count):
+			q.put(i)
+	finally:
+		done.set()
+		th.join()
+	assert len(received) + q.overflow == count
+	assert len(set(received)) == len(received)
+	assert received == sorted(received)